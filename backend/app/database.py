@@ -1,3 +1,5 @@
+import os
+import fcntl
 import sqlite3
 import json
 from datetime import datetime
@@ -7,6 +9,9 @@ from utils.logger import get_logger
 logger = get_logger(__name__)
 DATABASE_PATH = '/data/db.sqlite'
 
+# Bump whenever init_db() changes the schema - stored in PRAGMA user_version
+SCHEMA_VERSION = 12
+
 @contextmanager
 def get_db():
     """Context manager for database connections"""
@@ -21,6 +26,42 @@ def get_db():
     finally:
         conn.close()
 
+def ensure_schema():
+    """Run schema setup once per database, safe to call from many workers
+
+    Reads PRAGMA user_version first; when it already matches SCHEMA_VERSION
+    nothing is written. Otherwise an exclusive file lock serializes the
+    workers, and only the first one to get it runs init_db().
+    """
+    if _get_schema_version() == SCHEMA_VERSION:
+        logger.info(f"Database schema up to date (version {SCHEMA_VERSION})")
+        return
+
+    with open(f"{DATABASE_PATH}.init.lock", 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            # Another worker may have finished while we waited for the lock
+            if _get_schema_version() == SCHEMA_VERSION:
+                return
+
+            init_db()
+            seed_data()
+
+            with get_db() as conn:
+                conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+            logger.info(f"Database schema initialized (version {SCHEMA_VERSION})")
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def _get_schema_version() -> int:
+    """Read the schema version stored in the database (0 for a new database)"""
+    if not os.path.exists(DATABASE_PATH):
+        return 0
+
+    with get_db() as conn:
+        return conn.execute('PRAGMA user_version').fetchone()[0]
+
 def init_db():
     """Initialize database schema"""
     with get_db() as conn:
@@ -40,6 +81,8 @@ def init_db():
                 external_id TEXT,
                 vendor TEXT,
                 product_type TEXT,
+                inventory_item_id TEXT,
+                location_id TEXT,
                 created_at TEXT DEFAULT CURRENT_TIMESTAMP,
                 updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
                 FOREIGN KEY (connection_id) REFERENCES store_connections (id)
@@ -57,6 +100,17 @@ def init_db():
         except:
             pass  # Column already exists
 
+        # Shopify inventory metadata captured during sync (saves lookups on stock updates)
+        try:
+            cursor.execute('ALTER TABLE products ADD COLUMN inventory_item_id TEXT')
+        except:
+            pass  # Column already exists
+
+        try:
+            cursor.execute('ALTER TABLE products ADD COLUMN location_id TEXT')
+        except:
+            pass  # Column already exists
+
         # Suggestions table
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS suggestions (
@@ -78,6 +132,47 @@ def init_db():
         except:
             pass  # Column already exists
 
+        # Structured suggestion fields, filled by the generators (no parsing at apply time)
+        for column in ('new_price REAL', 'discount_pct REAL', 'reasoning TEXT', 'confidence REAL'):
+            try:
+                cursor.execute(f'ALTER TABLE suggestions ADD COLUMN {column}')
+            except:
+                pass  # Column already exists
+
+        # Deduplication and expiry: fingerprint of (product, type, action), unique among 'new' ones
+        for column in ('fingerprint TEXT', 'expires_at TEXT', 'updated_at TEXT'):
+            try:
+                cursor.execute(f'ALTER TABLE suggestions ADD COLUMN {column}')
+            except:
+                pass  # Column already exists
+
+        cursor.execute('UPDATE suggestions SET updated_at = created_at WHERE updated_at IS NULL')
+
+        # Products a promo/bundle suggestion combines with (replaces related_product_ids JSON)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS suggestion_products (
+                suggestion_id INTEGER NOT NULL,
+                product_id INTEGER NOT NULL,
+                position INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (suggestion_id, product_id),
+                FOREIGN KEY (suggestion_id) REFERENCES suggestions (id) ON DELETE CASCADE,
+                FOREIGN KEY (product_id) REFERENCES products (id) ON DELETE CASCADE
+            )
+        ''')
+
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_suggestion_products_product
+            ON suggestion_products (product_id)
+        ''')
+
+        # Move related IDs of existing suggestions into the join table
+        cursor.execute('''
+            INSERT OR IGNORE INTO suggestion_products (suggestion_id, product_id, position)
+            SELECT s.id, CAST(j.value AS INTEGER), j.key
+            FROM suggestions s, json_each(s.related_product_ids) j
+            WHERE s.related_product_ids IS NOT NULL AND json_valid(s.related_product_ids)
+        ''')
+
         # Events table (history)
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS events (
@@ -92,6 +187,215 @@ def init_db():
             )
         ''')
 
+        # Indexes for per-product lookups of suggestions and events
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_suggestions_product_status
+            ON suggestions (product_id, status)
+        ''')
+
+        # A repeated generation of the same pending suggestion updates it instead of inserting
+        cursor.execute('''
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_suggestions_fingerprint_new
+            ON suggestions (fingerprint) WHERE status = 'new'
+        ''')
+
+        # Suggestion sweeper (expired 'new' suggestions)
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_suggestions_status_expires
+            ON suggestions (status, expires_at)
+        ''')
+
+        # Catalog-wide suggestion queue (keyset pagination on created_at, id)
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_suggestions_status_created
+            ON suggestions (status, created_at)
+        ''')
+
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_suggestions_status_type_created
+            ON suggestions (status, type, created_at)
+        ''')
+
+        # Queue without a status filter
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_suggestions_created
+            ON suggestions (created_at, id)
+        ''')
+
+        # Filtering/sorting suggestions by their structured fields
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_suggestions_type_confidence
+            ON suggestions (type, confidence)
+        ''')
+
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_suggestions_type_new_price
+            ON suggestions (type, new_price)
+        ''')
+
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_events_product_created
+            ON events (product_id, created_at)
+        ''')
+
+        # Last AI analysis per product (analysis scheduling)
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_events_ai_analysis
+            ON events (product_id, created_at) WHERE event_type = 'ai_analysis'
+        ''')
+
+        # Catalog version - bumped by triggers on every product write,
+        # used to invalidate cached catalog statistics
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS catalog_version (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                version INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        cursor.execute('INSERT OR IGNORE INTO catalog_version (id, version) VALUES (1, 0)')
+
+        for operation in ('INSERT', 'UPDATE', 'DELETE'):
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_products_{operation.lower()}_version
+                AFTER {operation} ON products
+                BEGIN
+                    UPDATE catalog_version SET version = version + 1 WHERE id = 1;
+                END
+            ''')
+
+        # Outbox of store writes, pushed to Shopify/WooCommerce by a background worker
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                suggestion_id INTEGER,
+                product_id INTEGER,
+                connection_id INTEGER NOT NULL,
+                action TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                result TEXT,
+                next_attempt_at TEXT NOT NULL,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (suggestion_id) REFERENCES suggestions (id),
+                FOREIGN KEY (product_id) REFERENCES products (id),
+                FOREIGN KEY (connection_id) REFERENCES store_connections (id)
+            )
+        ''')
+
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_outbox_status_next_attempt
+            ON outbox (status, next_attempt_at)
+        ''')
+
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_outbox_suggestion
+            ON outbox (suggestion_id)
+        ''')
+
+        # Store product an entry writes to - entries of one product run one at a time, in order
+        try:
+            cursor.execute('ALTER TABLE outbox ADD COLUMN external_id TEXT')
+        except:
+            pass  # Column already exists
+
+        cursor.execute('''
+            UPDATE outbox SET external_id = json_extract(payload, '$.external_id')
+            WHERE external_id IS NULL
+        ''')
+
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_outbox_target
+            ON outbox (connection_id, external_id, status)
+        ''')
+
+        # AI analysis results keyed on a hash of the analysis inputs
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS analysis_cache (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                cache_key TEXT NOT NULL UNIQUE,
+                type TEXT NOT NULL,
+                product_id INTEGER,
+                product_sku TEXT,
+                result TEXT NOT NULL,
+                confidence REAL NOT NULL DEFAULT 0.5,
+                metadata TEXT,
+                expires_at TEXT NOT NULL,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (product_id) REFERENCES products (id)
+            )
+        ''')
+
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_analysis_cache_expires
+            ON analysis_cache (expires_at)
+        ''')
+
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_analysis_cache_product
+            ON analysis_cache (product_id)
+        ''')
+
+        # Every OpenAI call: tokens, estimated cost (USD) and latency (duration, ms)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS ai_usage (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                model TEXT NOT NULL,
+                operation TEXT NOT NULL,
+                prompt_tokens INTEGER NOT NULL DEFAULT 0,
+                completion_tokens INTEGER NOT NULL DEFAULT 0,
+                total_tokens INTEGER NOT NULL DEFAULT 0,
+                cost REAL NOT NULL DEFAULT 0.0,
+                duration INTEGER NOT NULL,
+                success INTEGER NOT NULL DEFAULT 1,
+                error_message TEXT,
+                metadata TEXT,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_ai_usage_created
+            ON ai_usage (created_at)
+        ''')
+
+        # OpenAI Batch API runs (products holds what ingesting the results needs)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS ai_batches (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                batch_id TEXT UNIQUE NOT NULL,
+                status TEXT NOT NULL,
+                model TEXT NOT NULL,
+                input_file_id TEXT NOT NULL,
+                output_file_id TEXT,
+                request_count INTEGER NOT NULL,
+                products TEXT NOT NULL,
+                products_ingested INTEGER NOT NULL DEFAULT 0,
+                suggestions_created INTEGER NOT NULL DEFAULT 0,
+                error_message TEXT,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                updated_at TEXT,
+                completed_at TEXT
+            )
+        ''')
+
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_ai_batches_status
+            ON ai_batches (status)
+        ''')
+
+        # One row per night - the worker that inserts it submits the nightly batch
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS ai_batch_runs (
+                run_date TEXT PRIMARY KEY,
+                batch_id TEXT,
+                error_message TEXT,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
         # Store connections table (encrypted credentials)
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS store_connections (
@@ -28,3 +28,13 @@ class StoreIntegration(ABC):
     def update_product_price(self, product_id: str, new_price: float) -> bool:
         """Update product price"""
         pass
+
+    @abstractmethod
+    def update_product_stock(self, product_id: str, new_stock: int) -> bool:
+        """Update product stock quantity"""
+        pass
+
+    @abstractmethod
+    def update_product(self, product_id: str, updates: Dict) -> bool:
+        """Update product with multiple fields (price, stock, sku)"""
+        pass
@@ -1,17 +1,77 @@
 import requests
+import ijson
 import logging
-from typing import List, Dict, Optional
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Iterator
 from .base import StoreIntegration
 
 logger = logging.getLogger(__name__)
 
+# Inventory metadata shared by all instances, keyed by store URL:
+# variant ID -> inventory_item_id, and the store's primary location_id.
+# Lets update_product_stock go straight to inventory_levels/set.
+_inventory_item_cache: Dict[str, Dict[str, int]] = {}
+_location_cache: Dict[str, int] = {}
+
+# Last known remote price and SKU of each variant, keyed by store URL and variant
+# ID, refreshed by every sync and variant write. update_product uses it to skip
+# writes that would change nothing. The store can change behind our back (admin
+# edits, other apps), so entries are only trusted for VARIANT_STATE_TTL_SECONDS.
+# Stock is not cached: orders change it all the time. Each store's entries are
+# kept oldest first, so expired ones (and the oldest, past
+# VARIANT_STATE_MAX_ENTRIES) are evicted from the front.
+_variant_state_cache: Dict[str, Dict[str, Dict]] = {}
+VARIANT_STATE_TTL_SECONDS = 60
+VARIANT_STATE_MAX_ENTRIES = 10000
+
+# Top-level product fields we actually use (drops body_html, images, options...)
+PRODUCT_FIELDS = 'id,title,vendor,product_type,variants'
+
+# Variant fields that can be written with a single PUT /variants/{id}
+VARIANT_FIELDS = ('price', 'sku')
+
+# GraphQL bulk export of products with their variants and inventory items.
+# Bulk queries may nest connections at most two levels deep.
+BULK_PRODUCTS_QUERY = '''
+{
+  products {
+    edges {
+      node {
+        id
+        title
+        vendor
+        productType
+        variants {
+          edges {
+            node {
+              id
+              title
+              sku
+              price
+              inventoryQuantity
+              inventoryItem { id }
+            }
+          }
+        }
+      }
+    }
+  }
+}
+'''
+
+BULK_TERMINAL_STATUSES = ('COMPLETED', 'FAILED', 'CANCELED', 'EXPIRED')
+
 class ShopifyIntegration(StoreIntegration):
     """Shopify Admin API integration"""
 
     def __init__(self, store_url: str, access_token: str):
         # Store URL should be in format: myshop.myshopify.com
+        # (an explicit http(s):// scheme is kept as-is, e.g. for a local test server)
         super().__init__(store_url, access_token)
-        self.api_base = f"https://{self.store_url}/admin/api/2024-01"
+        base_url = self.store_url if '://' in self.store_url else f"https://{self.store_url}"
+        self.api_base = f"{base_url}/admin/api/2024-01"
 
     def _request(self, method: str, endpoint: str, **kwargs) -> Optional[Dict]:
         """Make authenticated request to Shopify API"""
@@ -29,6 +89,27 @@ class ShopifyIntegration(StoreIntegration):
             logger.error(f"Shopify API request failed: {e}")
             return None
 
+    def _request_stream(self, endpoint: str, item_path: str, **kwargs) -> Iterator[Dict]:
+        """Make authenticated GET request and decode items incrementally from the response stream
+
+        Args:
+            endpoint: API endpoint
+            item_path: ijson prefix of the items to yield, e.g. 'products.item'
+        """
+        url = f"{self.api_base}/{endpoint.lstrip('/')}"
+        headers = {
+            'X-Shopify-Access-Token': self.api_key,
+            'Content-Type': 'application/json'
+        }
+
+        try:
+            with requests.get(url, headers=headers, timeout=30, stream=True, **kwargs) as response:
+                response.raise_for_status()
+                response.raw.decode_content = True
+                yield from ijson.items(response.raw, item_path, use_float=True)
+        except (requests.exceptions.RequestException, ijson.JSONError) as e:
+            logger.error(f"Shopify API request failed: {e}")
+
     def test_connection(self) -> bool:
         """Test if API credentials are valid"""
         try:
@@ -42,36 +123,214 @@ class ShopifyIntegration(StoreIntegration):
         """Fetch products from Shopify store"""
         products = []
 
-        result = self._request('GET', '/products.json', params={'limit': min(limit, 250)})
+        location_id = self._get_primary_location_id()
 
-        if not result or 'products' not in result:
-            return []
-
-        for product in result['products']:
+        for product in self._request_stream('/products.json', 'products.item', params={
+            'limit': min(limit, 250),
+            'fields': PRODUCT_FIELDS
+        }):
             # Shopify products can have multiple variants
             for variant in product.get('variants', []):
-                variant_id = variant.get('id')
-                if not variant_id:
+                record = self._variant_to_product(product, variant, location_id)
+                if record:
+                    products.append(record)
+
+        return products[:limit]
+
+    def get_products_bulk(self, poll_interval: float = 2.0, timeout: float = 3600.0) -> Iterator[Dict]:
+        """Export the whole catalog through a GraphQL bulk operation
+
+        Starts bulkOperationRunQuery, polls until it finishes, then streams the
+        JSONL result file line by line. Suited to stores with tens of thousands
+        of variants, where paginated REST is slow and rate limited.
+
+        Args:
+            poll_interval: Seconds between status checks
+            timeout: Maximum seconds to wait for the operation
+
+        Yields:
+            Product dicts in the same format as get_products
+
+        Raises:
+            Exception: If the bulk operation cannot be started or does not complete
+        """
+        result_url = self.export_products_bulk(poll_interval, timeout)
+        if result_url:
+            yield from self.stream_bulk_products(result_url)
+
+    def export_products_bulk(self, poll_interval: float = 2.0, timeout: float = 3600.0) -> Optional[str]:
+        """Run the catalog bulk operation and wait for it to finish
+
+        Returns:
+            URL of the JSONL result file, or None when the store has no products
+
+        Raises:
+            Exception: If the bulk operation cannot be started or does not complete
+        """
+        return self._run_bulk_operation(BULK_PRODUCTS_QUERY, poll_interval, timeout)
+
+    def stream_bulk_products(self, result_url: str) -> Iterator[Dict]:
+        """Stream the products of a finished bulk export
+
+        Args:
+            result_url: URL returned by export_products_bulk
+
+        Yields:
+            Product dicts in the same format as get_products
+        """
+        location_id = self._get_primary_location_id()
+        products = {}
+
+        with requests.get(result_url, stream=True, timeout=60) as response:
+            response.raise_for_status()
+
+            for line in response.iter_lines():
+                if not line:
                     continue
 
-                # Use SKU if available, otherwise generate one
-                sku = variant.get('sku')
-                if not sku or sku.strip() == '':
-                    sku = f"SHOPIFY-{variant_id}"
-
-                products.append({
-                    'external_id': str(variant_id),
-                    'sku': sku,
-                    'name': f"{product['title']} - {variant['title']}" if variant.get('title') != 'Default Title' else product['title'],
-                    'price': float(variant.get('price', 0)),
-                    'stock': int(variant.get('inventory_quantity', 0)),
-                    'status': 'active' if variant.get('inventory_quantity', 0) > 0 else 'low_stock',
-                    'channel': 'shopify',
-                    'vendor': product.get('vendor', ''),
-                    'product_type': product.get('product_type', '')
-                })
+                node = json.loads(line)
+                parent_id = node.get('__parentId')
 
-        return products[:limit]
+                # Parent lines always come before their children
+                if not parent_id:
+                    products[node['id']] = {
+                        'title': node.get('title', ''),
+                        'vendor': node.get('vendor', ''),
+                        'product_type': node.get('productType', '')
+                    }
+                    continue
+
+                product = products.get(parent_id)
+                if product is None:
+                    continue
+
+                variant = {
+                    'id': _gid_to_id(node['id']),
+                    'title': node.get('title'),
+                    'sku': node.get('sku'),
+                    'price': node.get('price', 0),
+                    'inventory_quantity': node.get('inventoryQuantity') or 0,
+                    'inventory_item_id': _gid_to_id((node.get('inventoryItem') or {}).get('id'))
+                }
+
+                record = self._variant_to_product(product, variant, location_id)
+                if record:
+                    yield record
+
+    def _run_bulk_operation(self, query: str, poll_interval: float, timeout: float) -> Optional[str]:
+        """Start a bulk query and wait for it, returning the result file URL"""
+        mutation = '''
+mutation bulkOperationRunQuery($query: String!) {
+  bulkOperationRunQuery(query: $query) {
+    bulkOperation { id status }
+    userErrors { field message }
+  }
+}
+'''
+        result = self._request('POST', '/graphql.json', json={
+            'query': mutation,
+            'variables': {'query': query}
+        })
+
+        run = (result or {}).get('data', {}).get('bulkOperationRunQuery') or {}
+        if not run.get('bulkOperation'):
+            errors = run.get('userErrors') or (result or {}).get('errors') or 'no response'
+            raise Exception(f"Failed to start Shopify bulk operation: {errors}")
+
+        operation_id = run['bulkOperation']['id']
+        logger.info(f"Started Shopify bulk operation {operation_id}")
+
+        status_query = '''
+{
+  currentBulkOperation {
+    id status errorCode objectCount url
+  }
+}
+'''
+        deadline = time.monotonic() + timeout
+
+        while True:
+            result = self._request('POST', '/graphql.json', json={'query': status_query})
+            operation = (result or {}).get('data', {}).get('currentBulkOperation') or {}
+
+            if operation.get('id') == operation_id and operation.get('status') in BULK_TERMINAL_STATUSES:
+                break
+
+            if time.monotonic() >= deadline:
+                raise Exception(f"Shopify bulk operation {operation_id} timed out")
+
+            time.sleep(poll_interval)
+
+        if operation['status'] != 'COMPLETED':
+            raise Exception(f"Shopify bulk operation {operation_id} {operation['status'].lower()}: {operation.get('errorCode')}")
+
+        logger.info(f"Shopify bulk operation {operation_id} completed with {operation.get('objectCount')} objects")
+        return operation.get('url')
+
+    def _variant_to_product(self, product: Dict, variant: Dict, location_id: Optional[int]) -> Optional[Dict]:
+        """Convert a Shopify product/variant pair into our product dict
+
+        Also records the variant's inventory metadata and remote state.
+        """
+        variant_id = variant.get('id')
+        if not variant_id:
+            return None
+
+        # Use SKU if available, otherwise generate one
+        sku = variant.get('sku')
+        if not sku or sku.strip() == '':
+            sku = f"SHOPIFY-{variant_id}"
+
+        inventory_item_id = variant.get('inventory_item_id')
+        if inventory_item_id:
+            _inventory_item_cache.setdefault(self.store_url, {})[str(variant_id)] = inventory_item_id
+
+        self._remember_variant_state(variant_id, variant)
+
+        return {
+            'external_id': str(variant_id),
+            'sku': sku,
+            'name': f"{product['title']} - {variant['title']}" if variant.get('title') != 'Default Title' else product['title'],
+            'price': float(variant.get('price', 0)),
+            'stock': int(variant.get('inventory_quantity', 0)),
+            'status': 'active' if variant.get('inventory_quantity', 0) > 0 else 'low_stock',
+            'channel': 'shopify',
+            'vendor': product.get('vendor', ''),
+            'product_type': product.get('product_type', ''),
+            'inventory_item_id': str(inventory_item_id) if inventory_item_id else None,
+            'location_id': str(location_id) if location_id else None
+        }
+
+    def cache_inventory_metadata(self, inventory_items: Dict[str, int], location_id: Optional[int] = None) -> None:
+        """Seed the inventory cache with metadata stored during sync
+
+        Args:
+            inventory_items: Dict mapping variant ID to inventory_item_id
+            location_id: Primary location ID of the store (optional)
+        """
+        cache = _inventory_item_cache.setdefault(self.store_url, {})
+        for variant_id, inventory_item_id in inventory_items.items():
+            if inventory_item_id:
+                cache[str(variant_id)] = int(inventory_item_id)
+
+        if location_id:
+            _location_cache[self.store_url] = int(location_id)
+
+    def has_inventory_metadata(self) -> bool:
+        """Check if inventory metadata for this store is already cached"""
+        return self.store_url in _inventory_item_cache
+
+    def _get_primary_location_id(self) -> Optional[int]:
+        """Get the store's primary location ID, fetching it once per store"""
+        if self.store_url in _location_cache:
+            return _location_cache[self.store_url]
+
+        result = self._request('GET', '/shop.json', params={'fields': 'primary_location_id'})
+        location_id = result.get('shop', {}).get('primary_location_id') if result else None
+
+        if location_id:
+            _location_cache[self.store_url] = location_id
+        return location_id
 
     def create_coupon(self, coupon_data: Dict) -> Dict:
         """Create a price rule (discount) in Shopify
@@ -126,28 +385,60 @@ class ShopifyIntegration(StoreIntegration):
 
     def update_product_price(self, product_id: str, new_price: float) -> bool:
         """Update product variant price in Shopify"""
-        payload = {
-            'variant': {
-                'id': int(product_id),
-                'price': str(new_price)
-            }
-        }
+        return self._update_variant(product_id, {'price': new_price})
+
+    def _update_variant(self, product_id: str, fields: Dict) -> bool:
+        """Write variant-level fields (price, sku) in one PUT /variants/{id}"""
+        variant = {'id': int(product_id)}
+        if 'price' in fields:
+            variant['price'] = str(fields['price'])
+        if 'sku' in fields:
+            variant['sku'] = fields['sku']
+
+        result = self._request('PUT', f'/variants/{product_id}.json', json={'variant': variant})
+        if result is None:
+            return False
 
-        result = self._request('PUT', f'/variants/{product_id}.json', json=payload)
-        return result is not None
+        # The response holds the variant as Shopify stored it
+        self._remember_variant_state(product_id, result.get('variant') or fields)
+        return True
 
     def update_product_stock(self, product_id: str, new_stock: int) -> bool:
-        """Update product variant inventory in Shopify"""
+        """Update product variant inventory in Shopify
+
+        Uses cached inventory_item_id and location_id so a stock update is a
+        single inventory_levels/set call. Falls back to discovery on a cache
+        miss or when the cached metadata is rejected.
+        """
+        inventory_item_id = _inventory_item_cache.get(self.store_url, {}).get(str(product_id))
+        location_id = self._get_primary_location_id() if inventory_item_id else None
+
+        if inventory_item_id and location_id:
+            if self._set_inventory_level(inventory_item_id, location_id, new_stock):
+                return True
+            logger.warning(f"Cached inventory metadata for variant {product_id} rejected, rediscovering")
+            _inventory_item_cache[self.store_url].pop(str(product_id), None)
+            _location_cache.pop(self.store_url, None)
+
+        metadata = self._discover_inventory_metadata(product_id)
+        if not metadata:
+            return False
+
+        inventory_item_id, location_id = metadata
+        return self._set_inventory_level(inventory_item_id, location_id, new_stock)
+
+    def _discover_inventory_metadata(self, product_id: str) -> Optional[tuple]:
+        """Look up inventory_item_id and location_id for a variant and cache them"""
         # First get the inventory item ID
         variant = self._request('GET', f'/variants/{product_id}.json')
         if not variant or 'variant' not in variant:
             logger.error(f"Failed to fetch variant {product_id}")
-            return False
+            return None
 
         inventory_item_id = variant['variant'].get('inventory_item_id')
         if not inventory_item_id:
             logger.error(f"No inventory_item_id for variant {product_id}")
-            return False
+            return None
 
         # Get inventory levels to find location_id
         inventory_levels = self._request('GET', f'/inventory_levels.json', params={
@@ -156,11 +447,17 @@ class ShopifyIntegration(StoreIntegration):
 
         if not inventory_levels or 'inventory_levels' not in inventory_levels or not inventory_levels['inventory_levels']:
             logger.error(f"No inventory levels found for inventory_item_id {inventory_item_id}")
-            return False
+            return None
 
         location_id = inventory_levels['inventory_levels'][0]['location_id']
 
-        # Update inventory level
+        _inventory_item_cache.setdefault(self.store_url, {})[str(product_id)] = inventory_item_id
+        _location_cache.setdefault(self.store_url, location_id)
+
+        return inventory_item_id, location_id
+
+    def _set_inventory_level(self, inventory_item_id: int, location_id: int, new_stock: int) -> bool:
+        """Set available inventory for an item at a location"""
         payload = {
             'location_id': location_id,
             'inventory_item_id': inventory_item_id,
@@ -208,6 +505,11 @@ class ShopifyIntegration(StoreIntegration):
             created_product = result['product']
             variant = created_product['variants'][0]
 
+            if variant.get('inventory_item_id'):
+                _inventory_item_cache.setdefault(self.store_url, {})[str(variant['id'])] = variant['inventory_item_id']
+
+            self._remember_variant_state(variant['id'], variant)
+
             return {
                 'external_id': str(variant['id']),
                 'sku': variant.get('sku', f"SHOPIFY-{variant['id']}"),
@@ -217,7 +519,8 @@ class ShopifyIntegration(StoreIntegration):
                 'status': 'active',
                 'channel': 'shopify',
                 'vendor': created_product.get('vendor', ''),
-                'product_type': created_product.get('product_type', '')
+                'product_type': created_product.get('product_type', ''),
+                'inventory_item_id': str(variant['inventory_item_id']) if variant.get('inventory_item_id') else None
             }
 
         return None
@@ -225,35 +528,81 @@ class ShopifyIntegration(StoreIntegration):
     def update_product(self, product_id: str, updates: Dict) -> bool:
         """Update product with multiple fields
 
+        Plans the minimum set of requests: price and SKU matching the
+        recently seen remote state are skipped, price and SKU go out in a
+        single variant PUT, and the inventory write (always sent, stock is
+        not cached) runs alongside it.
+
         Args:
             product_id: Variant ID
             updates: Dict with 'price', 'stock', 'sku', etc.
         """
-        success = True
+        changes = self._diff_variant_state(product_id, updates)
+        variant_fields = {k: v for k, v in changes.items() if k in VARIANT_FIELDS}
 
-        # Update price if specified
-        if 'price' in updates:
-            if not self.update_product_price(product_id, updates['price']):
-                logger.error(f"Failed to update price for product {product_id}")
-                success = False
-
-        # Update stock if specified
+        tasks = {}
+        if variant_fields:
+            tasks['variant'] = lambda: self._update_variant(product_id, variant_fields)
         if 'stock' in updates:
-            if not self.update_product_stock(product_id, updates['stock']):
-                logger.error(f"Failed to update stock for product {product_id}")
-                success = False
-
-        # Update SKU or other variant fields if specified
-        if 'sku' in updates:
-            payload = {
-                'variant': {
-                    'id': int(product_id),
-                    'sku': updates['sku']
-                }
-            }
-            result = self._request('PUT', f'/variants/{product_id}.json', json=payload)
-            if not result:
-                logger.error(f"Failed to update SKU for product {product_id}")
-                success = False
+            tasks['stock'] = lambda: self.update_product_stock(product_id, updates['stock'])
 
-        return success
+        if not tasks:
+            logger.info(f"Product {product_id} already up to date in Shopify, no requests sent")
+            return True
+
+        if len(tasks) == 1:
+            results = {name: task() for name, task in tasks.items()}
+        else:
+            with ThreadPoolExecutor(max_workers=len(tasks)) as executor:
+                futures = {name: executor.submit(task) for name, task in tasks.items()}
+                results = {name: future.result() for name, future in futures.items()}
+
+        for name, ok in results.items():
+            if not ok:
+                logger.error(f"Failed to update {name} for product {product_id}")
+
+        return all(results.values())
+
+    def _remember_variant_state(self, product_id, fields: Dict) -> None:
+        """Record the remote price/SKU of a variant after a read or successful write"""
+        cache = _variant_state_cache.setdefault(self.store_url, {})
+        now = time.monotonic()
+        # Re-inserted so the dict stays ordered by seen_at
+        state = cache.pop(str(product_id), None)
+        if state is None or now - state['seen_at'] > VARIANT_STATE_TTL_SECONDS:
+            # Never mix fresh fields with expired ones
+            state = {}
+        cache[str(product_id)] = state
+
+        if 'price' in fields:
+            state['price'] = float(fields['price'] or 0)
+        if 'sku' in fields:
+            state['sku'] = fields['sku']
+        state['seen_at'] = now
+
+        for key in list(cache):
+            if len(cache) <= VARIANT_STATE_MAX_ENTRIES and now - cache[key]['seen_at'] <= VARIANT_STATE_TTL_SECONDS:
+                break
+            del cache[key]
+
+    def _diff_variant_state(self, product_id: str, updates: Dict) -> Dict:
+        """Return the price/SKU updates that differ from the recently seen remote state"""
+        known = _variant_state_cache.get(self.store_url, {}).get(str(product_id))
+        if known is None or time.monotonic() - known['seen_at'] > VARIANT_STATE_TTL_SECONDS:
+            known = {}
+        changes = {}
+
+        # A None price means "leave unchanged", like a missing one
+        if updates.get('price') is not None and known.get('price') != float(updates['price']):
+            changes['price'] = updates['price']
+        if 'sku' in updates and ('sku' not in known or known['sku'] != updates['sku']):
+            changes['sku'] = updates['sku']
+
+        return changes
+
+
+def _gid_to_id(gid: Optional[str]) -> Optional[int]:
+    """Convert a GraphQL global ID (gid://shopify/ProductVariant/123) to a numeric ID"""
+    if not gid:
+        return None
+    return int(gid.rsplit('/', 1)[-1])
@@ -1,10 +1,17 @@
 import requests
+import ijson
 import logging
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Iterator
 from .base import StoreIntegration
 
 logger = logging.getLogger(__name__)
 
+# WooCommerce accepts at most 100 create/update/delete objects per batch request
+BATCH_LIMIT = 100
+
+# Product fields we actually use - sent as _fields to trim the response
+PRODUCT_FIELDS = 'id,sku,name,price,stock_quantity,stock_status'
+
 class WooCommerceIntegration(StoreIntegration):
     """WooCommerce REST API integration"""
 
@@ -25,6 +32,24 @@ class WooCommerceIntegration(StoreIntegration):
             logger.error(f"WooCommerce API request failed: {e}")
             return None
 
+    def _request_stream(self, endpoint: str, item_path: str, **kwargs) -> Iterator[Dict]:
+        """Make authenticated GET request and decode items incrementally from the response stream
+
+        Args:
+            endpoint: API endpoint
+            item_path: ijson prefix of the items to yield, e.g. 'item' for a top-level array
+        """
+        url = f"{self.api_base}/{endpoint.lstrip('/')}"
+        auth = (self.api_key, self.api_secret)
+
+        try:
+            with requests.get(url, auth=auth, timeout=30, stream=True, **kwargs) as response:
+                response.raise_for_status()
+                response.raw.decode_content = True
+                yield from ijson.items(response.raw, item_path, use_float=True)
+        except (requests.exceptions.RequestException, ijson.JSONError) as e:
+            logger.error(f"WooCommerce API request failed: {e}")
+
     def test_connection(self) -> bool:
         """Test if API credentials are valid"""
         try:
@@ -41,26 +66,26 @@ class WooCommerceIntegration(StoreIntegration):
         per_page = min(limit, 100)
 
         while len(products) < limit:
-            result = self._request('GET', '/products', params={
+            page_count = 0
+
+            for product in self._request_stream('/products', 'item', params={
                 'per_page': per_page,
                 'page': page,
-                'status': 'publish'
-            })
-
-            if not result:
-                break
-
-            for product in result:
+                'status': 'publish',
+                '_fields': PRODUCT_FIELDS
+            }):
+                page_count += 1
                 products.append({
                     'external_id': str(product['id']),
                     'sku': product.get('sku', f"WC-{product['id']}"),
                     'name': product['name'],
                     'price': float(product.get('price', 0) or 0),
+                    'stock': int(product.get('stock_quantity') or 0),
                     'status': 'active' if product['stock_status'] == 'instock' else 'low_stock',
                     'channel': 'woocommerce'
                 })
 
-            if len(result) < per_page:
+            if page_count < per_page:
                 break
 
             page += 1
@@ -101,9 +126,77 @@ class WooCommerceIntegration(StoreIntegration):
 
     def update_product_price(self, product_id: str, new_price: float) -> bool:
         """Update product price in WooCommerce"""
-        payload = {
-            'regular_price': str(new_price)
-        }
+        return self.update_product(product_id, {'price': new_price})
+
+    def update_product_stock(self, product_id: str, new_stock: int) -> bool:
+        """Update product stock quantity in WooCommerce"""
+        return self.update_product(product_id, {'stock': new_stock})
 
-        result = self._request('PUT', f'/products/{product_id}', json=payload)
-        return result is not None
+    def update_product(self, product_id: str, updates: Dict) -> bool:
+        """Update product with multiple fields in a single batch request
+
+        Args:
+            product_id: WooCommerce product ID
+            updates: Dict with 'price', 'stock', 'sku', etc.
+        """
+        results = self.bulk_update_products([dict(updates, id=product_id)])
+        return results.get(str(product_id), False)
+
+    def bulk_update_products(self, updates: List[Dict]) -> Dict[str, bool]:
+        """Update many products through /products/batch
+
+        Updates are sent in chunks of BATCH_LIMIT, so N products cost
+        ceil(N / 100) requests instead of N.
+
+        Args:
+            updates: List of dicts, each with 'id' and any of 'price', 'stock', 'sku'
+
+        Returns:
+            Dict mapping product ID (as str) to success flag
+        """
+        results = {}
+        payloads = []
+
+        for update in updates:
+            product_id = str(update['id'])
+            payload = self._build_update_payload(update)
+            if len(payload) == 1:
+                # Nothing besides the ID - treat as a no-op success
+                results[product_id] = True
+                continue
+            results[product_id] = False
+            payloads.append(payload)
+
+        for start in range(0, len(payloads), BATCH_LIMIT):
+            chunk = payloads[start:start + BATCH_LIMIT]
+            result = self._request('POST', '/products/batch', json={'update': chunk})
+
+            if not result or 'update' not in result:
+                logger.error(f"WooCommerce batch update failed for {len(chunk)} products")
+                continue
+
+            for item in result['update']:
+                product_id = str(item.get('id', ''))
+                if item.get('error'):
+                    logger.error(f"WooCommerce batch update failed for product {product_id}: {item['error'].get('message')}")
+                    continue
+                if product_id in results:
+                    results[product_id] = True
+
+        return results
+
+    def _build_update_payload(self, update: Dict) -> Dict:
+        """Translate our update fields into a WooCommerce product payload"""
+        payload = {'id': int(update['id'])}
+
+        if 'price' in update:
+            payload['regular_price'] = str(update['price'])
+
+        if 'stock' in update:
+            payload['manage_stock'] = True
+            payload['stock_quantity'] = int(update['stock'])
+
+        if 'sku' in update:
+            payload['sku'] = update['sku']
+
+        return payload
@@ -1,49 +1,59 @@
 """Flask application - routing and request handling only."""
-from flask import Flask, jsonify, request
+from flask import Blueprint, Flask, jsonify, request
 from flask_cors import CORS
-from datetime import datetime
+from datetime import datetime, timezone
+from typing import Optional
 import traceback
 from pydantic import ValidationError
 
-from database import init_db, seed_data, get_db
+from database import ensure_schema, get_db
 from utils.logger import setup_logger
-from utils.validators import CreateConnectionRequest, GetSuggestionsRequest, GetEventsRequest
+from utils.compression import init_compression
+from utils.validators import (
+    CreateConnectionRequest,
+    GetSuggestionsRequest,
+    ListSuggestionsRequest,
+    GetEventsRequest,
+    GetAIUsageRequest,
+    AnalyzeAllRequest,
+    RulesEngineRequest,
+    GetProductDetailsBatchRequest,
+    ApplySuggestionsBatchRequest,
+    PricingSimulationRequest,
+)
 from services import (
     get_all_products,
     get_product_details,
+    get_products_details,
+    get_catalog_stats,
     get_suggestions_for_product,
+    list_suggestions,
     apply_suggestion,
+    apply_suggestions_batch,
+    get_suggestion_actions,
+    start_suggestion_sweeper,
+    start_outbox_worker,
     get_recent_events,
+    get_ai_usage,
     get_all_connections,
     create_connection,
     delete_connection,
     toggle_connection,
     quick_demo_setup,
     sync_connection,
-    generate_suggestions_for_product,
-    generate_suggestions_for_all_products,
+    get_sync_job,
 )
 
 # Configure logging
 logger = setup_logger(__name__)
 
-app = Flask(__name__)
-CORS(app)  # Permissive CORS for demo
-
-# Initialize database on startup
-with app.app_context():
-    try:
-        init_db()
-        seed_data()
-        logger.info("Database initialized and seeded successfully")
-    except Exception as e:
-        logger.error(f"Database initialization failed: {e}")
-        raise
+# All routes live on this blueprint; the app itself is built by create_app()
+api = Blueprint('api', __name__)
 
 
 # ========== Global Error Handlers ==========
 
-@app.errorhandler(Exception)
+@api.app_errorhandler(Exception)
 def handle_exception(e: Exception):
     """
     Global exception handler for all unhandled exceptions.
@@ -64,13 +74,13 @@ def handle_exception(e: Exception):
     }), 500
 
 
-@app.errorhandler(404)
+@api.app_errorhandler(404)
 def not_found(e):
     """Handle 404 errors."""
     return jsonify({'error': 'Endpoint not found'}), 404
 
 
-@app.errorhandler(ValidationError)
+@api.app_errorhandler(ValidationError)
 def handle_validation_error(e: ValidationError):
     """
     Handle Pydantic validation errors.
@@ -84,13 +94,13 @@ def handle_validation_error(e: ValidationError):
     logger.warning(f"Validation error: {e}")
     return jsonify({
         'error': 'Validation failed',
-        'details': e.errors()
+        'details': e.errors(include_url=False, include_context=False)
     }), 400
 
 
 # ========== Health Check ==========
 
-@app.route('/health', methods=['GET'])
+@api.route('/health', methods=['GET'])
 def health_check():
     """
     Health check endpoint.
@@ -120,7 +130,7 @@ def health_check():
 
 # ========== Product Endpoints ==========
 
-@app.route('/api/products', methods=['GET'])
+@api.route('/api/products', methods=['GET'])
 def api_get_products():
     """
     Get all products in standardized ProductRecord format.
@@ -132,7 +142,19 @@ def api_get_products():
     return jsonify(products), 200
 
 
-@app.route('/api/products/<int:product_id>/details', methods=['GET'])
+@api.route('/api/products/stats', methods=['GET'])
+def api_get_product_stats():
+    """
+    Get aggregate catalog statistics for dashboard widgets.
+
+    Returns:
+        JSON with totals and counts by status, channel, connection and product type.
+    """
+    stats = get_catalog_stats()
+    return jsonify(stats), 200
+
+
+@api.route('/api/products/<int:product_id>/details', methods=['GET'])
 def api_get_product_details(product_id: int):
     """
     Get detailed product information including history.
@@ -151,7 +173,27 @@ def api_get_product_details(product_id: int):
     return jsonify(product), 200
 
 
-@app.route('/api/products', methods=['POST'])
+@api.route('/api/products/details:batch', methods=['POST'])
+def api_get_products_details_batch():
+    """
+    Get detailed information for many products in one request.
+
+    Body JSON:
+        product_ids: list[int] - IDs of the products (1-500)
+
+    Returns:
+        JSON list of product details (unknown IDs are skipped) or 400 on error.
+    """
+    try:
+        validated = GetProductDetailsBatchRequest(**(request.json or {}))
+    except ValidationError as e:
+        return handle_validation_error(e)
+
+    products = get_products_details(validated.product_ids)
+    return jsonify(products), 200
+
+
+@api.route('/api/products', methods=['POST'])
 def api_create_product():
     """
     Create a new product in connected store (Shopify/WooCommerce).
@@ -179,7 +221,7 @@ def api_create_product():
         return jsonify({'error': str(e)}), 500
 
 
-@app.route('/api/products/<int:product_id>', methods=['PUT'])
+@api.route('/api/products/<int:product_id>', methods=['PUT'])
 def api_update_product(product_id: int):
     """
     Update product in connected store (Shopify/WooCommerce).
@@ -209,22 +251,33 @@ def api_update_product(product_id: int):
 
 # ========== Suggestion Endpoints ==========
 
-@app.route('/api/suggestions', methods=['GET'])
+@api.route('/api/suggestions', methods=['GET'])
 def api_get_suggestions():
     """
-    Get suggestions for a specific product.
+    Get suggestions for a specific product, or a page of the catalog-wide queue.
 
     Query params:
-        product_id: Required product ID.
+        product_id: Product ID - returns all suggestions of that product.
+
+        Without product_id (review queue, newest first):
+        status: Optional status filter (new, applied).
+        type: Optional type filter (price, promo, bundle, restock).
+        connection_id: Optional store connection filter.
+        created_after / created_before: Optional ISO timestamps.
+        limit: Page size (1-200, default 50).
+        cursor: next_cursor from the previous page.
 
     Returns:
-        JSON list of suggestions or 400/404 on error.
+        JSON list of suggestions (product_id), or JSON with items and
+        next_cursor (queue), or 400/404 on error.
     """
     # Validate query params
     product_id = request.args.get('product_id', type=int)
 
     if not product_id:
-        return jsonify({'error': 'product_id parameter is required'}), 400
+        if 'product_id' in request.args:
+            return jsonify({'error': 'product_id must be a positive integer'}), 400
+        return _api_list_suggestions()
 
     try:
         # Validate using pydantic
@@ -240,7 +293,40 @@ def api_get_suggestions():
     return jsonify(suggestions), 200
 
 
-@app.route('/api/suggestions/<int:suggestion_id>/apply', methods=['POST'])
+def _api_list_suggestions():
+    """Catalog-wide suggestion queue with filters and keyset pagination."""
+    try:
+        validated = ListSuggestionsRequest(**request.args.to_dict())
+    except ValidationError as e:
+        return handle_validation_error(e)
+
+    try:
+        result = list_suggestions(
+            status=validated.status,
+            suggestion_type=validated.type,
+            connection_id=validated.connection_id,
+            created_after=_format_timestamp(validated.created_after),
+            created_before=_format_timestamp(validated.created_before),
+            limit=validated.limit,
+            cursor=validated.cursor
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify(result), 200
+
+
+def _format_timestamp(value: Optional[datetime]) -> Optional[str]:
+    """Format a datetime like the timestamps stored in the database (UTC, naive)."""
+    if not value:
+        return None
+    if value.tzinfo is not None:
+        # Convert before dropping the offset; naive values are taken as UTC already
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.isoformat(sep=' ', timespec='seconds')
+
+
+@api.route('/api/suggestions/<int:suggestion_id>/apply', methods=['POST'])
 def api_apply_suggestion(suggestion_id: int):
     """
     Apply a suggestion.
@@ -258,9 +344,81 @@ def api_apply_suggestion(suggestion_id: int):
         return jsonify({'error': str(e)}), 400
 
 
+@api.route('/api/suggestions/apply-batch', methods=['POST'])
+def api_apply_suggestions_batch():
+    """
+    Apply many suggestions at once.
+
+    Body JSON:
+        suggestion_ids: list[int] - IDs of the suggestions (1-200)
+
+    Returns:
+        JSON with per-suggestion results and store action status, or 400 on error.
+    """
+    try:
+        validated = ApplySuggestionsBatchRequest(**(request.json or {}))
+    except ValidationError as e:
+        return handle_validation_error(e)
+
+    result = apply_suggestions_batch(validated.suggestion_ids)
+    return jsonify(result), 200
+
+
+@api.route('/api/suggestions/<int:suggestion_id>/actions', methods=['GET'])
+def api_get_suggestion_actions(suggestion_id: int):
+    """
+    Get the store write status of an applied suggestion.
+
+    Args:
+        suggestion_id: Suggestion ID from URL path.
+
+    Returns:
+        JSON list of queued store actions or 404 if suggestion not found.
+    """
+    actions = get_suggestion_actions(suggestion_id)
+
+    if actions is None:
+        return jsonify({'error': 'Suggestion not found'}), 404
+
+    return jsonify(actions), 200
+
+
+# ========== Simulation Endpoints ==========
+
+@api.route('/api/simulations/pricing', methods=['POST'])
+def api_simulate_pricing():
+    """
+    Simulate price changes on the whole catalog (nothing is written).
+
+    Body JSON:
+        rules: list - price rules applied in order, each with adjust_pct and
+               optional channel, product_type, min/max_stock, min/max_price
+        include_pending_suggestions: bool - apply pending price suggestions first
+
+    Returns:
+        JSON with inventory value deltas and price distribution changes
+        per channel, or 400 on error.
+    """
+    try:
+        validated = PricingSimulationRequest(**(request.json or {}))
+    except ValidationError as e:
+        return handle_validation_error(e)
+
+    try:
+        # Imported here - NumPy is only needed by simulations
+        from services.simulation_service import simulate_pricing
+        result = simulate_pricing(
+            rules=[rule.dict() for rule in validated.rules],
+            include_pending_suggestions=validated.include_pending_suggestions
+        )
+        return jsonify(result), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+
 # ========== Event Endpoints ==========
 
-@app.route('/api/events', methods=['GET'])
+@api.route('/api/events', methods=['GET'])
 def api_get_events():
     """
     Get recent events (history).
@@ -284,7 +442,7 @@ def api_get_events():
 
 # ========== Store Connection Endpoints ==========
 
-@app.route('/api/connections', methods=['GET'])
+@api.route('/api/connections', methods=['GET'])
 def api_get_connections():
     """
     Get all store connections.
@@ -296,7 +454,7 @@ def api_get_connections():
     return jsonify(connections), 200
 
 
-@app.route('/api/connections', methods=['POST'])
+@api.route('/api/connections', methods=['POST'])
 def api_create_connection():
     """
     Create new store connection.
@@ -324,7 +482,7 @@ def api_create_connection():
         return jsonify({'error': str(e)}), 400
 
 
-@app.route('/api/connections/<int:connection_id>', methods=['DELETE'])
+@api.route('/api/connections/<int:connection_id>', methods=['DELETE'])
 def api_delete_connection(connection_id: int):
     """
     Delete store connection.
@@ -345,7 +503,7 @@ def api_delete_connection(connection_id: int):
         return jsonify({'error': str(e)}), 404
 
 
-@app.route('/api/connections/<int:connection_id>/toggle', methods=['POST'])
+@api.route('/api/connections/<int:connection_id>/toggle', methods=['POST'])
 def api_toggle_connection(connection_id: int):
     """
     Toggle connection active status.
@@ -366,7 +524,7 @@ def api_toggle_connection(connection_id: int):
         return jsonify({'error': str(e)}), 404
 
 
-@app.route('/api/connections/<int:connection_id>/sync', methods=['POST'])
+@api.route('/api/connections/<int:connection_id>/sync', methods=['POST'])
 def api_sync_connection(connection_id: int):
     """
     Sync products from store connection.
@@ -374,12 +532,19 @@ def api_sync_connection(connection_id: int):
     Args:
         connection_id: Connection ID from URL path.
 
+    Query params:
+        mode: Optional, 'rest' (default) or 'bulk' (Shopify GraphQL bulk export,
+              runs in the background).
+
     Returns:
-        JSON success response with products_synced count or 400/500 on error.
+        JSON success response with products_synced count, 202 with job_id in
+        bulk mode, or 400/500 on error.
     """
+    mode = request.args.get('mode', default='rest')
+
     try:
-        result = sync_connection(connection_id)
-        return jsonify(result), 200
+        result = sync_connection(connection_id, mode)
+        return jsonify(result), 202 if 'job_id' in result else 200
     except ValueError as e:
         return jsonify({'error': str(e)}), 400
     except Exception as e:
@@ -387,7 +552,25 @@ def api_sync_connection(connection_id: int):
         return jsonify({'error': f'Sync failed: {str(e)}'}), 500
 
 
-@app.route('/api/connections/demo/quick-setup', methods=['POST'])
+@api.route('/api/connections/<int:connection_id>/sync/<int:job_id>', methods=['GET'])
+def api_sync_job(connection_id: int, job_id: int):
+    """
+    Get the status of a background sync job.
+
+    Args:
+        connection_id: Connection ID from URL path.
+        job_id: Job ID returned by a bulk sync.
+
+    Returns:
+        JSON job status or 404 if the job does not exist.
+    """
+    try:
+        return jsonify(get_sync_job(connection_id, job_id)), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 404
+
+
+@api.route('/api/connections/demo/quick-setup', methods=['POST'])
 def api_quick_demo_setup():
     """
     Quickly create demo stores for testing.
@@ -410,7 +593,7 @@ def api_quick_demo_setup():
 
 # ========== AI Agent Endpoints ==========
 
-@app.route('/api/ai/analyze/<int:product_id>', methods=['POST'])
+@api.route('/api/ai/analyze/<int:product_id>', methods=['POST'])
 def api_ai_analyze_product(product_id: int):
     """
     Generate AI-powered suggestions for a specific product.
@@ -420,11 +603,16 @@ def api_ai_analyze_product(product_id: int):
     Args:
         product_id: Product ID from URL path.
 
+    Query params:
+        force: 1 to skip the analysis cache and call OpenAI again.
+
     Returns:
         JSON with analysis results and created suggestions.
     """
     try:
-        result = generate_suggestions_for_product(product_id)
+        from services.ai_agent_service import generate_suggestions_for_product
+        use_cache = request.args.get('force', '0') not in ('1', 'true')
+        result = generate_suggestions_for_product(product_id, use_cache=use_cache)
         return jsonify(result), 200
     except ValueError as e:
         return jsonify({'error': str(e)}), 404
@@ -433,7 +621,7 @@ def api_ai_analyze_product(product_id: int):
         return jsonify({'error': f'AI analysis failed: {str(e)}'}), 500
 
 
-@app.route('/api/ai/analyze-all', methods=['POST'])
+@api.route('/api/ai/analyze-all', methods=['POST'])
 def api_ai_analyze_all():
     """
     Generate AI-powered suggestions for all products.
@@ -441,18 +629,151 @@ def api_ai_analyze_all():
     Analyzes all products in the database and generates suggestions
     based on market data from DummyJSON.
 
+    Query params:
+        mode: 'sync' (default) analyzes now; 'batch' submits the run to the
+            OpenAI Batch API and returns at once (results are ingested by
+            the batch poller, see GET /api/ai/batches/<batch_id>); 'rules'
+            runs the local rules engine over the whole catalog (no LLM).
+        batch_size: Products per OpenAI request in sync mode (1-20, default
+            AI_ANALYSIS_BATCH_SIZE; 1 = one request per product).
+        max_products: Maximum products analyzed (default: half of the catalog).
+        token_budget: Maximum estimated tokens (default AI_ANALYSIS_TOKEN_BUDGET).
+        time_budget_seconds: Maximum run time in sync mode (default
+            AI_ANALYSIS_TIME_BUDGET_SECONDS).
+
+    Products are taken in priority order (stale analyses, inventory value,
+    stock risk, few pending suggestions) until a limit or budget is reached.
+
+    Body JSON (optional, rules mode):
+        Rule overrides, e.g. overstock_threshold, bundle_size, type_affinity.
+
     Returns:
-        JSON with summary of analysis results.
+        JSON with summary of analysis results (202 with the submitted batch
+        in batch mode), or 400 on invalid params.
     """
     try:
-        result = generate_suggestions_for_all_products()
+        validated = AnalyzeAllRequest(
+            mode=request.args.get('mode', default='sync'),
+            batch_size=request.args.get('batch_size', type=int),
+            max_products=request.args.get('max_products', type=int),
+            token_budget=request.args.get('token_budget', type=int),
+            time_budget_seconds=request.args.get('time_budget_seconds', type=int)
+        )
+    except ValidationError as e:
+        return handle_validation_error(e)
+
+    if validated.mode == 'rules':
+        try:
+            overrides = RulesEngineRequest(**(request.get_json(silent=True) or {}))
+        except ValidationError as e:
+            return handle_validation_error(e)
+
+        # Imported here - NumPy is only needed by the rules engine
+        from services.rules_engine_service import generate_rule_suggestions
+        return jsonify(generate_rule_suggestions(overrides.dict(exclude_none=True))), 200
+
+    try:
+        from services.analysis_scheduler_service import TOKEN_BUDGET, TIME_BUDGET_SECONDS
+        token_budget = validated.token_budget or TOKEN_BUDGET
+
+        if validated.mode == 'batch':
+            from services.ai_batch_service import submit_analysis_batch
+            return jsonify(submit_analysis_batch(max_products=validated.max_products, token_budget=token_budget)), 202
+
+        from services.ai_agent_service import generate_suggestions_for_all_products, ANALYSIS_BATCH_SIZE
+        result = generate_suggestions_for_all_products(
+            validated.batch_size or ANALYSIS_BATCH_SIZE,
+            max_products=validated.max_products,
+            token_budget=token_budget,
+            time_budget_seconds=validated.time_budget_seconds or TIME_BUDGET_SECONDS
+        )
         return jsonify(result), 200
     except Exception as e:
         logger.error(f"Bulk AI analysis failed: {e}")
         return jsonify({'error': f'AI analysis failed: {str(e)}'}), 500
 
 
+@api.route('/api/ai/batches/<batch_id>', methods=['GET'])
+def api_ai_batch(batch_id: str):
+    """
+    Get the status of a Batch API analysis run, ingesting its results if it has finished.
+
+    Args:
+        batch_id: OpenAI batch ID returned by analyze-all in batch mode.
+
+    Returns:
+        JSON with batch status, products ingested and suggestions created,
+        or 404 if the batch is unknown.
+    """
+    try:
+        from services.ai_batch_service import poll_analysis_batch
+        return jsonify(poll_analysis_batch(batch_id)), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 404
+    except Exception as e:
+        logger.error(f"Polling AI batch {batch_id} failed: {e}")
+        return jsonify({'error': f'Batch polling failed: {str(e)}'}), 500
+
+
+@api.route('/api/ai/usage', methods=['GET'])
+def api_ai_usage():
+    """
+    Get AI usage: call latency percentiles, tokens and estimated cost.
+
+    Query params:
+        days: Number of days to summarize (1-90, default 7).
+
+    Returns:
+        JSON with overall and per-model p50/p95 latency and totals,
+        and daily totals, or 400 on invalid params.
+    """
+    days = request.args.get('days', default=7, type=int)
+
+    try:
+        validated = GetAIUsageRequest(days=days)
+    except ValidationError as e:
+        return handle_validation_error(e)
+
+    return jsonify(get_ai_usage(validated.days)), 200
+
+
+# ========== Application Factory ==========
+
+def create_app() -> Flask:
+    """
+    Create and configure the Flask application.
+
+    Schema setup runs at most once per database: ensure_schema() only takes
+    the init lock and runs DDL when the stored schema version is outdated, so
+    additional workers start without writing anything. Each worker runs an
+    outbox drainer; entries are claimed atomically, so they never overlap.
+
+    Returns:
+        Configured Flask application.
+    """
+    try:
+        ensure_schema()
+    except Exception as e:
+        logger.error(f"Database initialization failed: {e}")
+        raise
+
+    app = Flask(__name__)
+    CORS(app)  # Permissive CORS for demo
+    init_compression(app)  # gzip/brotli for large JSON responses
+    app.register_blueprint(api)
+
+    # Pushes applied suggestions to Shopify/WooCommerce in the background
+    start_outbox_worker()
+    # Removes expired and superseded pending suggestions
+    start_suggestion_sweeper()
+    # Ingests finished OpenAI Batch API runs (the OpenAI client itself is only created when a batch is open)
+    from services.ai_batch_service import start_batch_poller
+    start_batch_poller()
+
+    return app
+
+
 # ========== Main Entry Point ==========
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=False)
+    create_app().run(host='0.0.0.0', port=5000, debug=False)
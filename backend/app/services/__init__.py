@@ -1,7 +1,21 @@
 """Business logic services."""
-from .product_service import get_all_products, get_product_details
-from .suggestion_service import get_suggestions_for_product, apply_suggestion
+from .product_service import (
+    get_all_products,
+    get_product_details,
+    get_products_details,
+    get_catalog_stats
+)
+from .suggestion_service import (
+    get_suggestions_for_product,
+    list_suggestions,
+    apply_suggestion,
+    apply_suggestions_batch,
+    get_suggestion_actions,
+    start_suggestion_sweeper
+)
+from .outbox_service import start_outbox_worker
 from .event_service import get_recent_events
+from .ai_usage_service import get_ai_usage
 from .connection_service import (
     get_all_connections,
     create_connection,
@@ -9,19 +23,59 @@ from .connection_service import (
     toggle_connection,
     quick_demo_setup
 )
-from .sync_service import sync_connection
-from .ai_agent_service import (
-    generate_suggestions_for_product,
-    generate_suggestions_for_all_products
+from .sync_service import sync_connection, get_sync_job
+
+# AI agent, simulation and rules engine services are loaded on first use (see
+# __getattr__) so that workers serving only the regular API never import the
+# OpenAI / market data stack or NumPy.
+_LAZY_AI_EXPORTS = (
+    'generate_suggestions_for_product',
+    'generate_suggestions_for_all_products',
+)
+_LAZY_AI_BATCH_EXPORTS = (
+    'submit_analysis_batch',
+    'poll_analysis_batch',
 )
+_LAZY_SIMULATION_EXPORTS = (
+    'simulate_pricing',
+)
+_LAZY_RULES_EXPORTS = (
+    'generate_rule_suggestions',
+)
+
+
+def __getattr__(name):
+    """Lazily import AI agent, simulation and rules engine services on first access."""
+    if name in _LAZY_AI_EXPORTS:
+        from . import ai_agent_service
+        return getattr(ai_agent_service, name)
+    if name in _LAZY_AI_BATCH_EXPORTS:
+        from . import ai_batch_service
+        return getattr(ai_batch_service, name)
+    if name in _LAZY_SIMULATION_EXPORTS:
+        from . import simulation_service
+        return getattr(simulation_service, name)
+    if name in _LAZY_RULES_EXPORTS:
+        from . import rules_engine_service
+        return getattr(rules_engine_service, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 __all__ = [
     # Product services
     'get_all_products',
     'get_product_details',
+    'get_products_details',
+    'get_catalog_stats',
     # Suggestion services
     'get_suggestions_for_product',
+    'list_suggestions',
     'apply_suggestion',
+    'apply_suggestions_batch',
+    'get_suggestion_actions',
+    'start_suggestion_sweeper',
+    # Outbox services
+    'start_outbox_worker',
     # Event services
     'get_recent_events',
     # Connection services
@@ -32,7 +86,17 @@ __all__ = [
     'quick_demo_setup',
     # Sync services
     'sync_connection',
+    'get_sync_job',
+    # AI usage services
+    'get_ai_usage',
+    # Simulation services
+    'simulate_pricing',
+    # Rules engine services
+    'generate_rule_suggestions',
     # AI Agent services
     'generate_suggestions_for_product',
     'generate_suggestions_for_all_products',
+    # AI batch services
+    'submit_analysis_batch',
+    'poll_analysis_batch',
 ]
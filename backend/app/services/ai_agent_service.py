@@ -1,51 +1,110 @@
 """AI Agent service using OpenAI to generate smart product suggestions."""
 import os
 import json
+import math
+import time
+import heapq
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Optional
 from database import get_db
 from utils.logger import get_logger
+from services import dummyjson_service
+from services.suggestion_service import save_suggestions
+from services.analysis_cache_service import analysis_cache_key, get_cached_analysis, store_analysis
+from services.ai_usage_service import tracked_completion
+from services.catalog_snapshot_service import CatalogSnapshot, SKIPPED_PRODUCT_TYPES, TYPE_AFFINITY, get_catalog_snapshot
+from services.analysis_scheduler_service import plan_analysis_run, TOKEN_BUDGET, TIME_BUDGET_SECONDS
 
-# Import OpenAI last to avoid conflicts
-from openai import OpenAI
+logger = get_logger(__name__)
 
-# Import dummyjson after OpenAI
-import sys
-sys.path.insert(0, '/app')
-from app.services import dummyjson_service
+# Concurrency limits, shared by all analyses running in this process:
+# DummyJSON lookups are cheap, LLM calls are rate limited and slow
+MARKET_CONCURRENCY = int(os.getenv('AI_MARKET_CONCURRENCY', '8'))
+LLM_CONCURRENCY = int(os.getenv('AI_LLM_CONCURRENCY', '4'))
 
-logger = get_logger(__name__)
+_market_slots = threading.BoundedSemaphore(MARKET_CONCURRENCY)
+_llm_slots = threading.BoundedSemaphore(LLM_CONCURRENCY)
+
+# Shop products offered to the model as bundle/promo partners (prompt size stays constant)
+CANDIDATE_LIMIT = int(os.getenv('AI_CANDIDATE_LIMIT', '15'))
+
+# Most candidates are other product types; products of the same type (substitutes)
+# get at most this share of the slots unless there are too few other products
+SUBSTITUTE_CANDIDATE_SHARE = 1 / 3
+
+# Candidates 4x cheaper or more expensive get no price-band score
+_LOG_PRICE_BAND = math.log(4)
+
+# Products packed into one OpenAI request by analyze-all (1 = one request per product)
+ANALYSIS_BATCH_SIZE = int(os.getenv('AI_ANALYSIS_BATCH_SIZE', '5'))
+
+SYSTEM_PROMPT = "You are an e-commerce expert specializing in pricing optimization and sales strategies."
+SUGGESTION_TYPES = ('price', 'promo', 'bundle', 'restock')
+
+# Rules and suggestion format shared by the single-product and batched prompts
+SUGGESTION_RULES = """CRITICALLY IMPORTANT:
+- ALL suggestions concern ONLY products from our Shopify store!
+- In bundle/promo use ONLY IDs from "AVAILABLE PRODUCTS IN OUR SHOPIFY STORE" section
+- ONLY use products that have stock > 0 (all listed products have stock available)
+- DO NOT use products from DummyJSON - that's only for market analysis!
+- Bundle must contain 2-3 products from our store (provide specific IDs)
+- Promo can combine 2 products (1+1, provide specific IDs)
+- If no other products are available, only suggest price optimization
+- Write ALL descriptions and reasoning in ENGLISH language!
+- Keep descriptions CONCISE (max 60 characters) - only key details
+- Keep reasoning SHORT (max 80 characters) - be direct
+- For price suggestions ALWAYS give the exact new_price in PLN
+- For promo/bundle give discount_pct (discount on the second product / whole bundle)
+- confidence is your confidence in the suggestion, from 0.0 to 1.0"""
+
+SUGGESTION_SCHEMA = """{
+      "type": "price|promo|bundle",
+      "description": "CONCISE action (max 60 chars)",
+      "reasoning": "SHORT reason (max 80 chars)",
+      "product_ids": [list of product IDs from our store, if bundle/promo],
+      "new_price": new price in PLN (number, price only, otherwise null),
+      "discount_pct": discount percent (number, promo/bundle only, otherwise null),
+      "confidence": 0.0-1.0
+    }"""
 
 # Initialize OpenAI client
 client = None
+_client_lock = threading.Lock()
 
 
-def _get_openai_client():
-    """Lazy initialization of OpenAI client."""
+def get_openai_client():
+    """Lazy initialization of OpenAI client (thread-safe - analyses run in parallel)."""
     global client
-    if client is None:
-        api_key = os.getenv('OPENAI_API_KEY')
-        if not api_key:
-            raise ValueError("OPENAI_API_KEY not set in environment variables")
-        try:
-            logger.info("Initializing OpenAI client...")
-            client = OpenAI(api_key=api_key)
-            logger.info("OpenAI client initialized successfully")
-        except Exception as e:
-            logger.error(f"OpenAI client initialization failed: {type(e).__name__}: {str(e)}")
-            import traceback
-            logger.error(traceback.format_exc())
-            raise
+    with _client_lock:
+        if client is None:
+            api_key = os.getenv('OPENAI_API_KEY')
+            if not api_key:
+                raise ValueError("OPENAI_API_KEY not set in environment variables")
+            try:
+                logger.info("Initializing OpenAI client...")
+                # Imported here - the openai package is heavy and only AI endpoints need it
+                from openai import OpenAI
+                # OPENAI_BASE_URL points the client at a proxy or a local test server
+                client = OpenAI(api_key=api_key, base_url=os.getenv('OPENAI_BASE_URL') or None)
+                logger.info("OpenAI client initialized successfully")
+            except Exception as e:
+                logger.error(f"OpenAI client initialization failed: {type(e).__name__}: {str(e)}")
+                import traceback
+                logger.error(traceback.format_exc())
+                raise
     return client
 
 
-def analyze_product_with_ai(product: Dict, market_data: List[Dict], all_shop_products: List[Dict]) -> Dict:
+def analyze_product_with_ai(product: Dict, market_data: List[Dict], candidates: List[Dict]) -> Dict:
     """
     Use OpenAI to analyze a product against market data and generate suggestions.
 
     Args:
         product: Product dictionary with id, name, price, stock, etc.
         market_data: List of similar products from DummyJSON (for analysis only).
-        all_shop_products: List of ALL products from our Shopify store.
+        candidates: Best-matching in-stock shop products offered as bundle/promo
+            partners (see select_candidate_products).
 
     Returns:
         Dict with analysis results and suggestions.
@@ -54,43 +113,55 @@ def analyze_product_with_ai(product: Dict, market_data: List[Dict], all_shop_pro
         # Check if product is out of stock
         if product['stock'] <= 0:
             logger.info(f"Product {product['id']} is out of stock, generating restock suggestion")
-            return {
-                "suggestions": [{
-                    "type": "restock",
-                    "description": f"Product '{product['name']}' is out of stock and needs to be restocked immediately to continue sales.",
-                    "reasoning": "This product has 0 units in inventory. Restocking is required before any pricing or promotional strategies can be implemented.",
-                    "product_ids": []
-                }],
-                "market_position": "Product is currently unavailable - restock needed"
-            }
-
-        ai_client = _get_openai_client()
-        model = os.getenv('OPENAI_MODEL', 'gpt-4o-mini')
-
-        # Filter shop products: only include products with stock > 0 for bundles/promos
-        available_products = [p for p in all_shop_products if p['id'] != product['id'] and p['stock'] > 0]
-
-        # Format shop products for prompt (only available ones)
-        shop_products_text = "\n".join([
-            f"- ID: {p['id']}, Name: {p['name']}, Price: {p['price']} PLN, Stock: {p['stock']} units"
-            for p in available_products
-        ])
+            return restock_analysis(product)
+
+        ai_client = get_openai_client()
 
         # Check if there are available products for bundles/promos
-        if not available_products:
+        if not candidates:
             logger.warning(f"No available products in stock for bundles/promos for product {product['id']}")
 
-        # Prepare prompt (all in English for consistency)
-        prompt = f"""You are an e-commerce and pricing strategy expert.
+        # Call OpenAI (tokens, latency and cost are recorded in ai_usage)
+        response = tracked_completion(
+            ai_client, 'product_analysis', {'product_id': product['id']},
+            **analysis_request(product, market_data, candidates)
+        )
+
+        # Parse response
+        result = json.loads(response.choices[0].message.content)
+        logger.info(f"AI analysis completed for product {product['id']}: {product['name']}")
+
+        return result
+
+    except Exception as e:
+        logger.error(f"AI analysis failed for product {product['id']}: {e}")
+        return {
+            "suggestions": [],
+            "market_position": "AI analysis unavailable",
+            "error": str(e)
+        }
+
+
+def analysis_request(product: Dict, market_data: List[Dict], candidates: List[Dict]) -> Dict:
+    """
+    Chat completion arguments for the analysis of one product.
+
+    Args:
+        product: Product dictionary with id, name, price, stock.
+        market_data: Similar products from DummyJSON (for analysis only).
+        candidates: Shop products offered as bundle/promo partners.
+
+    Returns:
+        Dict of chat.completions.create arguments (model, messages, ...).
+    """
+    # Prepare prompt (all in English for consistency)
+    prompt = f"""You are an e-commerce and pricing strategy expert.
 
 PRODUCT TO ANALYZE (OUR SHOPIFY STORE):
-- ID: {product['id']}
-- Name: {product['name']}
-- Price: {product['price']} PLN
-- Stock: {product['stock']} units
+{_format_product(product)}
 
 AVAILABLE PRODUCTS IN OUR SHOPIFY STORE (with stock > 0):
-{shop_products_text if shop_products_text else "No other products currently in stock"}
+{_format_candidates(candidates)}
 
 MARKET DATA FOR ANALYSIS (DummyJSON - for comparison only, NOT our products):
 {json.dumps(market_data[:5], indent=2, ensure_ascii=False)}
@@ -101,213 +172,584 @@ Generate maximum 2-3 suggestions for product ID {product['id']}:
 2. Promotion (promo) - combine with ANOTHER product from our store (provide its ID) - ONLY if other products are available
 3. Bundle (bundle) - combine 2-3 products from our store (provide their IDs) - ONLY if other products are available
 
-CRITICALLY IMPORTANT:
-- ALL suggestions concern ONLY products from our Shopify store!
-- In bundle/promo use ONLY IDs from "AVAILABLE PRODUCTS IN OUR SHOPIFY STORE" section
-- ONLY use products that have stock > 0 (all listed products have stock available)
-- DO NOT use products from DummyJSON - that's only for market analysis!
-- Bundle must contain 2-3 products from our store (provide specific IDs)
-- Promo can combine 2 products (1+1, provide specific IDs)
-- If no other products are available, only suggest price optimization
-- Write ALL descriptions and reasoning in ENGLISH language!
-- Keep descriptions CONCISE (max 60 characters) - only key details
-- Keep reasoning SHORT (max 80 characters) - be direct
+{SUGGESTION_RULES}
 
 Respond ONLY in JSON format (all text in English):
 {{
   "suggestions": [
-    {{
-      "type": "price|promo|bundle",
-      "description": "CONCISE action (max 60 chars)",
-      "reasoning": "SHORT reason (max 80 chars)",
-      "product_ids": [list of product IDs from our store, if bundle/promo]
-    }}
+    {SUGGESTION_SCHEMA}
   ],
   "market_position": "Brief analysis (max 120 chars)"
 }}"""
 
-        # Call OpenAI
-        response = ai_client.chat.completions.create(
+    return {
+        'model': get_model(),
+        'messages': [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ],
+        'temperature': 0.7,
+        'max_tokens': 1000,
+        'response_format': {"type": "json_object"}
+    }
+
+
+def analyze_products_batch_with_ai(items: List[Dict]) -> Dict[int, Optional[Dict]]:
+    """
+    Analyze several products with one OpenAI request.
+
+    The instructions and output format are sent once; every product gets its
+    own section with its data, its bundle/promo candidates and market data.
+    Each product's part of the answer is validated separately.
+
+    Args:
+        items: Dicts with 'product', 'market_data' and 'candidates'.
+
+    Returns:
+        Dict mapping product ID to its validated analysis, or None when the
+        model's output for that product was missing or malformed (the caller
+        retries those one by one). All None if the request itself failed.
+    """
+    product_ids = [item['product']['id'] for item in items]
+
+    try:
+        ai_client = get_openai_client()
+        model = get_model()
+
+        sections = "\n\n".join(
+            f"""### PRODUCT {position}: ID {item['product']['id']}
+{_format_product(item['product'])}
+
+AVAILABLE PRODUCTS IN OUR SHOPIFY STORE for product {item['product']['id']} (with stock > 0):
+{_format_candidates(item['candidates'])}
+
+MARKET DATA (DummyJSON - for comparison only, NOT our products):
+{json.dumps(item['market_data'][:5], ensure_ascii=False)}"""
+            for position, item in enumerate(items, start=1)
+        )
+
+        prompt = f"""You are an e-commerce and pricing strategy expert.
+
+Analyze EACH of the {len(items)} products below independently.
+
+{sections}
+
+TASK (for each product separately):
+Generate maximum 2-3 suggestions for the product:
+1. Price optimization (price) - compare with market prices
+2. Promotion (promo) - combine with ANOTHER product from our store (provide its ID) - ONLY if other products are available
+3. Bundle (bundle) - combine 2-3 products from our store (provide their IDs) - ONLY if other products are available
+
+{SUGGESTION_RULES}
+- For each product use ONLY IDs from ITS OWN "AVAILABLE PRODUCTS" section
+
+Respond ONLY in JSON format (all text in English), with exactly one entry per product ID {product_ids}:
+{{
+  "results": [
+    {{
+      "product_id": ID of the analyzed product,
+      "suggestions": [
+        {SUGGESTION_SCHEMA}
+      ],
+      "market_position": "Brief analysis (max 120 chars)"
+    }}
+  ]
+}}"""
+
+        response = tracked_completion(
+            ai_client, 'product_analysis_batch', {'product_ids': product_ids},
             model=model,
             messages=[
-                {"role": "system", "content": "You are an e-commerce expert specializing in pricing optimization and sales strategies."},
+                {"role": "system", "content": SYSTEM_PROMPT},
                 {"role": "user", "content": prompt}
             ],
             temperature=0.7,
-            max_tokens=1000,
+            max_tokens=min(4000, 700 * len(items)),
             response_format={"type": "json_object"}
         )
 
-        # Parse response
-        result = json.loads(response.choices[0].message.content)
-        logger.info(f"AI analysis completed for product {product['id']}: {product['name']}")
-
-        return result
+        results = json.loads(response.choices[0].message.content).get('results')
+        if not isinstance(results, list):
+            raise ValueError("Response has no results list")
 
     except Exception as e:
-        logger.error(f"AI analysis failed for product {product['id']}: {e}")
-        return {
-            "suggestions": [],
-            "market_position": "AI analysis unavailable",
-            "error": str(e)
-        }
+        logger.error(f"Batched AI analysis failed for products {product_ids}: {e}")
+        return {product_id: None for product_id in product_ids}
+
+    entries = {}
+    for entry in results:
+        if isinstance(entry, dict) and str(entry.get('product_id')).isdigit():
+            entries.setdefault(int(entry['product_id']), entry)
+
+    analyses = {}
+    for item in items:
+        product_id = item['product']['id']
+        candidate_ids = {candidate['id'] for candidate in item['candidates']}
+        analyses[product_id] = validate_analysis(entries.get(product_id), candidate_ids)
+        if analyses[product_id] is None:
+            logger.warning(f"Malformed batched AI output for product {product_id}, will retry alone")
 
+    logger.info(f"Batched AI analysis completed for {len(items)} products")
+    return analyses
 
-def generate_suggestions_for_product(product_id: int) -> Dict:
+
+def validate_analysis(analysis, candidate_ids: set) -> Optional[Dict]:
+    """
+    Check a model's analysis of one product.
+
+    Args:
+        analysis: Parsed model output for the product.
+        candidate_ids: Shop product IDs the model was allowed to combine with.
+
+    Returns:
+        Analysis with 'suggestions' and 'market_position', or None if it is
+        malformed (missing, unknown suggestion type, no description,
+        non-numeric values or product IDs outside the candidates).
+    """
+    if not isinstance(analysis, dict) or not isinstance(analysis.get('suggestions'), list):
+        return None
+
+    for suggestion in analysis['suggestions']:
+        if not isinstance(suggestion, dict) or suggestion.get('type') not in SUGGESTION_TYPES:
+            return None
+        if not isinstance(suggestion.get('description'), str) or not suggestion['description'].strip():
+            return None
+        for field in ('new_price', 'discount_pct', 'confidence'):
+            if suggestion.get(field) is not None and not isinstance(suggestion[field], (int, float)):
+                return None
+
+        product_ids = suggestion.get('product_ids') or []
+        if not isinstance(product_ids, list) or any(
+            not isinstance(pid, int) or pid not in candidate_ids for pid in product_ids
+        ):
+            return None
+
+    return {
+        'suggestions': analysis['suggestions'],
+        'market_position': str(analysis.get('market_position') or '')
+    }
+
+
+def select_candidate_products(product, catalog: CatalogSnapshot, limit: int = CANDIDATE_LIMIT) -> List:
+    """
+    Pick the in-stock shop products most likely to pair well with a product.
+
+    Bundles and promos pair complementary products, so candidates of the
+    types listed for the product's type in TYPE_AFFINITY rank highest, then
+    other product types. Products of the same type are substitutes and fill
+    at most SUBSTITUTE_CANDIDATE_SHARE of the slots (more only when there
+    are too few other products). Within that, candidates are ranked by
+    vendor, name similarity (shared words) and price band (closeness in log
+    price), so the prompt carries at most `limit` products however large
+    the catalog is. Name words and log prices are precomputed in the snapshot.
+
+    Args:
+        product: Product being analyzed (from the snapshot).
+        catalog: Catalog snapshot; candidates come from its in-stock products.
+        limit: Maximum number of candidates.
+
+    Returns:
+        Up to `limit` products, best match first.
+    """
+    product_words = product.words
+    complements = set(TYPE_AFFINITY.get(product.product_type, ()))
+
+    def is_substitute(candidate) -> bool:
+        return bool(product.product_type) and candidate.product_type == product.product_type
+
+    def score(candidate) -> float:
+        value = 0.0
+        if candidate.product_type in complements:
+            value += 2.0
+        elif product.product_type and candidate.product_type and not is_substitute(candidate):
+            value += 1.0
+        if product.vendor and candidate.vendor == product.vendor:
+            value += 1.0
+
+        if product_words and candidate.words:
+            value += len(product_words & candidate.words) / len(product_words | candidate.words)
+
+        # 1.0 at the same price, 0 at 4x cheaper/more expensive
+        value += max(0.0, 1.0 - abs(candidate.log_price - product.log_price) / _LOG_PRICE_BAND)
+        return value
+
+    def key(candidate):
+        return score(candidate), candidate.stock, -candidate.id
+
+    substitutes, others = [], []
+    for candidate in catalog.in_stock:
+        if candidate.id != product.id:
+            (substitutes if is_substitute(candidate) else others).append(candidate)
+
+    others = heapq.nlargest(limit, others, key=key)
+    substitute_slots = max(int(limit * SUBSTITUTE_CANDIDATE_SHARE), limit - len(others))
+    substitutes = heapq.nlargest(substitute_slots, substitutes, key=key)
+    return heapq.nlargest(limit, others + substitutes, key=key)
+
+
+def get_model() -> str:
+    """OpenAI model used for analyses."""
+    return os.getenv('OPENAI_MODEL', 'gpt-4o-mini')
+
+
+def generate_suggestions_for_product(product_id: int, use_cache: bool = True) -> Dict:
     """
     Generate AI-powered suggestions for a specific product.
 
     This function:
-    1. Fetches product from database
+    1. Takes the product from the catalog snapshot
     2. Finds similar products from DummyJSON
     3. Uses OpenAI to analyze and generate suggestions
     4. Saves suggestions to database
 
+    The market lookup and the OpenAI call each wait for a slot
+    (MARKET_CONCURRENCY / LLM_CONCURRENCY), and no database connection is
+    held while they run, so many products can be analyzed in parallel.
+
+    The analysis is served from analysis_cache when the product's name,
+    price and stock, the market data, the bundle/promo candidates and the
+    model are unchanged.
+
     Args:
         product_id: ID of the product to analyze.
+        use_cache: Reuse a cached analysis if available (always stores the result).
 
     Returns:
-        Dict with analysis results and created suggestions.
-    """
-    with get_db() as conn:
-        cursor = conn.cursor()
+        Dict with analysis results, created suggestions, whether the analysis
+        came from the cache and latency_ms (market, llm and total).
 
-        # Get product
-        cursor.execute('''
-            SELECT id, name, price, stock, status, channel, product_type
-            FROM products WHERE id = ?
-        ''', (product_id,))
-
-        row = cursor.fetchone()
-        if not row:
-            raise ValueError(f"Product {product_id} not found")
-
-        product = dict(row)
-
-        # Don't analyze bundles or promos
-        if product.get('product_type') in ['bundle', 'promotion', 'Zestaw', 'Promocja']:
-            logger.info(f"Skipping analysis for {product.get('product_type')} product {product_id}")
-            return {
-                "product_id": product_id,
-                "suggestions_created": 0,
-                "message": f"Produkt typu {product.get('product_type')} nie jest analizowany"
-            }
-
-        # Get ALL products from our shop (exclude bundles and promos)
-        cursor.execute('''
-            SELECT id, name, price, stock, status, channel
-            FROM products
-            WHERE (product_type IS NULL OR product_type NOT IN ('bundle', 'promotion', 'Zestaw', 'Promocja'))
-        ''')
-        all_shop_products = [dict(row) for row in cursor.fetchall()]
-
-        # Find similar products from DummyJSON (for market analysis only)
-        logger.info(f"Searching DummyJSON for products similar to: {product['name']}")
-        market_data = dummyjson_service.find_similar_products(product['name'], product['price'])
+    Raises:
+        ValueError: If product not found.
+    """
+    catalog = get_catalog_snapshot()
+    product = catalog.get(product_id)
+    if product is None:
+        raise ValueError(f"Product {product_id} not found")
 
-        if not market_data:
-            logger.warning(f"No market data found for product {product_id}")
-            return {
-                "product_id": product_id,
-                "suggestions_created": 0,
-                "message": "Brak danych rynkowych do analizy"
-            }
+    state = prepare_analysis(product, use_cache, catalog)
+    if 'result' in state:
+        return state['result']
 
-        # Analyze with AI
+    if state['analysis'] is None:
         logger.info(f"Analyzing product {product_id} with AI agent...")
-        analysis = analyze_product_with_ai(product, market_data, all_shop_products)
+        with _llm_slots:
+            step_started = time.perf_counter()
+            state['analysis'] = analyze_product_with_ai(state['product'], state['market_data'], state['candidates'])
+            state['latency_ms']['llm'] = _elapsed_ms(step_started)
 
-        # Save suggestions to database
-        suggestions_created = 0
-        for suggestion in analysis.get('suggestions', []):
-            try:
-                # Get product_ids for bundle/promo
-                product_ids_json = None
-                if 'product_ids' in suggestion and suggestion['product_ids']:
-                    product_ids_json = json.dumps(suggestion['product_ids'])
-
-                cursor.execute('''
-                    INSERT INTO suggestions (product_id, type, description, status, related_product_ids)
-                    VALUES (?, ?, ?, 'new', ?)
-                ''', (
-                    product_id,
-                    suggestion['type'],
-                    f"{suggestion['description']} | Reasoning: {suggestion['reasoning']}",
-                    product_ids_json
-                ))
-                suggestions_created += 1
-            except Exception as e:
-                logger.error(f"Failed to save suggestion: {e}")
+    return finish_analysis(state)
 
-        # Log event
-        cursor.execute('''
-            INSERT INTO events (product_id, event_type, description)
-            VALUES (?, 'ai_analysis', ?)
-        ''', (
-            product_id,
-            f"AI Agent generated {suggestions_created} suggestions. {analysis.get('market_position', '')}"
-        ))
 
-        logger.info(f"Created {suggestions_created} AI suggestions for product {product_id}")
+def generate_suggestions_for_all_products(batch_size: int = ANALYSIS_BATCH_SIZE, max_products: Optional[int] = None,
+                                          token_budget: Optional[int] = TOKEN_BUDGET,
+                                          time_budget_seconds: Optional[int] = TIME_BUDGET_SECONDS) -> Dict:
+    """
+    Generate AI suggestions for the highest-priority products in the database.
 
-        return {
-            "product_id": product_id,
-            "product_name": product['name'],
-            "suggestions_created": suggestions_created,
-            "market_position": analysis.get('market_position'),
-            "market_products_analyzed": len(market_data)
+    Products are ranked by staleness of their last analysis, inventory
+    value, stock risk and pending suggestions, and taken in that order
+    until max_products (default: half of the catalog) or the estimated
+    token/time budget is reached (see plan_analysis_run). The time budget
+    is also enforced while running: groups not started by then are skipped.
+
+    Products are analyzed in parallel by a thread pool sized so that both
+    the market lookups and the LLM calls can use all their slots; the
+    per-step limits are enforced by the analysis steps. With batch_size > 1
+    the products are analyzed in groups, one OpenAI request per group
+    (products with malformed output are retried one by one). All workers
+    share one immutable catalog snapshot, loaded once per run.
+
+    Args:
+        batch_size: Products per OpenAI request (1 = one request per product).
+        max_products: Maximum products analyzed (default: half of the catalog).
+        token_budget: Maximum estimated tokens (None = unlimited).
+        time_budget_seconds: Maximum run time (None = unlimited).
+
+    Returns:
+        Dict with summary of suggestions generated, per-product latency,
+        total wall time and the run plan (estimates, budget, top priorities).
+    """
+    started = time.perf_counter()
+    catalog = get_catalog_snapshot()
+    batch_size = max(1, batch_size)
+    plan = plan_analysis_run(catalog, max_products, token_budget, time_budget_seconds, LLM_CONCURRENCY, batch_size)
+    selected = plan['selected']
+    deadline = started + time_budget_seconds if time_budget_seconds else None
+
+    groups = [selected[i:i + batch_size] for i in range(0, len(selected), batch_size)]
+
+    workers = max(1, min(MARKET_CONCURRENCY + LLM_CONCURRENCY, len(groups)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        group_results = executor.map(lambda group: _analyze_group(group, catalog, deadline), groups)
+        results = [result for group_result in group_results for result in group_result]
+
+    skipped = [result for result in results if result.get('skipped')]
+    analyzed = [result for result in results if 'error' not in result and not result.get('skipped')]
+    total_suggestions = sum(result['suggestions_created'] for result in analyzed)
+    wall_time_ms = _elapsed_ms(started)
+
+    logger.info(f"Analyzed {len(analyzed)}/{len(selected)} products in {wall_time_ms} ms ({workers} workers)")
+
+    return {
+        "success": True,
+        "total_products": plan['total_products'],
+        "max_analyzed": plan['max_products'],
+        "products_selected": len(selected),
+        "products_analyzed": len(analyzed),
+        "products_skipped": len(skipped),
+        "products_from_cache": sum(1 for result in analyzed if result.get('cached')),
+        "total_suggestions_created": total_suggestions,
+        "errors": [result['error'] for result in results if 'error' in result],
+        "products": results,
+        "wall_time_ms": wall_time_ms,
+        "plan": {key: value for key, value in plan.items() if key != 'selected'},
+        "concurrency": {
+            "workers": workers,
+            "market": MARKET_CONCURRENCY,
+            "llm": LLM_CONCURRENCY,
+            "batch_size": batch_size
         }
+    }
+
+
+def _analyze_group(product_ids: List[int], catalog: CatalogSnapshot, deadline: Optional[float] = None) -> List[Dict]:
+    """
+    Analyze a group of products for analyze-all, never raising.
+
+    A single product goes through the regular per-product request; larger
+    groups share one batched request, and products whose part of the answer
+    is malformed are retried with their own request.
+
+    Groups that would start after the deadline (time.perf_counter()) are skipped.
+
+    Returns:
+        Per-product summaries (suggestions_created, cached, batched, latency_ms),
+        error entries or skipped entries.
+    """
+    if deadline is not None and time.perf_counter() >= deadline:
+        return [{"product_id": product_id, "skipped": "time budget exhausted"} for product_id in product_ids]
+
+    states = []
+    results = {}
+    for product_id in product_ids:
+        product = catalog.get(product_id)
+        if product is None:
+            results[product_id] = _error_entry(product_id, None, ValueError(f"Product {product_id} not found"))
+            continue
+        try:
+            state = prepare_analysis(product, use_cache=True, catalog=catalog)
+        except Exception as e:
+            results[product_id] = _error_entry(product_id, product.name, e)
+            continue
+
+        if 'result' in state:
+            results[product_id] = _summary_entry(state['result'])
+            continue
+
+        if state['analysis'] is None and state['product']['stock'] <= 0:
+            # Out of stock - restock suggestion without calling OpenAI
+            state['analysis'] = restock_analysis(state['product'])
+        states.append(state)
+
+    pending = [state for state in states if state['analysis'] is None]
+    if len(pending) > 1:
+        with _llm_slots:
+            step_started = time.perf_counter()
+            analyses = analyze_products_batch_with_ai(pending)
+            batch_ms = _elapsed_ms(step_started)
+
+        for state in pending:
+            state['analysis'] = analyses[state['product']['id']]
+            state['latency_ms']['llm'] = batch_ms
+            state['batched'] = state['analysis'] is not None
+
+    for state in pending:
+        if state['analysis'] is None:
+            # Single product, or its batched output was malformed
+            with _llm_slots:
+                step_started = time.perf_counter()
+                state['analysis'] = analyze_product_with_ai(state['product'], state['market_data'], state['candidates'])
+                state['latency_ms']['llm'] += _elapsed_ms(step_started)
+
+    for state in states:
+        product = state['product']
+        try:
+            results[product['id']] = _summary_entry(finish_analysis(state), batched=state.get('batched', False))
+            logger.info(f"Generated {results[product['id']]['suggestions_created']} suggestions for: {product['name']}")
+        except Exception as e:
+            results[product['id']] = _error_entry(product['id'], product['name'], e)
 
+    return [results[product_id] for product_id in product_ids]
 
-def generate_suggestions_for_all_products() -> Dict:
+
+def prepare_analysis(product: Dict, use_cache: bool, catalog: CatalogSnapshot) -> Dict:
     """
-    Generate AI suggestions for products in the database.
-    Maximum number of products with suggestions = total_products / 2.
+    Everything before the OpenAI call: type check, market lookup, candidate
+    selection and cache lookup.
 
     Returns:
-        Dict with summary of suggestions generated.
+        Analysis state with 'product', 'market_data', 'candidates',
+        'cache_key', 'analysis' (cached analysis or None), 'cached',
+        'latency_ms' and 'started' - or with 'result' when the product
+        needs no analysis.
     """
+    started = time.perf_counter()
+    latency_ms = {'market': 0.0, 'llm': 0.0}
+    product_id = product['id']
+
+    # Don't analyze bundles or promos
+    if product.get('product_type') in SKIPPED_PRODUCT_TYPES:
+        logger.info(f"Skipping analysis for {product.get('product_type')} product {product_id}")
+        return {'result': {
+            "product_id": product_id,
+            "suggestions_created": 0,
+            "message": f"Produkt typu {product.get('product_type')} nie jest analizowany"
+        }}
+
+    # Find similar products from DummyJSON (for market analysis only)
+    logger.info(f"Searching DummyJSON for products similar to: {product['name']}")
+    with _market_slots:
+        step_started = time.perf_counter()
+        market_data = dummyjson_service.find_similar_products(product['name'], product['price'])
+        latency_ms['market'] = _elapsed_ms(step_started)
+
+    if not market_data:
+        logger.warning(f"No market data found for product {product_id}")
+        return {'result': {
+            "product_id": product_id,
+            "suggestions_created": 0,
+            "message": "Brak danych rynkowych do analizy",
+            "latency_ms": dict(latency_ms, total=_elapsed_ms(started))
+        }}
+
+    # Out-of-stock products get a restock suggestion without a prompt
+    candidates = select_candidate_products(product, catalog) if product['stock'] > 0 else []
+
+    # Reuse the last analysis if nothing relevant changed since
+    cache_key = analysis_cache_key(product, market_data, get_model(), candidates)
+    analysis = get_cached_analysis(cache_key) if use_cache else None
+    if analysis is not None:
+        logger.info(f"Using cached AI analysis for product {product_id}")
+
+    return {
+        'product': product,
+        'market_data': market_data,
+        'candidates': candidates,
+        'cache_key': cache_key,
+        'analysis': analysis,
+        'cached': analysis is not None,
+        'latency_ms': latency_ms,
+        'started': started
+    }
+
+
+def finish_analysis(state: Dict) -> Dict:
+    """
+    Everything after the OpenAI call: cache the analysis and save its suggestions.
+
+    Returns:
+        Result of generate_suggestions_for_product.
+    """
+    product = state['product']
+    product_id = product['id']
+    analysis = state['analysis']
+    latency_ms = state['latency_ms']
+
+    if not state['cached'] and 'error' not in analysis:
+        store_analysis(state['cache_key'], product, analysis, get_model())
+
     with get_db() as conn:
         cursor = conn.cursor()
 
-        # Get all products (exclude bundles and promos)
+        # Save suggestions to database (skip malformed ones)
+        valid_suggestions = [
+            suggestion for suggestion in analysis.get('suggestions', [])
+            if isinstance(suggestion, dict) and suggestion.get('type') and suggestion.get('description')
+        ]
+        if len(valid_suggestions) < len(analysis.get('suggestions', [])):
+            logger.error(f"Skipped malformed AI suggestions for product {product_id}")
+
+        suggestions_created = len(save_suggestions(cursor, product_id, valid_suggestions))
+
+        # Log event; failures get their own type so the scheduler still sees the product as stale
+        if 'error' in analysis:
+            event = ('ai_analysis_failed', f"AI analysis failed: {analysis['error']}")
+        else:
+            event = ('ai_analysis', f"AI Agent generated {suggestions_created} suggestions. {analysis.get('market_position', '')}")
         cursor.execute('''
-            SELECT id, name FROM products
-            WHERE (product_type IS NULL OR product_type NOT IN ('bundle', 'promotion', 'Zestaw', 'Promocja'))
-        ''')
-        products = cursor.fetchall()
+            INSERT INTO events (product_id, event_type, description)
+            VALUES (?, ?, ?)
+        ''', (product_id, *event))
 
-    # Limit to half of products
-    total_products = len(products)
-    max_products_to_analyze = max(1, total_products // 2)
+    latency_ms['total'] = _elapsed_ms(state['started'])
+    logger.info(f"Created {suggestions_created} AI suggestions for product {product_id} in {latency_ms['total']} ms")
 
-    logger.info(f"Total products: {total_products}, will analyze max: {max_products_to_analyze}")
+    return {
+        "product_id": product_id,
+        "product_name": product['name'],
+        "suggestions_created": suggestions_created,
+        "market_position": analysis.get('market_position'),
+        "market_products_analyzed": len(state['market_data']),
+        "cached": state['cached'],
+        "latency_ms": latency_ms
+    }
 
-    total_suggestions = 0
-    products_analyzed = 0
-    errors = []
 
-    # Analyze only first half (or randomize selection)
-    for product_row in products[:max_products_to_analyze]:
-        product_id = product_row[0]
-        product_name = product_row[1]
+def restock_analysis(product: Dict) -> Dict:
+    """Analysis of an out-of-stock product - restocking comes before anything else."""
+    return {
+        "suggestions": [{
+            "type": "restock",
+            "description": f"Product '{product['name']}' is out of stock and needs to be restocked immediately to continue sales.",
+            "reasoning": "This product has 0 units in inventory. Restocking is required before any pricing or promotional strategies can be implemented.",
+            "product_ids": [],
+            "confidence": 1.0
+        }],
+        "market_position": "Product is currently unavailable - restock needed"
+    }
 
-        try:
-            result = generate_suggestions_for_product(product_id)
-            total_suggestions += result['suggestions_created']
-            products_analyzed += 1
-            logger.info(f"Generated {result['suggestions_created']} suggestions for: {product_name}")
 
-        except Exception as e:
-            error_msg = f"Failed for product {product_id} ({product_name}): {str(e)}"
-            errors.append(error_msg)
-            logger.error(error_msg)
+def _format_product(product: Dict) -> str:
+    """Product lines of a prompt."""
+    return (
+        f"- ID: {product['id']}\n"
+        f"- Name: {product['name']}\n"
+        f"- Price: {product['price']} PLN\n"
+        f"- Stock: {product['stock']} units"
+    )
+
+
+def _format_candidates(candidates: List[Dict]) -> str:
+    """Bundle/promo candidate lines of a prompt (precomputed in the snapshot)."""
+    if not candidates:
+        return "No other products currently in stock"
+
+    return "\n".join(p.prompt_line for p in candidates)
 
+
+def _summary_entry(result: Dict, batched: bool = False) -> Dict:
+    """Per-product line of the analyze-all summary."""
     return {
-        "success": True,
-        "total_products": total_products,
-        "max_analyzed": max_products_to_analyze,
-        "products_analyzed": products_analyzed,
-        "total_suggestions_created": total_suggestions,
-        "errors": errors
+        "product_id": result['product_id'],
+        "product_name": result.get('product_name'),
+        "suggestions_created": result['suggestions_created'],
+        "cached": result.get('cached', False),
+        "batched": batched,
+        "latency_ms": result.get('latency_ms', {})
     }
+
+
+def _error_entry(product_id: int, product_name: Optional[str], error: Exception) -> Dict:
+    """Per-product error line of the analyze-all summary."""
+    error_msg = f"Failed for product {product_id} ({product_name}): {str(error)}"
+    logger.error(error_msg)
+    return {
+        "product_id": product_id,
+        "product_name": product_name,
+        "error": error_msg
+    }
+
+
+def _elapsed_ms(started: float) -> float:
+    """Milliseconds since a time.perf_counter() timestamp."""
+    return round((time.perf_counter() - started) * 1000, 1)
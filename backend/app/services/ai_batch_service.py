@@ -0,0 +1,466 @@
+"""Offline product re-analysis through the OpenAI Batch API (one JSONL file per run)."""
+import os
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import List, Dict, Optional
+from database import get_db
+from utils.logger import get_logger
+from services.suggestion_service import save_suggestions
+from services.analysis_cache_service import store_analyses
+from services.ai_usage_service import record_usage, BATCH_API_COST_FACTOR
+from services.catalog_snapshot_service import get_catalog_snapshot
+from services.analysis_scheduler_service import plan_analysis_run, TOKEN_BUDGET
+
+logger = get_logger(__name__)
+
+BATCH_ENDPOINT = '/v1/chat/completions'
+BATCH_COMPLETION_WINDOW = '24h'
+BATCH_POLL_SECONDS = int(os.getenv('AI_BATCH_POLL_SECONDS', '300'))
+# Hour (0-23) of the nightly batch submission; unset = no nightly run
+BATCH_NIGHTLY_HOUR = os.getenv('AI_BATCH_NIGHTLY_HOUR')
+# Batches left 'ingesting' this long (worker crashed mid-ingestion) are ingested again
+BATCH_INGEST_TIMEOUT_MINUTES = int(os.getenv('AI_BATCH_INGEST_TIMEOUT_MINUTES', '30'))
+
+# Batches in these statuses are not polled any more ('ingesting' = results being saved)
+DONE_STATUSES = ('ingested', 'failed', 'expired', 'cancelled')
+# OpenAI statuses after which the batch no longer changes
+FINAL_BATCH_STATUSES = ('completed', 'failed', 'expired', 'cancelled')
+
+_poller = None
+
+# ai_agent_service (OpenAI client, market data) is imported inside the jobs:
+# create_app() starts the poller in every worker, and most of them never
+# submit or ingest a batch.
+
+
+def submit_analysis_batch(product_ids: Optional[List[int]] = None, max_products: Optional[int] = None,
+                          token_budget: Optional[int] = TOKEN_BUDGET) -> Dict:
+    """
+    Submit an analyze-all run to the OpenAI Batch API.
+
+    Market and cache lookups run now (MARKET_CONCURRENCY in parallel).
+    Cached and out-of-stock products are finished right away. The other
+    products' chat requests go into one JSONL file, which is uploaded and
+    submitted as a batch. These are the same requests the synchronous path
+    sends. poll_analysis_batch() ingests the results when the batch
+    completes; the batch poller calls it.
+
+    Args:
+        product_ids: Products to analyze (default: the analyze-all priority plan).
+        max_products: Maximum products planned (default: half of the catalog).
+        token_budget: Maximum estimated tokens of the plan (None = unlimited).
+
+    Returns:
+        Dict with batch_id and status (None when no product needed the LLM),
+        requests, products_finished (cached or out of stock) and
+        products_skipped (not found, bundle/promo or no market data).
+    """
+    from services import ai_agent_service
+
+    catalog = get_catalog_snapshot()
+    if product_ids is None:
+        # Batch turnaround is not bounded by us - only the token budget applies
+        product_ids = plan_analysis_run(catalog, max_products, token_budget, time_budget_seconds=None)['selected']
+
+    def prepare(product_id: int) -> Optional[Dict]:
+        product = catalog.get(product_id)
+        if product is None:
+            return None
+        try:
+            return ai_agent_service.prepare_analysis(product, use_cache=True, catalog=catalog)
+        except Exception as e:
+            logger.error(f"Batch preparation failed for product {product_id}: {e}")
+            return None
+
+    workers = max(1, min(ai_agent_service.MARKET_CONCURRENCY, len(product_ids)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        states = list(executor.map(prepare, product_ids))
+
+    lines = []
+    batch_products = {}
+    products_finished = 0
+    products_skipped = 0
+
+    for state in states:
+        if state is None or 'result' in state:
+            products_skipped += 1
+            continue
+
+        product = state['product']
+        if state['analysis'] is not None or product['stock'] <= 0:
+            # Cached, or out of stock (restock suggestion without calling OpenAI)
+            state['analysis'] = state['analysis'] or ai_agent_service.restock_analysis(product)
+            ai_agent_service.finish_analysis(state)
+            products_finished += 1
+            continue
+
+        candidates = state['candidates']
+        lines.append(json.dumps({
+            'custom_id': f"product-{product['id']}",
+            'method': 'POST',
+            'url': BATCH_ENDPOINT,
+            'body': ai_agent_service.analysis_request(product, state['market_data'], candidates)
+        }, ensure_ascii=False))
+        batch_products[str(product['id'])] = {
+            'sku': product.get('sku'),
+            'cache_key': state['cache_key'],
+            'candidate_ids': [candidate['id'] for candidate in candidates]
+        }
+
+    result = {
+        'batch_id': None,
+        'status': None,
+        'requests': len(lines),
+        'products_finished': products_finished,
+        'products_skipped': products_skipped
+    }
+    if not lines:
+        logger.info("No products need AI analysis, batch not submitted")
+        return result
+
+    ai_client = ai_agent_service.get_openai_client()
+    model = ai_agent_service.get_model()
+
+    input_file = ai_client.files.create(
+        file=('product_analysis.jsonl', '\n'.join(lines).encode('utf-8')),
+        purpose='batch'
+    )
+    batch = ai_client.batches.create(
+        input_file_id=input_file.id,
+        endpoint=BATCH_ENDPOINT,
+        completion_window=BATCH_COMPLETION_WINDOW,
+        metadata={'operation': 'product_analysis'}
+    )
+
+    with get_db() as conn:
+        conn.execute('''
+            INSERT INTO ai_batches (batch_id, status, model, input_file_id, request_count,
+                                    products, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (batch.id, batch.status, model, input_file.id, len(lines),
+              json.dumps(batch_products), _now(), _now()))
+
+    logger.info(f"Submitted AI analysis batch {batch.id} with {len(lines)} requests")
+    result.update(batch_id=batch.id, status=batch.status)
+    return result
+
+
+def poll_analysis_batch(batch_id: str) -> Dict:
+    """
+    Check a submitted batch and ingest its results once it has finished.
+
+    Results are validated per product. All suggestions, events and cache
+    entries are saved in bulk. Products with a failed or malformed result
+    are reported in error_message and are not retried; the next run picks
+    them up because nothing is cached for them.
+
+    Args:
+        batch_id: OpenAI batch ID.
+
+    Returns:
+        Batch summary (status, requests, products_ingested, suggestions_created, ...).
+
+    Raises:
+        ValueError: If the batch is not known.
+    """
+    from services import ai_agent_service
+
+    row = _get_batch(batch_id)
+    if row['status'] in DONE_STATUSES or row['status'] == 'ingesting':
+        return _batch_summary(row)
+
+    ai_client = ai_agent_service.get_openai_client()
+    batch = ai_client.batches.retrieve(batch_id)
+
+    if batch.status not in FINAL_BATCH_STATUSES:
+        with get_db() as conn:
+            conn.execute('UPDATE ai_batches SET status = ?, updated_at = ? WHERE batch_id = ?',
+                         (batch.status, _now(), batch_id))
+        return _batch_summary(_get_batch(batch_id))
+
+    # Claim the ingestion - the poller and the API may poll the same batch
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            UPDATE ai_batches SET status = 'ingesting', output_file_id = ?, updated_at = ?
+            WHERE batch_id = ? AND status NOT IN ({','.join(['?'] * len(DONE_STATUSES))}, 'ingesting')
+        ''', (batch.output_file_id, _now(), batch_id, *DONE_STATUSES))
+        claimed = cursor.rowcount == 1
+
+    if not claimed:
+        return _batch_summary(_get_batch(batch_id))
+
+    try:
+        if batch.output_file_id:
+            output = ai_client.files.content(batch.output_file_id).text
+            ingested = _ingest_results(row, output, batch)
+        else:
+            ingested = {
+                'products_ingested': 0,
+                'suggestions_created': 0,
+                'failed_products': sorted(int(pid) for pid in json.loads(row['products']))
+            }
+            with get_db() as conn:
+                _finish_batch(conn.cursor(), batch_id, batch.status, ingested)
+    except Exception:
+        # Release the claim so the next poll ingests it again (unless the results were already saved)
+        with get_db() as conn:
+            conn.execute('''
+                UPDATE ai_batches SET status = ?, updated_at = ?
+                WHERE batch_id = ? AND status = 'ingesting'
+            ''', (row['status'], _now(), batch_id))
+        raise
+
+    logger.info(
+        f"Batch {batch_id} {batch.status}: {ingested['products_ingested']} products ingested, "
+        f"{ingested['suggestions_created']} suggestions created"
+    )
+    return _batch_summary(_get_batch(batch_id))
+
+
+def submit_nightly_batch() -> Optional[Dict]:
+    """
+    Submit tonight's batch unless another worker already has (the nightly job).
+
+    Every worker schedules this job. The night is claimed by inserting its
+    ai_batch_runs row, so only the worker that inserts it submits. A failed
+    submission keeps the claim (with its error) instead of being retried by
+    the other workers, as it may have reached OpenAI.
+
+    Returns:
+        submit_analysis_batch() result, or None if the night was already claimed.
+    """
+    run_date = datetime.now().date().isoformat()
+
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('INSERT OR IGNORE INTO ai_batch_runs (run_date) VALUES (?)', (run_date,))
+        if cursor.rowcount != 1:
+            logger.info(f"Nightly AI batch for {run_date} already submitted by another worker")
+            return None
+
+    try:
+        result = submit_analysis_batch()
+    except Exception as e:
+        with get_db() as conn:
+            conn.execute('UPDATE ai_batch_runs SET error_message = ? WHERE run_date = ?', (str(e), run_date))
+        raise
+
+    with get_db() as conn:
+        conn.execute('UPDATE ai_batch_runs SET batch_id = ? WHERE run_date = ?', (result['batch_id'], run_date))
+    return result
+
+
+def poll_open_batches() -> List[Dict]:
+    """
+    Poll every batch that has not finished yet (the poller job).
+
+    Batches stuck in 'ingesting' for BATCH_INGEST_TIMEOUT_MINUTES are
+    released first, so a worker that died while ingesting does not leave
+    its batch unprocessed. Results are saved in the same transaction that
+    marks a batch ingested, so a released batch has saved nothing yet.
+
+    Returns:
+        Summaries of the polled batches (failures are logged and skipped).
+    """
+    stale_before = (datetime.now() - timedelta(minutes=BATCH_INGEST_TIMEOUT_MINUTES)).isoformat(
+        sep=' ', timespec='seconds')
+
+    with get_db() as conn:
+        cursor = conn.cursor()
+        # Any non-final status makes poll_analysis_batch() check OpenAI and claim it again
+        cursor.execute('''
+            UPDATE ai_batches SET status = 'in_progress', updated_at = ?
+            WHERE status = 'ingesting' AND updated_at < ?
+        ''', (_now(), stale_before))
+        if cursor.rowcount:
+            logger.warning(f"Released {cursor.rowcount} AI batches stuck in ingestion")
+
+        cursor.execute(f'''
+            SELECT batch_id FROM ai_batches
+            WHERE status NOT IN ({','.join(['?'] * len(DONE_STATUSES))}, 'ingesting')
+            ORDER BY id
+        ''', DONE_STATUSES)
+        batch_ids = [row['batch_id'] for row in cursor.fetchall()]
+
+    summaries = []
+    for batch_id in batch_ids:
+        try:
+            summaries.append(poll_analysis_batch(batch_id))
+        except Exception as e:
+            logger.error(f"Polling AI analysis batch {batch_id} failed: {e}")
+    return summaries
+
+
+def start_batch_poller() -> None:
+    """
+    Start the background scheduler that polls open batches (and submits the nightly run).
+
+    Disabled when AI_BATCH_POLL_ENABLED=0 (e.g. for one-off scripts). The
+    nightly submission runs only when AI_BATCH_NIGHTLY_HOUR is set.
+    """
+    global _poller
+
+    if _poller is not None or os.getenv('AI_BATCH_POLL_ENABLED', '1') == '0':
+        return
+
+    from apscheduler.schedulers.background import BackgroundScheduler
+
+    _poller = BackgroundScheduler(daemon=True)
+    _poller.add_job(poll_open_batches, 'interval', seconds=BATCH_POLL_SECONDS,
+                    id='poll_ai_batches', max_instances=1, coalesce=True)
+    if BATCH_NIGHTLY_HOUR:
+        _poller.add_job(submit_nightly_batch, 'cron', hour=int(BATCH_NIGHTLY_HOUR),
+                        id='submit_ai_batch', max_instances=1, coalesce=True)
+    _poller.start()
+    logger.info(f"AI batch poller started (every {BATCH_POLL_SECONDS}s)")
+
+
+def _ingest_results(row, output: str, batch) -> Dict:
+    """
+    Validate a batch output file and save all valid analyses in one transaction.
+
+    Returns:
+        Dict with products_ingested, suggestions_created and failed_products.
+    """
+    from services import ai_agent_service
+
+    batch_products = json.loads(row['products'])
+    analyses = {}
+    prompt_tokens = completion_tokens = 0
+
+    for line in output.splitlines():
+        if not line.strip():
+            continue
+        entry = json.loads(line)
+        product_key = str(entry.get('custom_id', '')).replace('product-', '', 1)
+        response = entry.get('response') or {}
+        body = response.get('body') or {}
+
+        usage = body.get('usage') or {}
+        prompt_tokens += usage.get('prompt_tokens') or 0
+        completion_tokens += usage.get('completion_tokens') or 0
+
+        if product_key not in batch_products or response.get('status_code') != 200:
+            continue
+        try:
+            content = json.loads(body['choices'][0]['message']['content'])
+        except (KeyError, IndexError, TypeError, ValueError):
+            continue
+
+        candidate_ids = set(batch_products[product_key]['candidate_ids'])
+        analysis = ai_agent_service.validate_analysis(content, candidate_ids)
+        if analysis is not None:
+            analyses[int(product_key)] = analysis
+
+    failed_products = sorted(int(pid) for pid in batch_products if int(pid) not in analyses)
+    suggestions_created = 0
+
+    with get_db() as conn:
+        cursor = conn.cursor()
+
+        # Products may have been removed since the batch was submitted
+        product_ids = list(analyses)
+        cursor.execute(f'''
+            SELECT id FROM products WHERE id IN ({','.join(['?'] * len(product_ids))})
+        ''', product_ids)
+        existing = {r['id'] for r in cursor.fetchall()}
+
+        events = []
+        for product_id in product_ids:
+            if product_id not in existing:
+                del analyses[product_id]
+                continue
+            created = len(save_suggestions(cursor, product_id, analyses[product_id]['suggestions']))
+            suggestions_created += created
+            events.append((
+                product_id,
+                f"AI Agent generated {created} suggestions (batch). {analyses[product_id]['market_position']}"
+            ))
+
+        cursor.executemany('''
+            INSERT INTO events (product_id, event_type, description)
+            VALUES (?, 'ai_analysis', ?)
+        ''', events)
+
+        # Same transaction: a worker dying after the commit cannot leave the batch to be ingested again
+        ingested = {
+            'products_ingested': len(analyses),
+            'suggestions_created': suggestions_created,
+            'failed_products': failed_products
+        }
+        _finish_batch(cursor, row['batch_id'], batch.status, ingested)
+
+    store_analyses([
+        (batch_products[str(product_id)]['cache_key'],
+         {'id': product_id, 'sku': batch_products[str(product_id)]['sku']},
+         analysis)
+        for product_id, analysis in analyses.items()
+    ], row['model'])
+
+    # One usage row per batch; duration is the batch turnaround
+    turnaround_ms = 0
+    if getattr(batch, 'completed_at', None) and getattr(batch, 'created_at', None):
+        turnaround_ms = (batch.completed_at - batch.created_at) * 1000
+    record_usage(
+        row['model'], 'product_analysis_batch_api',
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+        duration_ms=turnaround_ms,
+        success=batch.status == 'completed',
+        metadata={'batch_id': row['batch_id'], 'requests': row['request_count'], 'failed': len(failed_products)},
+        cost_factor=BATCH_API_COST_FACTOR
+    )
+
+    return ingested
+
+
+def _finish_batch(cursor, batch_id: str, batch_status: str, ingested: Dict) -> None:
+    """Store the ingestion result and final status of a batch."""
+    error_message = None
+    if ingested['failed_products']:
+        error_message = f"No valid result for products: {ingested['failed_products']}"
+    if batch_status != 'completed':
+        error_message = f"Batch {batch_status}" + (f". {error_message}" if error_message else '')
+
+    cursor.execute('''
+        UPDATE ai_batches
+        SET status = ?, products_ingested = ?, suggestions_created = ?,
+            error_message = ?, updated_at = ?, completed_at = ?
+        WHERE batch_id = ?
+    ''', ('ingested' if batch_status == 'completed' else batch_status,
+          ingested['products_ingested'], ingested['suggestions_created'],
+          error_message, _now(), _now(), batch_id))
+
+
+def _get_batch(batch_id: str):
+    """Stored batch row; raises ValueError if unknown."""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM ai_batches WHERE batch_id = ?', (batch_id,))
+        row = cursor.fetchone()
+
+    if not row:
+        raise ValueError(f"Batch {batch_id} not found")
+    return row
+
+
+def _batch_summary(row) -> Dict:
+    """API view of a batch row (without the per-product ingestion data)."""
+    return {
+        'batch_id': row['batch_id'],
+        'status': row['status'],
+        'model': row['model'],
+        'requests': row['request_count'],
+        'products_ingested': row['products_ingested'],
+        'suggestions_created': row['suggestions_created'],
+        'error_message': row['error_message'],
+        'created_at': row['created_at'],
+        'completed_at': row['completed_at']
+    }
+
+
+def _now() -> str:
+    """Current time in the format used by batch timestamps."""
+    return datetime.now().isoformat(sep=' ', timespec='seconds')
@@ -0,0 +1,285 @@
+"""AI usage accounting - tokens, latency and estimated cost of every OpenAI call."""
+import os
+import json
+import time
+import queue
+import atexit
+import threading
+from typing import List, Dict, Optional
+from datetime import datetime, timedelta
+from database import get_db
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# USD per 1M tokens (prompt, completion); unknown models are recorded with cost 0
+MODEL_PRICES = {
+    'gpt-4o-mini': (0.15, 0.60),
+    'gpt-4o': (2.50, 10.00),
+    'gpt-4.1-mini': (0.40, 1.60),
+    'gpt-4.1': (2.00, 8.00),
+    'gpt-3.5-turbo': (0.50, 1.50),
+}
+
+# Batch API requests are billed at half the list price
+BATCH_API_COST_FACTOR = 0.5
+
+# Usage rows are written by a background thread in batches
+USAGE_BATCH_SIZE = 50
+USAGE_FLUSH_SECONDS = float(os.getenv('AI_USAGE_FLUSH_SECONDS', '2'))
+
+# Longest a usage report / interpreter exit waits for the batch the writer has in flight
+USAGE_REPORT_FLUSH_TIMEOUT_SECONDS = 1.0
+USAGE_EXIT_FLUSH_TIMEOUT_SECONDS = 5.0
+
+_pending = queue.Queue()
+# Queued by flush_usage to make the writer store its partial batch right away
+_FLUSH = object()
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def tracked_completion(ai_client, operation: str, metadata: Optional[Dict] = None, **kwargs):
+    """
+    Call chat.completions.create and record its usage (also when it fails).
+
+    Args:
+        ai_client: OpenAI client.
+        operation: What the call is for (e.g. 'product_analysis').
+        metadata: Extra details stored with the usage row (e.g. product_id).
+        **kwargs: Arguments for chat.completions.create (model is required).
+
+    Returns:
+        The completion response.
+
+    Raises:
+        Exception: Whatever the OpenAI client raised.
+    """
+    started = time.perf_counter()
+    try:
+        response = ai_client.chat.completions.create(**kwargs)
+    except Exception as e:
+        record_usage(kwargs['model'], operation, duration_ms=_elapsed_ms(started),
+                     success=False, error_message=str(e), metadata=metadata)
+        raise
+
+    usage = getattr(response, 'usage', None)
+    record_usage(
+        kwargs['model'], operation,
+        prompt_tokens=getattr(usage, 'prompt_tokens', 0) or 0,
+        completion_tokens=getattr(usage, 'completion_tokens', 0) or 0,
+        duration_ms=_elapsed_ms(started),
+        metadata=metadata
+    )
+    return response
+
+
+def record_usage(model: str, operation: str, prompt_tokens: int = 0, completion_tokens: int = 0,
+                 duration_ms: int = 0, success: bool = True, error_message: Optional[str] = None,
+                 metadata: Optional[Dict] = None, cost_factor: float = 1.0) -> None:
+    """
+    Queue a usage row; the background writer stores it with the next batch.
+
+    Args:
+        model: OpenAI model name.
+        operation: What the call was for.
+        prompt_tokens: Prompt tokens billed.
+        completion_tokens: Completion tokens billed.
+        duration_ms: Call latency in milliseconds.
+        success: Whether the call succeeded.
+        error_message: Error of a failed call.
+        metadata: Extra details (JSON-serializable).
+        cost_factor: Multiplier of the list price (e.g. BATCH_API_COST_FACTOR).
+    """
+    _pending.put((
+        model,
+        operation,
+        prompt_tokens,
+        completion_tokens,
+        prompt_tokens + completion_tokens,
+        round(estimate_cost(model, prompt_tokens, completion_tokens) * cost_factor, 6),
+        int(duration_ms),
+        1 if success else 0,
+        error_message,
+        json.dumps(metadata) if metadata else None,
+        datetime.now().isoformat(sep=' ', timespec='seconds')
+    ))
+    _ensure_writer()
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    """
+    Estimated cost of a call in USD.
+
+    Dated model versions (e.g. 'gpt-4o-mini-2024-07-18') use their base model price.
+    """
+    prices = MODEL_PRICES.get(model)
+    if prices is None:
+        base = max((name for name in MODEL_PRICES if model.startswith(f"{name}-")), key=len, default=None)
+        prices = MODEL_PRICES.get(base, (0.0, 0.0))
+
+    return round((prompt_tokens * prices[0] + completion_tokens * prices[1]) / 1_000_000, 6)
+
+
+def flush_usage(timeout: Optional[float] = None) -> bool:
+    """
+    Write all queued usage rows now and wait for the batch in flight.
+
+    Args:
+        timeout: Longest wait for the writer thread in seconds (None waits until it is done).
+
+    Returns:
+        True if every queued row was written, False if the wait timed out.
+    """
+    batch = []
+    while True:
+        try:
+            batch.append(_pending.get_nowait())
+        except queue.Empty:
+            break
+
+    _write_batch(batch)
+    if _pending.unfinished_tasks:
+        _pending.put(_FLUSH)
+
+    deadline = None if timeout is None else time.monotonic() + timeout
+    with _pending.all_tasks_done:
+        while _pending.unfinished_tasks:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return False
+            _pending.all_tasks_done.wait(remaining)
+    return True
+
+
+def get_ai_usage(days: int = 7) -> Dict:
+    """
+    Summarize AI usage: latency percentiles, per-model and daily totals.
+
+    Args:
+        days: Number of days to include (today included).
+
+    Returns:
+        Dict with overall totals and p50/p95 latency, the same per model,
+        and totals per day (newest first).
+    """
+    # Rows the writer is still holding show up in the next report rather than blocking this one
+    if not flush_usage(timeout=USAGE_REPORT_FLUSH_TIMEOUT_SECONDS):
+        logger.warning("AI usage writer is behind; report may miss the latest calls")
+    since = (datetime.now() - timedelta(days=days - 1)).strftime('%Y-%m-%d 00:00:00')
+
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT
+                substr(created_at, 1, 10) AS day,
+                COUNT(*) AS calls,
+                SUM(1 - success) AS errors,
+                SUM(prompt_tokens) AS prompt_tokens,
+                SUM(completion_tokens) AS completion_tokens,
+                SUM(total_tokens) AS total_tokens,
+                ROUND(SUM(cost), 6) AS cost,
+                ROUND(AVG(duration), 1) AS avg_latency_ms
+            FROM ai_usage
+            WHERE created_at >= ?
+            GROUP BY day
+            ORDER BY day DESC
+        ''', (since,))
+        daily = [dict(row) for row in cursor.fetchall()]
+
+        cursor.execute('''
+            SELECT model, duration, total_tokens, cost, success
+            FROM ai_usage
+            WHERE created_at >= ?
+            ORDER BY duration
+        ''', (since,))
+        rows = cursor.fetchall()
+
+    by_model = {}
+    for row in rows:
+        by_model.setdefault(row['model'], []).append(row)
+
+    return {
+        'days': days,
+        'since': since,
+        'overall': _summarize_calls(rows),
+        'by_model': {model: _summarize_calls(model_rows) for model, model_rows in by_model.items()},
+        'daily': daily
+    }
+
+
+def _summarize_calls(rows: List) -> Dict:
+    """Totals and latency percentiles of usage rows sorted by duration."""
+    durations = [row['duration'] for row in rows]
+    return {
+        'calls': len(rows),
+        'errors': sum(1 for row in rows if not row['success']),
+        'total_tokens': sum(row['total_tokens'] for row in rows),
+        'cost': round(sum(row['cost'] for row in rows), 6),
+        'p50_latency_ms': _percentile(durations, 50),
+        'p95_latency_ms': _percentile(durations, 95)
+    }
+
+
+def _percentile(sorted_values: List[int], percent: int) -> Optional[int]:
+    """Nearest-rank percentile of an ascending list (None if empty)."""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * percent // 100))
+    return sorted_values[rank - 1]
+
+
+def _ensure_writer() -> None:
+    """Start the background writer thread on first use."""
+    global _writer
+
+    if _writer is not None:
+        return
+
+    with _writer_lock:
+        if _writer is None:
+            _writer = threading.Thread(target=_writer_loop, name='ai-usage-writer', daemon=True)
+            _writer.start()
+            atexit.register(flush_usage, USAGE_EXIT_FLUSH_TIMEOUT_SECONDS)
+
+
+def _writer_loop() -> None:
+    """Collect queued rows into batches (up to USAGE_BATCH_SIZE or USAGE_FLUSH_SECONDS) and write them."""
+    while True:
+        batch = [_pending.get()]
+        deadline = time.monotonic() + USAGE_FLUSH_SECONDS
+
+        while len(batch) < USAGE_BATCH_SIZE and batch[-1] is not _FLUSH:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(_pending.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        _write_batch(batch)
+
+
+def _write_batch(batch: List[tuple]) -> None:
+    """Insert usage rows; accounting failures are logged, never raised."""
+    rows = [row for row in batch if row is not _FLUSH]
+
+    try:
+        if rows:
+            with get_db() as conn:
+                conn.executemany('''
+                    INSERT INTO ai_usage (model, operation, prompt_tokens, completion_tokens, total_tokens,
+                                          cost, duration, success, error_message, metadata, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', rows)
+    except Exception as e:
+        logger.error(f"Failed to write {len(rows)} AI usage rows: {e}")
+    finally:
+        for _ in batch:
+            _pending.task_done()
+
+
+def _elapsed_ms(started: float) -> int:
+    """Milliseconds since a time.perf_counter() timestamp."""
+    return int((time.perf_counter() - started) * 1000)
@@ -0,0 +1,143 @@
+"""Persistent cache of AI analysis results, keyed on the analysis inputs."""
+import os
+import json
+import hashlib
+from typing import List, Dict, Optional
+from datetime import datetime, timedelta
+from database import get_db
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# How long a cached analysis stays valid
+ANALYSIS_CACHE_TTL_HOURS = int(os.getenv('ANALYSIS_CACHE_TTL_HOURS', '24'))
+# Bump when the analysis prompt changes so old results are not reused
+ANALYSIS_PROMPT_VERSION = 4
+
+
+def analysis_cache_key(product: Dict, market_data: List[Dict], model: str, candidates: List[Dict]) -> str:
+    """
+    Fingerprint of everything that determines an analysis.
+
+    Args:
+        product: Product with name, price and stock.
+        market_data: Market data passed to the model.
+        model: OpenAI model name.
+        candidates: Shop products offered as bundle/promo partners (id and price
+            are used; suggestions reference them, so a changed set is a miss).
+
+    Returns:
+        SHA-256 hex digest.
+    """
+    key = json.dumps([
+        ANALYSIS_PROMPT_VERSION,
+        model,
+        product['name'],
+        product['price'],
+        product['stock'],
+        market_data,
+        sorted((candidate['id'], candidate['price']) for candidate in candidates)
+    ], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def get_cached_analysis(cache_key: str) -> Optional[Dict]:
+    """
+    Look up an unexpired analysis.
+
+    Args:
+        cache_key: Key from analysis_cache_key().
+
+    Returns:
+        Cached analysis result, or None on a miss.
+    """
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT result FROM analysis_cache
+            WHERE cache_key = ? AND expires_at > ?
+        ''', (cache_key, _now()))
+        row = cursor.fetchone()
+
+    return json.loads(row['result']) if row else None
+
+
+def store_analysis(cache_key: str, product: Dict, result: Dict, model: str) -> None:
+    """
+    Save an analysis result (replacing an older one with the same key).
+
+    Args:
+        cache_key: Key from analysis_cache_key().
+        product: Analyzed product (id, sku optional).
+        result: Analysis returned by the model.
+        model: OpenAI model name.
+    """
+    store_analyses([(cache_key, product, result)], model)
+
+
+def store_analyses(entries: List[tuple], model: str) -> None:
+    """
+    Save many analysis results in one transaction.
+
+    Args:
+        entries: (cache_key, product, result) tuples, as for store_analysis().
+        model: OpenAI model name.
+    """
+    if not entries:
+        return
+
+    metadata = json.dumps({'model': model, 'prompt_version': ANALYSIS_PROMPT_VERSION})
+    created_at, expires_at = _now(), _now(ANALYSIS_CACHE_TTL_HOURS)
+
+    rows = []
+    for cache_key, product, result in entries:
+        confidences = [
+            s['confidence'] for s in result.get('suggestions', [])
+            if isinstance(s, dict) and isinstance(s.get('confidence'), (int, float))
+        ]
+        confidence = sum(confidences) / len(confidences) if confidences else 0.5
+        rows.append((
+            cache_key,
+            product['id'],
+            product.get('sku'),
+            json.dumps(result, ensure_ascii=False),
+            confidence,
+            metadata,
+            expires_at,
+            created_at
+        ))
+
+    with get_db() as conn:
+        conn.executemany('''
+            INSERT INTO analysis_cache (cache_key, type, product_id, product_sku, result,
+                                        confidence, metadata, expires_at, created_at)
+            VALUES (?, 'product_analysis', ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (cache_key) DO UPDATE SET
+                result = excluded.result,
+                confidence = excluded.confidence,
+                metadata = excluded.metadata,
+                expires_at = excluded.expires_at,
+                created_at = excluded.created_at
+        ''', rows)
+
+
+def prune_analysis_cache() -> int:
+    """
+    Delete expired cache entries.
+
+    Returns:
+        Number of entries deleted.
+    """
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('DELETE FROM analysis_cache WHERE expires_at <= ?', (_now(),))
+        deleted = cursor.rowcount
+
+    if deleted:
+        logger.info(f"Pruned {deleted} expired analysis cache entries")
+    return deleted
+
+
+def _now(offset_hours: int = 0) -> str:
+    """Current time (plus offset) in the format used by cache timestamps."""
+    return (datetime.now() + timedelta(hours=offset_hours)).isoformat(sep=' ', timespec='seconds')
@@ -0,0 +1,226 @@
+"""Priority scheduling of AI analyses within a token or time budget."""
+import os
+import math
+from datetime import datetime
+from typing import Dict, List, Optional
+from database import get_db
+from utils.logger import get_logger
+from services.product_service import LOW_STOCK_THRESHOLD
+from services.catalog_snapshot_service import CatalogSnapshot, SKIPPED_PRODUCT_TYPES
+
+logger = get_logger(__name__)
+
+# Relative weight of each priority factor (each factor is scaled to 0..1)
+PRIORITY_WEIGHTS = {
+    'staleness': 0.4,
+    'inventory_value': 0.3,
+    'stock_risk': 0.2,
+    # Subtracted - products with suggestions already waiting can wait
+    'pending_suggestions': 0.1,
+}
+# An analysis this old counts as fully stale (never analyzed = fully stale)
+STALENESS_HORIZON_DAYS = 7
+# Pending suggestions at which the penalty is full
+PENDING_SUGGESTIONS_CAP = 3
+
+# Default budgets per run (unset = no limit)
+TOKEN_BUDGET = int(os.getenv('AI_ANALYSIS_TOKEN_BUDGET', '0')) or None
+TIME_BUDGET_SECONDS = int(os.getenv('AI_ANALYSIS_TIME_BUDGET_SECONDS', '0')) or None
+
+# Cost estimates until ai_usage has history
+DEFAULT_TOKENS_PER_ANALYSIS = 1500
+DEFAULT_MS_PER_ANALYSIS = 4000
+# ai_usage history used for the estimates
+ESTIMATE_WINDOW_DAYS = 7
+
+
+def plan_analysis_run(catalog: CatalogSnapshot, max_products: Optional[int] = None,
+                      token_budget: Optional[int] = TOKEN_BUDGET,
+                      time_budget_seconds: Optional[int] = TIME_BUDGET_SECONDS,
+                      llm_concurrency: int = 1, batch_size: int = 1) -> Dict:
+    """
+    Rank products by priority and take them in order until a budget is full.
+
+    Priority = weighted staleness of the last analysis + inventory value
+    (price x stock, log-scaled) + stock risk (out of or running out of
+    stock) - pending suggestions. Each analysis is estimated to cost the
+    average tokens and latency per product of recent analyses sent with the
+    same batch size (ai_usage). Out-of-stock products get a restock
+    suggestion without an LLM call and cost nothing.
+
+    Args:
+        catalog: Catalog snapshot.
+        max_products: Maximum products per run (default: half of the catalog).
+        token_budget: Maximum estimated tokens (None = unlimited).
+        time_budget_seconds: Maximum estimated LLM time (None = unlimited).
+        llm_concurrency: Parallel LLM calls (divides the time estimate).
+        batch_size: Products per OpenAI request the run will use.
+
+    Returns:
+        Dict with 'selected' product IDs (highest priority first),
+        total_products, max_products, the estimates per product and for
+        the run, the budgets and the top priorities with their factors.
+    """
+    products = [p for p in catalog.products if p.product_type not in SKIPPED_PRODUCT_TYPES]
+    total_products = len(products)
+    if max_products is None:
+        max_products = max(1, total_products // 2)
+
+    last_analyzed, pending = _load_analysis_history()
+    tokens_per_analysis, ms_per_analysis = _estimate_analysis_cost(batch_size)
+
+    max_value = max((_inventory_value(p) for p in products), default=0.0)
+    ranked = sorted(
+        ((_priority(p, last_analyzed.get(p.id), pending.get(p.id, 0), max_value), p) for p in products),
+        key=lambda item: (-item[0]['priority'], item[1].id)
+    )
+
+    selected = []
+    estimated_tokens = 0
+    estimated_ms = 0
+    for factors, product in ranked:
+        if len(selected) >= max_products:
+            break
+
+        needs_llm = product.stock > 0
+        tokens = tokens_per_analysis if needs_llm else 0
+        duration_ms = ms_per_analysis / max(1, llm_concurrency) if needs_llm else 0
+        if token_budget is not None and estimated_tokens + tokens > token_budget:
+            continue
+        if time_budget_seconds is not None and (estimated_ms + duration_ms) / 1000 > time_budget_seconds:
+            continue
+
+        selected.append(product.id)
+        estimated_tokens += tokens
+        estimated_ms += duration_ms
+
+    logger.info(
+        f"Analysis plan: {len(selected)}/{total_products} products, "
+        f"~{estimated_tokens} tokens, ~{round(estimated_ms / 1000, 1)} s"
+    )
+
+    return {
+        'selected': selected,
+        'total_products': total_products,
+        'max_products': max_products,
+        'estimated_tokens_per_analysis': tokens_per_analysis,
+        'estimated_ms_per_analysis': ms_per_analysis,
+        'estimated_tokens': estimated_tokens,
+        'estimated_seconds': round(estimated_ms / 1000, 1),
+        'budget': {'tokens': token_budget, 'seconds': time_budget_seconds},
+        'top_priorities': [dict(factors, product_id=product.id) for factors, product in ranked[:10]]
+    }
+
+
+def _priority(product, days_since_analysis: Optional[float], pending_count: int, max_value: float) -> Dict:
+    """Priority of a product and the factors it is made of (each 0..1)."""
+    if days_since_analysis is None:
+        staleness = 1.0
+    else:
+        staleness = min(max(days_since_analysis, 0.0) / STALENESS_HORIZON_DAYS, 1.0)
+
+    value = _inventory_value(product)
+    inventory_value = math.log1p(value) / math.log1p(max_value) if max_value > 0 else 0.0
+
+    if product.stock <= 0:
+        stock_risk = 1.0
+    else:
+        stock_risk = max(0.0, (LOW_STOCK_THRESHOLD - product.stock) / LOW_STOCK_THRESHOLD)
+
+    pending_suggestions = min(pending_count / PENDING_SUGGESTIONS_CAP, 1.0)
+
+    factors = {
+        'staleness': round(staleness, 3),
+        'inventory_value': round(inventory_value, 3),
+        'stock_risk': round(stock_risk, 3),
+        'pending_suggestions': round(pending_suggestions, 3),
+    }
+    priority = (
+        PRIORITY_WEIGHTS['staleness'] * staleness
+        + PRIORITY_WEIGHTS['inventory_value'] * inventory_value
+        + PRIORITY_WEIGHTS['stock_risk'] * stock_risk
+        - PRIORITY_WEIGHTS['pending_suggestions'] * pending_suggestions
+    )
+    factors['priority'] = round(priority, 4)
+    return factors
+
+
+def _inventory_value(product) -> float:
+    """Price x stock (0 when out of stock)."""
+    return max(product.price or 0, 0) * max(product.stock or 0, 0)
+
+
+def _load_analysis_history() -> tuple:
+    """
+    Days since each product's last AI analysis and its pending suggestion count.
+
+    Returns:
+        (dict product_id -> days since last analysis, dict product_id -> pending count)
+    """
+    with get_db() as conn:
+        cursor = conn.cursor()
+
+        # Event timestamps are UTC (CURRENT_TIMESTAMP)
+        cursor.execute('''
+            SELECT product_id, julianday('now') - julianday(MAX(created_at)) AS days
+            FROM events
+            WHERE event_type = 'ai_analysis' AND product_id IS NOT NULL
+            GROUP BY product_id
+        ''')
+        last_analyzed = {row['product_id']: row['days'] for row in cursor.fetchall()}
+
+        cursor.execute('''
+            SELECT product_id, COUNT(*) AS pending
+            FROM suggestions
+            WHERE status = 'new' AND (expires_at IS NULL OR expires_at > ?)
+            GROUP BY product_id
+        ''', (datetime.now().isoformat(sep=' ', timespec='seconds'),))
+        pending = {row['product_id']: row['pending'] for row in cursor.fetchall()}
+
+    return last_analyzed, pending
+
+
+def _estimate_analysis_cost(batch_size: int = 1) -> tuple:
+    """
+    Average tokens and latency per product of recent successful analyses.
+
+    A batched request shares its prompt overhead between its products, so
+    with batch_size > 1 the estimate comes from batched requests of that
+    size (their usage divided by the product count). Without that history
+    the single-product average is used - an overestimate, never an
+    underestimate.
+
+    Args:
+        batch_size: Products per OpenAI request.
+
+    Returns:
+        (tokens per analysis, milliseconds per analysis), defaults without history.
+    """
+    with get_db() as conn:
+        cursor = conn.cursor()
+        row = None
+        if batch_size > 1:
+            cursor.execute(f'''
+                SELECT AVG(total_tokens * 1.0 / products) AS tokens, AVG(duration * 1.0 / products) AS duration
+                FROM (
+                    SELECT total_tokens, duration, json_array_length(metadata, '$.product_ids') AS products
+                    FROM ai_usage
+                    WHERE operation = 'product_analysis_batch' AND success = 1 AND total_tokens > 0
+                      AND created_at >= datetime('now', 'localtime', '-{ESTIMATE_WINDOW_DAYS} days')
+                )
+                WHERE products = ?
+            ''', (batch_size,))
+            row = cursor.fetchone()
+
+        if not row or row['tokens'] is None:
+            cursor.execute(f'''
+                SELECT AVG(total_tokens) AS tokens, AVG(duration) AS duration
+                FROM ai_usage
+                WHERE operation = 'product_analysis' AND success = 1 AND total_tokens > 0
+                  AND created_at >= datetime('now', 'localtime', '-{ESTIMATE_WINDOW_DAYS} days')
+            ''')
+            row = cursor.fetchone()
+
+    if not row or row['tokens'] is None:
+        return DEFAULT_TOKENS_PER_ANALYSIS, DEFAULT_MS_PER_ANALYSIS
+    return int(round(row['tokens'])), int(round(row['duration']))
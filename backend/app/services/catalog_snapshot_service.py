@@ -0,0 +1,123 @@
+"""Immutable in-memory snapshot of the shop catalog, shared by AI analyses."""
+import re
+import math
+import threading
+from typing import Dict, List, Optional
+from database import get_db
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+SKIPPED_PRODUCT_TYPES = ('bundle', 'promotion', 'Zestaw', 'Promocja')
+
+# Product type -> other types that pair well with it, e.g. {'Phone': ['Audio']}.
+# Default type_affinity of the rules engine and preferred AI bundle/promo candidates.
+TYPE_AFFINITY: Dict[str, List[str]] = {}
+
+# Snapshot of the current catalog, valid while catalog_version.version is unchanged
+_snapshot_cache = {'version': None, 'snapshot': None}
+_snapshot_lock = threading.Lock()
+
+
+class CatalogProduct:
+    """
+    Read-only shop product with the values analyses derive from it precomputed.
+
+    Supports dict-style access (product['name'], product.get('vendor')) so it
+    can be used wherever a product row dict is expected.
+    """
+
+    __slots__ = ('id', 'sku', 'name', 'price', 'stock', 'status', 'channel', 'vendor', 'product_type',
+                 'words', 'log_price', 'prompt_line')
+
+    def __init__(self, row) -> None:
+        for field in ('id', 'sku', 'name', 'price', 'stock', 'status', 'channel', 'vendor', 'product_type'):
+            object.__setattr__(self, field, row[field])
+        # Ranking features and the candidate line of the analysis prompt
+        object.__setattr__(self, 'words', frozenset(_name_words(row['name'])))
+        object.__setattr__(self, 'log_price', math.log(max(row['price'] or 0, 0.01)))
+        object.__setattr__(self, 'prompt_line', (
+            f"- ID: {row['id']}, Name: {row['name']}, Price: {row['price']} PLN, Stock: {row['stock']} units"
+        ))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("CatalogProduct is immutable")
+
+    def __getitem__(self, key: str):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def get(self, key: str, default=None):
+        return getattr(self, key, default)
+
+    def to_dict(self) -> Dict:
+        """Plain dict of the product columns."""
+        return {field: getattr(self, field) for field in
+                ('id', 'sku', 'name', 'price', 'stock', 'status', 'channel', 'vendor', 'product_type')}
+
+
+class CatalogSnapshot:
+    """
+    Immutable view of all products, loaded with one query.
+
+    Safe to share between threads: nothing changes after construction.
+    in_stock holds the products that can be offered as bundle/promo
+    partners (in stock, not bundles/promos themselves).
+    """
+
+    __slots__ = ('version', 'products', 'in_stock', '_by_id')
+
+    def __init__(self, version: Optional[int], products: List[CatalogProduct]) -> None:
+        object.__setattr__(self, 'version', version)
+        object.__setattr__(self, 'products', tuple(products))
+        object.__setattr__(self, 'in_stock', tuple(
+            p for p in products if p.stock > 0 and p.product_type not in SKIPPED_PRODUCT_TYPES
+        ))
+        object.__setattr__(self, '_by_id', {p.id: p for p in products})
+
+    def __setattr__(self, name, value):
+        raise AttributeError("CatalogSnapshot is immutable")
+
+    def __len__(self) -> int:
+        return len(self.products)
+
+    def get(self, product_id: int) -> Optional[CatalogProduct]:
+        """Product by ID, or None if it is not in the snapshot."""
+        return self._by_id.get(product_id)
+
+
+def get_catalog_snapshot() -> CatalogSnapshot:
+    """
+    Current catalog snapshot, reloaded only when the catalog has changed.
+
+    Returns:
+        Snapshot of all products (cached until catalog_version changes).
+    """
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT version FROM catalog_version WHERE id = 1')
+        version = cursor.fetchone()[0]
+
+        with _snapshot_lock:
+            if _snapshot_cache['version'] == version:
+                return _snapshot_cache['snapshot']
+
+            cursor.execute('''
+                SELECT id, sku, name, price, stock, status, channel, vendor, product_type
+                FROM products
+                ORDER BY id
+            ''')
+            snapshot = CatalogSnapshot(version, [CatalogProduct(row) for row in cursor.fetchall()])
+
+            _snapshot_cache['version'] = version
+            _snapshot_cache['snapshot'] = snapshot
+
+    logger.info(f"Loaded catalog snapshot v{version}: {len(snapshot)} products, {len(snapshot.in_stock)} in stock")
+    return snapshot
+
+
+def _name_words(name: str) -> set:
+    """Lowercase words of a product name (2+ characters)."""
+    return {word for word in re.findall(r'\w+', (name or '').lower()) if len(word) > 1}
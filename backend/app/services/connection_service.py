@@ -221,12 +221,100 @@ def get_integration_for_product(product_id: int):
         if not is_active:
             raise ValueError(f"Store connection for product {product_id} is inactive")
 
-        # Decrypt credentials
-        api_key = decrypt(api_key_encrypted)
-        api_secret = decrypt(api_secret_encrypted) if api_secret_encrypted else None
+        return _connection_integration(cursor, connection_id, platform, store_url,
+                                       api_key_encrypted, api_secret_encrypted)
 
-        # Create integration
-        return _create_integration(platform, store_url, api_key, api_secret, is_demo=False)
+
+def get_integration_for_connection(connection_id: int):
+    """
+    Get integration instance for a store connection.
+
+    Args:
+        connection_id: Connection ID.
+
+    Returns:
+        Integration instance (ShopifyIntegration or WooCommerceIntegration).
+
+    Raises:
+        ValueError: If connection not found or inactive.
+    """
+    with get_db() as conn:
+        cursor = conn.cursor()
+
+        cursor.execute('''
+            SELECT platform, store_url, api_key_encrypted, api_secret_encrypted, is_active
+            FROM store_connections
+            WHERE id = ?
+        ''', (connection_id,))
+
+        row = cursor.fetchone()
+        if not row:
+            raise ValueError(f"Connection {connection_id} not found")
+
+        platform, store_url, api_key_encrypted, api_secret_encrypted, is_active = row
+
+        if not is_active:
+            raise ValueError(f"Connection {connection_id} is inactive")
+
+        return _connection_integration(cursor, connection_id, platform, store_url,
+                                       api_key_encrypted, api_secret_encrypted)
+
+
+def _connection_integration(cursor, connection_id: int, platform: str, store_url: str,
+                            api_key_encrypted: str, api_secret_encrypted: str = None):
+    """
+    Create the integration of an active connection from its stored credentials.
+
+    Decrypts the credentials, creates the platform integration and, for
+    Shopify, primes the inventory metadata cache on first use.
+
+    Args:
+        cursor: Database cursor.
+        connection_id: Connection ID.
+        platform: Platform type (woocommerce, shopify).
+        store_url: Store URL.
+        api_key_encrypted: Encrypted API key.
+        api_secret_encrypted: Encrypted API secret (optional).
+
+    Returns:
+        Integration instance (ShopifyIntegration or WooCommerceIntegration).
+    """
+    # Decrypt credentials
+    api_key = decrypt(api_key_encrypted)
+    api_secret = decrypt(api_secret_encrypted) if api_secret_encrypted else None
+
+    integration = _create_integration(platform, store_url, api_key, api_secret, is_demo=False)
+
+    if isinstance(integration, ShopifyIntegration) and not integration.has_inventory_metadata():
+        _prime_inventory_metadata(cursor, integration, connection_id)
+
+    return integration
+
+
+def _prime_inventory_metadata(cursor, integration: ShopifyIntegration, connection_id: int) -> None:
+    """
+    Load inventory metadata stored during sync into the Shopify integration cache.
+
+    Runs once per store per process, so later stock updates for any product of
+    that store need a single inventory_levels/set call.
+
+    Args:
+        cursor: Database cursor.
+        integration: Shopify integration instance.
+        connection_id: Connection ID.
+    """
+    cursor.execute('''
+        SELECT external_id, inventory_item_id, location_id
+        FROM products
+        WHERE connection_id = ? AND inventory_item_id IS NOT NULL
+    ''', (connection_id,))
+    rows = cursor.fetchall()
+
+    inventory_items = {row['external_id']: row['inventory_item_id'] for row in rows}
+    location_id = next((row['location_id'] for row in rows if row['location_id']), None)
+
+    integration.cache_inventory_metadata(inventory_items, location_id)
+    logger.info(f"Primed inventory metadata for {len(inventory_items)} products of connection {connection_id}")
 
 
 def _create_integration(platform: str, store_url: str, api_key: str,
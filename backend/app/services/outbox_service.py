@@ -0,0 +1,383 @@
+"""Outbox for store writes - local changes commit first, remote calls run in the background."""
+import os
+import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Callable
+from datetime import datetime, timedelta
+from database import get_db
+from utils.logger import get_logger
+from services.connection_service import get_integration_for_connection
+
+logger = get_logger(__name__)
+
+# Retry policy: exponential backoff starting at OUTBOX_RETRY_BASE_SECONDS
+MAX_ATTEMPTS = 5
+OUTBOX_RETRY_BASE_SECONDS = 10
+# Entries stuck in 'processing' longer than this (crashed worker) are picked up again
+PROCESSING_TIMEOUT_SECONDS = 300
+OUTBOX_POLL_SECONDS = int(os.getenv('OUTBOX_POLL_SECONDS', '2'))
+OUTBOX_BATCH_SIZE = 20
+# Maximum concurrent requests per store when flushing a batch of entries
+# (entries for the same store product always run one at a time, in order)
+STORE_CONCURRENCY = int(os.getenv('OUTBOX_STORE_CONCURRENCY', '4'))
+
+ACTIONS = ('update_price', 'update_stock', 'create_product')
+
+_scheduler = None
+
+
+def enqueue_action(cursor, action: str, connection_id: int, payload: Dict,
+                   product_id: Optional[int] = None, suggestion_id: Optional[int] = None) -> int:
+    """
+    Record a store write in the outbox, inside the caller's transaction.
+
+    Entries writing to the same store product (connection_id and
+    payload['external_id']) are executed one at a time in ID order. Once an
+    entry succeeds, older pending entries with the same action are
+    superseded, so a retried stale write never overwrites a newer one.
+
+    Args:
+        cursor: Database cursor of the transaction making the local change.
+        action: One of ACTIONS.
+        connection_id: Store connection the action targets.
+        payload: Action arguments (JSON-serializable).
+        product_id: Local product the action belongs to (optional).
+        suggestion_id: Suggestion that caused the action (optional).
+
+    Returns:
+        Outbox entry ID.
+
+    Raises:
+        ValueError: If action is unknown.
+    """
+    if action not in ACTIONS:
+        raise ValueError(f"Unknown outbox action: {action}")
+
+    now = _now()
+    cursor.execute('''
+        INSERT INTO outbox (suggestion_id, product_id, connection_id, external_id, action, payload,
+                            status, attempts, next_attempt_at, created_at, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, 'pending', 0, ?, ?, ?)
+    ''', (suggestion_id, product_id, connection_id, payload.get('external_id'), action,
+          json.dumps(payload), now, now, now))
+
+    return cursor.lastrowid
+
+
+def get_actions_for_suggestion(suggestion_id: int) -> List[Dict]:
+    """
+    Retrieve the store write status of every action queued by a suggestion.
+
+    Args:
+        suggestion_id: Suggestion ID.
+
+    Returns:
+        List of outbox entries (oldest first).
+    """
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT id, product_id, action, status, attempts, last_error, result, created_at, updated_at
+            FROM outbox
+            WHERE suggestion_id = ?
+            ORDER BY id
+        ''', (suggestion_id,))
+        actions = [dict(row) for row in cursor.fetchall()]
+
+    for action in actions:
+        action['result'] = json.loads(action['result']) if action['result'] else None
+
+    return actions
+
+
+def process_outbox(batch_size: int = OUTBOX_BATCH_SIZE) -> int:
+    """
+    Push due outbox entries to their stores.
+
+    Each entry is claimed atomically, so several workers can run this
+    concurrently without sending the same write twice.
+
+    Args:
+        batch_size: Maximum number of entries to process.
+
+    Returns:
+        Number of entries processed (successfully or not).
+    """
+    now = _now()
+    stale_before = _now(-PROCESSING_TIMEOUT_SECONDS)
+
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT id FROM outbox
+            WHERE (status = 'pending' AND next_attempt_at <= ?)
+               OR (status = 'processing' AND updated_at <= ?)
+            ORDER BY id
+            LIMIT ?
+        ''', (now, stale_before, batch_size))
+        candidate_ids = [row[0] for row in cursor.fetchall()]
+
+    integrations = {}
+
+    def get_integration(connection_id: int):
+        if connection_id not in integrations:
+            integrations[connection_id] = get_integration_for_connection(connection_id)
+        return integrations[connection_id]
+
+    processed = sum(1 for entry_id in candidate_ids if _process_entry(entry_id, stale_before, get_integration))
+
+    if processed:
+        logger.info(f"Processed {processed} outbox entries")
+    return processed
+
+
+def flush_outbox(entry_ids: List[int], store_concurrency: int = STORE_CONCURRENCY) -> Dict[int, Dict]:
+    """
+    Push specific outbox entries right away instead of waiting for the worker.
+
+    Entries are grouped by store connection. Stores are processed in parallel,
+    each with at most store_concurrency requests in flight and one integration
+    instance, so the batch takes roughly as long as the slowest store.
+    Entries for the same store product run one after another in ID order.
+    Failed entries stay in the outbox and are retried by the worker.
+
+    Args:
+        entry_ids: Outbox entry IDs.
+        store_concurrency: Maximum concurrent entries per store.
+
+    Returns:
+        Dict mapping entry ID to its status (id, action, status, attempts, last_error).
+    """
+    if not entry_ids:
+        return {}
+
+    placeholders = ','.join(['?'] * len(entry_ids))
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT id, connection_id, external_id FROM outbox
+            WHERE id IN ({placeholders}) AND status = 'pending'
+            ORDER BY id
+        ''', entry_ids)
+
+        # Store -> chains of entry IDs, one chain per store product (entries without one run alone)
+        entries_by_store = {}
+        for row in cursor.fetchall():
+            chains = entries_by_store.setdefault(row['connection_id'], {})
+            chains.setdefault(row['external_id'] or f"entry-{row['id']}", []).append(row['id'])
+
+    stale_before = _now(-PROCESSING_TIMEOUT_SECONDS)
+
+    def flush_store(connection_id: int, chains: Dict[str, List[int]]) -> None:
+        # One integration per store; if it cannot be created every entry records the error
+        integration, integration_error = None, None
+        try:
+            integration = get_integration_for_connection(connection_id)
+        except Exception as e:
+            integration_error = e
+
+        def get_integration(_):
+            if integration_error:
+                raise integration_error
+            return integration
+
+        def flush_chain(chain: List[int]) -> None:
+            for entry_id in chain:
+                _process_entry(entry_id, stale_before, get_integration)
+
+        with ThreadPoolExecutor(max_workers=min(store_concurrency, len(chains))) as executor:
+            list(executor.map(flush_chain, chains.values()))
+
+    if entries_by_store:
+        with ThreadPoolExecutor(max_workers=len(entries_by_store)) as executor:
+            list(executor.map(lambda item: flush_store(*item), entries_by_store.items()))
+
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT id, action, status, attempts, last_error FROM outbox WHERE id IN ({placeholders})
+        ''', entry_ids)
+        statuses = {row['id']: dict(row) for row in cursor.fetchall()}
+
+    logger.info(f"Flushed {len(entry_ids)} outbox entries across {len(entries_by_store)} stores")
+    return statuses
+
+
+def start_outbox_worker() -> None:
+    """
+    Start the background scheduler that drains the outbox.
+
+    Disabled when OUTBOX_WORKER_ENABLED=0 (e.g. for one-off scripts).
+    """
+    global _scheduler
+
+    if _scheduler is not None or os.getenv('OUTBOX_WORKER_ENABLED', '1') == '0':
+        return
+
+    from apscheduler.schedulers.background import BackgroundScheduler
+
+    _scheduler = BackgroundScheduler(daemon=True)
+    _scheduler.add_job(process_outbox, 'interval', seconds=OUTBOX_POLL_SECONDS,
+                       id='process_outbox', max_instances=1, coalesce=True)
+    _scheduler.start()
+    logger.info(f"Outbox worker started (every {OUTBOX_POLL_SECONDS}s)")
+
+
+def _process_entry(entry_id: int, stale_before: str, get_integration: Callable) -> bool:
+    """
+    Claim and execute one outbox entry.
+
+    Args:
+        entry_id: Outbox entry ID.
+        stale_before: Timestamp before which 'processing' entries count as abandoned.
+        get_integration: Callable returning the integration for a connection ID.
+
+    Returns:
+        True if the entry was processed (successfully or not), False if another worker had it.
+    """
+    entry = _claim(entry_id, stale_before)
+    if not entry:
+        return False
+
+    try:
+        result = _execute(get_integration(entry['connection_id']), entry)
+        _mark_done(entry, result)
+    except Exception as e:
+        _mark_failed_attempt(entry, str(e))
+
+    return True
+
+
+def _claim(entry_id: int, stale_before: str) -> Optional[Dict]:
+    """
+    Atomically move an entry to 'processing' and return it.
+
+    Returns None if the entry is taken, or if it has to wait for another
+    entry of the same store product: one that is being processed, or an
+    older pending one with a different action (older ones with the same
+    action are superseded once this one succeeds).
+    """
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE outbox
+            SET status = 'processing', attempts = attempts + 1, updated_at = ?
+            WHERE id = ?
+              AND (status = 'pending' OR (status = 'processing' AND updated_at <= ?))
+              AND NOT EXISTS (
+                  SELECT 1 FROM outbox other
+                  WHERE other.connection_id = outbox.connection_id
+                    AND other.external_id = outbox.external_id
+                    AND other.id != outbox.id
+                    AND ((other.status = 'processing' AND other.updated_at > ?)
+                         OR (other.status = 'pending' AND other.id < outbox.id
+                             AND other.action != outbox.action))
+              )
+        ''', (_now(), entry_id, stale_before, stale_before))
+
+        if cursor.rowcount != 1:
+            return None
+
+        cursor.execute('SELECT * FROM outbox WHERE id = ?', (entry_id,))
+        entry = dict(cursor.fetchone())
+
+    entry['payload'] = json.loads(entry['payload'])
+    return entry
+
+
+def _execute(integration, entry: Dict) -> Dict:
+    """
+    Perform the remote call for an outbox entry.
+
+    Returns:
+        Result details stored with the entry.
+
+    Raises:
+        Exception: If the store rejects the write.
+    """
+    action = entry['action']
+    payload = entry['payload']
+
+    if action == 'update_price':
+        if not integration.update_product_price(payload['external_id'], payload['price']):
+            raise Exception(f"Failed to update price of {payload['external_id']}")
+        return {'external_id': payload['external_id'], 'price': payload['price']}
+
+    if action == 'update_stock':
+        if not integration.update_product_stock(payload['external_id'], payload['stock']):
+            raise Exception(f"Failed to update stock of {payload['external_id']}")
+        return {'external_id': payload['external_id'], 'stock': payload['stock']}
+
+    if action == 'create_product':
+        created = integration.create_product(payload)
+        if not created:
+            raise Exception(f"Failed to create product {payload['name']}")
+
+        # Link the local placeholder row to the product created in the store
+        with get_db() as conn:
+            conn.execute('''
+                UPDATE products
+                SET external_id = ?, inventory_item_id = ?, updated_at = ?
+                WHERE id = ?
+            ''', (created['external_id'], created.get('inventory_item_id'), _now(), entry['product_id']))
+        return {'external_id': created['external_id']}
+
+    raise ValueError(f"Unknown outbox action: {action}")
+
+
+def _mark_done(entry: Dict, result: Dict) -> None:
+    """Record a successful remote write and supersede older pending writes of the same value."""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE outbox
+            SET status = 'done', last_error = NULL, result = ?, updated_at = ?
+            WHERE id = ?
+        ''', (json.dumps(result), _now(), entry['id']))
+
+        superseded = 0
+        if entry['external_id'] is not None:
+            cursor.execute('''
+                UPDATE outbox
+                SET status = 'superseded', last_error = NULL, updated_at = ?
+                WHERE connection_id = ? AND external_id = ? AND action = ?
+                  AND status = 'pending' AND id < ?
+            ''', (_now(), entry['connection_id'], entry['external_id'], entry['action'], entry['id']))
+            superseded = cursor.rowcount
+
+    logger.info(f"Outbox entry {entry['id']} ({entry['action']}) done" +
+                (f", superseded {superseded} older entries" if superseded else ''))
+
+
+def _mark_failed_attempt(entry: Dict, error: str) -> None:
+    """Schedule a retry with backoff, or give up after MAX_ATTEMPTS."""
+    with get_db() as conn:
+        cursor = conn.cursor()
+
+        if entry['attempts'] >= MAX_ATTEMPTS:
+            cursor.execute('''
+                UPDATE outbox SET status = 'failed', last_error = ?, updated_at = ? WHERE id = ?
+            ''', (error, _now(), entry['id']))
+
+            cursor.execute('''
+                INSERT INTO events (product_id, suggestion_id, event_type, description)
+                VALUES (?, ?, 'store_sync_failed', ?)
+            ''', (entry['product_id'], entry['suggestion_id'],
+                  f"Store write '{entry['action']}' failed after {entry['attempts']} attempts: {error}"))
+
+            logger.error(f"Outbox entry {entry['id']} ({entry['action']}) failed permanently: {error}")
+            return
+
+        delay = OUTBOX_RETRY_BASE_SECONDS * 2 ** (entry['attempts'] - 1)
+        cursor.execute('''
+            UPDATE outbox
+            SET status = 'pending', last_error = ?, next_attempt_at = ?, updated_at = ?
+            WHERE id = ?
+        ''', (error, _now(delay), _now(), entry['id']))
+
+    logger.warning(f"Outbox entry {entry['id']} ({entry['action']}) attempt {entry['attempts']} failed, retry in {delay}s: {error}")
+
+
+def _now(offset_seconds: int = 0) -> str:
+    """Current time (plus offset) in the format used by outbox timestamps."""
+    return (datetime.now() + timedelta(seconds=offset_seconds)).isoformat(sep=' ', timespec='seconds')
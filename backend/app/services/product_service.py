@@ -1,4 +1,5 @@
 """Product-related business logic."""
+import json
 from typing import List, Dict, Optional
 from datetime import datetime
 from database import get_db
@@ -9,6 +10,46 @@ from crypto import decrypt
 
 logger = get_logger(__name__)
 
+# Product details with applied suggestions and the last 20 events nested as JSON
+# arrays, so any number of products is fetched in one set-based query.
+# Uses idx_suggestions_product_status and idx_events_product_created.
+PRODUCT_DETAILS_QUERY = '''
+    SELECT
+        p.id, p.sku, p.name, p.price, p.stock, p.status, p.channel, p.connection_id,
+        p.vendor, p.product_type, p.created_at, p.updated_at,
+        (
+            SELECT json_group_array(json_object(
+                'id', s.id, 'type', s.type, 'description', s.description, 'applied_at', s.applied_at
+            ))
+            FROM (
+                SELECT id, type, description, applied_at
+                FROM suggestions
+                WHERE product_id = p.id AND status = 'applied'
+                ORDER BY applied_at DESC, id DESC
+            ) s
+        ) AS applied_suggestions,
+        (
+            SELECT json_group_array(json_object(
+                'id', e.id, 'event_type', e.event_type, 'description', e.description, 'created_at', e.created_at
+            ))
+            FROM (
+                SELECT id, event_type, description, created_at
+                FROM events
+                WHERE product_id = p.id
+                ORDER BY created_at DESC, id DESC
+                LIMIT 20
+            ) e
+        ) AS event_history
+    FROM products p
+    WHERE p.id IN ({placeholders})
+'''
+
+# Same threshold as models.py uses for the low_stock status
+LOW_STOCK_THRESHOLD = 10
+
+# Catalog statistics, valid while catalog_version.version is unchanged
+_stats_cache = {'version': None, 'stats': None}
+
 
 def get_all_products() -> List[Dict]:
     """
@@ -65,6 +106,75 @@ def get_all_products() -> List[Dict]:
     return products
 
 
+def get_catalog_stats() -> Dict:
+    """
+    Get aggregate catalog statistics computed in SQL.
+
+    Results are cached until the next product write, detected through the
+    trigger-maintained catalog_version counter.
+
+    Returns:
+        Dict with totals (products, stock units, inventory value, low/out of
+        stock counts) and product counts by status, channel, connection and type.
+
+    Raises:
+        Exception: If database query fails.
+    """
+    with get_db() as conn:
+        cursor = conn.cursor()
+
+        cursor.execute('SELECT version FROM catalog_version WHERE id = 1')
+        version = cursor.fetchone()[0]
+
+        if _stats_cache['version'] == version:
+            return _stats_cache['stats']
+
+        cursor.execute('''
+            SELECT
+                COUNT(*) AS total_products,
+                COALESCE(SUM(stock), 0) AS total_stock_units,
+                COALESCE(SUM(price * stock), 0) AS inventory_value,
+                SUM(CASE WHEN stock > 0 AND stock < ? THEN 1 ELSE 0 END) AS low_stock_count,
+                SUM(CASE WHEN stock <= 0 THEN 1 ELSE 0 END) AS out_of_stock_count
+            FROM products
+        ''', (LOW_STOCK_THRESHOLD,))
+        totals = dict(cursor.fetchone())
+
+        cursor.execute('''
+            SELECT 'by_status' AS dimension, status AS value, COUNT(*) AS count
+            FROM products GROUP BY status
+            UNION ALL
+            SELECT 'by_channel', channel, COUNT(*)
+            FROM products GROUP BY channel
+            UNION ALL
+            SELECT 'by_connection', CAST(connection_id AS TEXT), COUNT(*)
+            FROM products GROUP BY connection_id
+            UNION ALL
+            SELECT 'by_product_type', NULLIF(product_type, ''), COUNT(*)
+            FROM products GROUP BY NULLIF(product_type, '')
+        ''')
+
+        stats = {
+            'total_products': totals['total_products'],
+            'total_stock_units': totals['total_stock_units'],
+            'inventory_value': round(totals['inventory_value'], 2),
+            'low_stock_count': totals['low_stock_count'] or 0,
+            'out_of_stock_count': totals['out_of_stock_count'] or 0,
+            'by_status': {},
+            'by_channel': {},
+            'by_connection': {},
+            'by_product_type': {}
+        }
+        for row in cursor.fetchall():
+            stats[row['dimension']][row['value'] or 'none'] = row['count']
+
+    _stats_cache['version'] = version
+    _stats_cache['stats'] = stats
+
+    logger.info(f"Computed catalog stats for {stats['total_products']} products (version {version})")
+    return stats
+
+
 def get_product_details(product_id: int) -> Optional[Dict]:
     """
     Get detailed product information including applied suggestions and event history.
@@ -79,44 +189,59 @@ def get_product_details(product_id: int) -> Optional[Dict]:
     Raises:
         Exception: If database query fails.
     """
-    with get_db() as conn:
-        cursor = conn.cursor()
+    products = get_products_details([product_id])
 
-        # Get product details
-        cursor.execute('''
-            SELECT id, sku, name, price, stock, status, channel, connection_id, vendor, product_type, created_at, updated_at
-            FROM products
-            WHERE id = ?
-        ''', (product_id,))
-        row = cursor.fetchone()
+    if not products:
+        logger.warning(f"Product {product_id} not found")
+        return None
 
-        if not row:
-            logger.warning(f"Product {product_id} not found")
-            return None
+    logger.info(f"Retrieved details for product {product_id}")
+    return products[0]
 
-        product = dict(row)
 
-        # Get applied suggestions for this product
-        cursor.execute('''
-            SELECT id, type, description, applied_at
-            FROM suggestions
-            WHERE product_id = ? AND status = 'applied'
-            ORDER BY applied_at DESC
-        ''', (product_id,))
-        product['applied_suggestions'] = [dict(row) for row in cursor.fetchall()]
+def get_products_details(product_ids: List[int]) -> List[Dict]:
+    """
+    Get detailed information for many products with a single query.
 
-        # Get event history for this product
-        cursor.execute('''
-            SELECT id, event_type, description, created_at
-            FROM events
-            WHERE product_id = ?
-            ORDER BY created_at DESC
-            LIMIT 20
-        ''', (product_id,))
-        product['event_history'] = [dict(row) for row in cursor.fetchall()]
+    Args:
+        product_ids: IDs of the products to retrieve.
 
-    logger.info(f"Retrieved details for product {product_id}")
-    return product
+    Returns:
+        List of product details dicts (same shape as get_product_details),
+        in the order of product_ids. Unknown IDs are skipped.
+
+    Raises:
+        Exception: If database query fails.
+    """
+    if not product_ids:
+        return []
+
+    unique_ids = list(dict.fromkeys(product_ids))
+
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            PRODUCT_DETAILS_QUERY.format(placeholders=','.join(['?'] * len(unique_ids))),
+            unique_ids
+        )
+        rows = cursor.fetchall()
+
+    products_by_id = {}
+    for row in rows:
+        product = dict(row)
+        # json_group_array does not promise to keep the subquery order, so sort newest first here
+        product['applied_suggestions'] = sorted(
+            json.loads(product['applied_suggestions']),
+            key=lambda s: (s['applied_at'] or '', s['id']), reverse=True
+        )
+        product['event_history'] = sorted(
+            json.loads(product['event_history']),
+            key=lambda e: (e['created_at'] or '', e['id']), reverse=True
+        )
+        products_by_id[product['id']] = product
+
+    logger.info(f"Retrieved details for {len(products_by_id)} of {len(unique_ids)} products")
+    return [products_by_id[pid] for pid in unique_ids if pid in products_by_id]
 
 
 def create_product_in_store(data: Dict) -> Dict:
@@ -189,8 +314,8 @@ def create_product_in_store(data: Dict) -> Dict:
         # Save to database
         now = datetime.now().isoformat(sep=' ', timespec='seconds')
         cursor.execute('''
-            INSERT INTO products (connection_id, external_id, sku, name, price, stock, status, channel, vendor, product_type, created_at, updated_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            INSERT INTO products (connection_id, external_id, sku, name, price, stock, status, channel, vendor, product_type, inventory_item_id, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         ''', (
             connection_id,
             created_product['external_id'],
@@ -202,6 +327,7 @@ def create_product_in_store(data: Dict) -> Dict:
             created_product['channel'],
             created_product.get('vendor', ''),
             created_product.get('product_type', ''),
+            created_product.get('inventory_item_id'),
             now,
             now
         ))
@@ -0,0 +1,323 @@
+"""Deterministic rules engine - structured suggestions for the whole catalog without an LLM."""
+import time
+from typing import Dict, Optional
+import numpy as np
+from database import get_db
+from utils.logger import get_logger
+from services.suggestion_service import save_suggestions
+from services.product_service import LOW_STOCK_THRESHOLD
+from services.catalog_snapshot_service import SKIPPED_PRODUCT_TYPES, TYPE_AFFINITY
+
+logger = get_logger(__name__)
+
+RULE_TYPES = ('price', 'restock', 'promo', 'bundle')
+
+# Overridable per run (see generate_rule_suggestions)
+DEFAULT_RULES = {
+    'enabled': list(RULE_TYPES),
+    # Market price band: percentiles of the prices of the same product type
+    'price_band_low_pct': 25,
+    'price_band_high_pct': 75,
+    # How far outside the band a price may be before a change is suggested
+    'price_tolerance_pct': 5,
+    # Types with fewer products are compared with the whole catalog
+    'min_peers': 3,
+    'low_stock_threshold': LOW_STOCK_THRESHOLD,
+    'overstock_threshold': 50,
+    'promo_discount_pct': 20,
+    'bundle_size': 3,
+    'bundle_discount_pct': 10,
+    'bundle_min_stock': 5,
+    # Product type -> other types that pair well with it (the same type always does)
+    'type_affinity': TYPE_AFFINITY,
+}
+
+
+def generate_rule_suggestions(rules: Optional[Dict] = None) -> Dict:
+    """
+    Evaluate the pricing, restock, promo and bundle rules over the whole catalog.
+
+    Prices and stock are loaded into NumPy arrays once. Each rule is a
+    vectorized mask over the catalog, and all suggestions are saved in one
+    transaction through save_suggestions(), so repeated runs refresh pending
+    suggestions instead of duplicating them.
+
+    - price: price outside the type's price band (plus tolerance). Too
+      expensive -> lower to the upper band. Too cheap and running low ->
+      raise to the lower band.
+    - restock: out of stock, or below low_stock_threshold.
+    - promo: overstocked products, discount on the in-stock partner with
+      the highest stock among the affine types.
+    - bundle: products with bundle_min_stock units, grouped with partners
+      of the affine types, highest stock first (each product in one bundle).
+
+    Args:
+        rules: Overrides of DEFAULT_RULES (missing keys keep their defaults).
+
+    Returns:
+        Dict with products evaluated, suggestions created per type,
+        elapsed_ms and the effective rules.
+    """
+    started = time.perf_counter()
+    rules = {**DEFAULT_RULES, **(rules or {})}
+
+    catalog = _load_catalog()
+    suggestions = {}
+
+    def add(index: int, suggestion: Dict) -> None:
+        suggestions.setdefault(int(catalog['ids'][index]), []).append(suggestion)
+
+    if 'restock' in rules['enabled']:
+        _restock_rule(catalog, rules, add)
+    if 'price' in rules['enabled']:
+        _price_rule(catalog, rules, add)
+    if 'promo' in rules['enabled'] or 'bundle' in rules['enabled']:
+        partners = _affinity_partners(catalog, rules)
+        if 'promo' in rules['enabled']:
+            _promo_rule(catalog, rules, partners, add)
+        if 'bundle' in rules['enabled']:
+            _bundle_rule(catalog, rules, partners, add)
+
+    by_type = dict.fromkeys(RULE_TYPES, 0)
+    suggestions_created = 0
+
+    with get_db() as conn:
+        cursor = conn.cursor()
+        for product_id, product_suggestions in suggestions.items():
+            suggestions_created += len(save_suggestions(cursor, product_id, product_suggestions))
+            for suggestion in product_suggestions:
+                by_type[suggestion['type']] += 1
+
+        cursor.execute('''
+            INSERT INTO events (event_type, description)
+            VALUES ('rules_analysis', ?)
+        ''', (f"Rules engine generated {suggestions_created} suggestions for {len(suggestions)} products",))
+
+    elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+    logger.info(
+        f"Rules engine: {suggestions_created} suggestions for {len(suggestions)} of "
+        f"{len(catalog['ids'])} products in {elapsed_ms} ms"
+    )
+
+    return {
+        'success': True,
+        'source': 'rules',
+        'products_evaluated': len(catalog['ids']),
+        'products_with_suggestions': len(suggestions),
+        'total_suggestions_created': suggestions_created,
+        'suggestions_by_type': by_type,
+        'elapsed_ms': elapsed_ms,
+        'rules': rules
+    }
+
+
+def _load_catalog() -> Dict:
+    """
+    Load the products the rules apply to (no bundles/promos) as arrays.
+
+    Returns:
+        Dict with 'ids', 'names', 'price', 'stock' and 'type_codes'/'product_types'.
+    """
+    with get_db() as conn:
+        # Plain tuples - much cheaper than sqlite3.Row for large result sets
+        conn.row_factory = None
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT id, name, price, stock, COALESCE(product_type, '')
+            FROM products
+            WHERE (product_type IS NULL OR product_type NOT IN ({','.join(['?'] * len(SKIPPED_PRODUCT_TYPES))}))
+            ORDER BY id
+        ''', SKIPPED_PRODUCT_TYPES)
+        rows = cursor.fetchall()
+
+    if rows:
+        ids, names, prices, stocks, product_types = zip(*rows)
+    else:
+        ids, names, prices, stocks, product_types = (), (), (), (), ()
+
+    type_names, type_codes = np.unique(np.array(product_types, dtype=object).astype(str), return_inverse=True)
+
+    return {
+        'ids': np.array(ids, dtype=np.int64),
+        'names': list(names),
+        'price': np.array(prices, dtype=np.float64),
+        'stock': np.array(stocks, dtype=np.int64),
+        'product_types': type_names,
+        'type_codes': type_codes
+    }
+
+
+def _restock_rule(catalog: Dict, rules: Dict, add) -> None:
+    """Restock products that are out of stock or running low."""
+    stock = catalog['stock']
+
+    for index in np.flatnonzero(stock <= 0):
+        add(index, {
+            'type': 'restock',
+            'description': f"Restock {catalog['names'][index]} - out of stock",
+            'reasoning': "0 units in inventory - every day out of stock is lost sales",
+            'confidence': 1.0
+        })
+
+    for index in np.flatnonzero((stock > 0) & (stock < rules['low_stock_threshold'])):
+        add(index, {
+            'type': 'restock',
+            'description': f"Restock {catalog['names'][index]} - {stock[index]} units left",
+            'reasoning': f"Stock below the low-stock threshold of {rules['low_stock_threshold']} units",
+            'confidence': 0.6
+        })
+
+
+def _price_rule(catalog: Dict, rules: Dict, add) -> None:
+    """Move prices outside their type's price band back to the band edge."""
+    price = catalog['price']
+    stock = catalog['stock']
+    low, high, peers = _price_bands(catalog, rules)
+    tolerance = rules['price_tolerance_pct'] / 100.0
+
+    with np.errstate(invalid='ignore'):
+        too_high = price > high * (1 + tolerance)
+        too_low = (price < low * (1 - tolerance)) & (stock > 0) & (stock < rules['low_stock_threshold'])
+
+    for index in np.flatnonzero(too_high):
+        new_price = round(float(high[index]), 2)
+        above_pct = (price[index] / high[index] - 1) * 100
+        add(index, {
+            'type': 'price',
+            'description': f"Lower price to {new_price} PLN",
+            'reasoning': f"{above_pct:.0f}% above the price band of {peers[index]} similar products",
+            'new_price': new_price,
+            'confidence': round(min(0.9, 0.5 + above_pct / 100), 2)
+        })
+
+    for index in np.flatnonzero(too_low):
+        new_price = round(float(low[index]), 2)
+        below_pct = (1 - price[index] / low[index]) * 100
+        add(index, {
+            'type': 'price',
+            'description': f"Raise price to {new_price} PLN",
+            'reasoning': f"{below_pct:.0f}% below the price band and only {stock[index]} units left",
+            'new_price': new_price,
+            'confidence': round(min(0.9, 0.5 + below_pct / 100), 2)
+        })
+
+
+def _price_bands(catalog: Dict, rules: Dict) -> tuple:
+    """
+    Price band of every product: percentiles of its type's prices.
+
+    Returns:
+        (low, high, peers) arrays; bands are nan when there are fewer than
+        min_peers products to compare with.
+    """
+    price = catalog['price']
+    codes = catalog['type_codes']
+    percents = [rules['price_band_low_pct'], rules['price_band_high_pct']]
+    type_counts = np.bincount(codes, minlength=len(catalog['product_types']))
+
+    low = np.full(len(price), np.nan)
+    high = np.full(len(price), np.nan)
+    peers = np.full(len(price), len(price))
+
+    # Small types are compared with the whole catalog
+    if len(price) >= rules['min_peers']:
+        low[:], high[:] = np.percentile(price, percents)
+
+    for code in np.flatnonzero(type_counts >= rules['min_peers']):
+        members = codes == code
+        low[members], high[members] = np.percentile(price[members], percents)
+        peers[members] = type_counts[code]
+
+    return low, high, peers
+
+
+def _affinity_partners(catalog: Dict, rules: Dict) -> Dict[int, np.ndarray]:
+    """
+    In-stock partner candidates per product type code, highest stock first.
+
+    Partners of a type are products of the same type and of the types listed
+    for it in type_affinity.
+    """
+    codes = catalog['type_codes']
+    stock = catalog['stock']
+    names = list(catalog['product_types'])
+    in_stock = np.flatnonzero(stock > 0)
+    # Highest stock first, lower ID on ties (ids are sorted)
+    in_stock = in_stock[np.argsort(-stock[in_stock], kind='stable')]
+
+    partners = {}
+    for code, type_name in enumerate(names):
+        affine = [code] + [names.index(t) for t in rules['type_affinity'].get(type_name, []) if t in names]
+        partners[code] = in_stock[np.isin(codes[in_stock], affine)]
+    return partners
+
+
+def _promo_rule(catalog: Dict, rules: Dict, partners: Dict[int, np.ndarray], add) -> None:
+    """Promote overstocked products together with their best partner."""
+    stock = catalog['stock']
+    discount = rules['promo_discount_pct']
+
+    for index in np.flatnonzero(stock >= rules['overstock_threshold']):
+        candidates = partners[catalog['type_codes'][index]]
+        candidates = candidates[candidates != index]
+        if not len(candidates):
+            continue
+
+        partner = candidates[0]
+        add(index, {
+            'type': 'promo',
+            'description': f"Buy {catalog['names'][index]}, get {catalog['names'][partner]} -{discount:g}%",
+            'reasoning': f"{stock[index]} units in stock - above the overstock threshold",
+            'product_ids': [int(catalog['ids'][partner])],
+            'discount_pct': discount,
+            'confidence': 0.6
+        })
+
+
+def _bundle_rule(catalog: Dict, rules: Dict, partners: Dict[int, np.ndarray], add) -> None:
+    """
+    Group well-stocked products with partners of affine types into bundles.
+
+    Products are taken highest stock first and each product ends up in at
+    most one bundle, so the catalog gets distinct bundles instead of every
+    product pairing with the same best sellers.
+    """
+    stock = catalog['stock']
+    codes = catalog['type_codes']
+    size = rules['bundle_size']
+    min_stock = rules['bundle_min_stock']
+    discount = rules['bundle_discount_pct']
+
+    eligible = np.flatnonzero(stock >= min_stock)
+    used = np.zeros(len(stock), dtype=bool)
+    # First partner position per type that may still be unused
+    cursors = dict.fromkeys(partners, 0)
+
+    for index in eligible[np.argsort(-stock[eligible], kind='stable')]:
+        if used[index]:
+            continue
+
+        code = codes[index]
+        candidates = partners[code]
+        members = []
+        for candidate in candidates[cursors[code]:]:
+            if stock[candidate] < min_stock or len(members) == size - 1:
+                break
+            if not used[candidate] and candidate != index:
+                members.append(candidate)
+        if len(members) < size - 1:
+            continue
+
+        used[index] = True
+        used[members] = True
+        while cursors[code] < len(candidates) and used[candidates[cursors[code]]]:
+            cursors[code] += 1
+
+        add(index, {
+            'type': 'bundle',
+            'description': f"Bundle with {', '.join(catalog['names'][m] for m in members)} -{discount:g}%",
+            'reasoning': "Related products with enough stock for a bundle",
+            'product_ids': [int(catalog['ids'][m]) for m in members],
+            'discount_pct': discount,
+            'confidence': 0.5
+        })
@@ -0,0 +1,269 @@
+"""What-if pricing simulations over the whole catalog (vectorized with NumPy)."""
+import time
+from datetime import datetime
+from typing import List, Dict, Optional
+import numpy as np
+from database import get_db
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Price bins per channel histogram
+HISTOGRAM_BINS = 10
+# Simulated prices never go below this
+MIN_PRICE = 0.01
+
+# Catalog arrays, valid while catalog_version.version is unchanged
+_catalog_cache = {'version': None, 'catalog': None}
+
+
+def simulate_pricing(rules: Optional[List[Dict]] = None, include_pending_suggestions: bool = False) -> Dict:
+    """
+    Simulate price changes on the whole catalog without writing anything.
+
+    Prices and stock of all products are loaded into NumPy arrays (cached
+    until the catalog changes). Pending price suggestions are applied first
+    (the latest one per product), then the rules in order, so a later rule
+    adjusts the result of earlier ones.
+
+    Args:
+        rules: Price rules, each with 'adjust_pct' (percent change, e.g. -10)
+            and optional filters: 'channel', 'product_type', 'min_stock',
+            'max_stock', 'min_price', 'max_price' (filters match the
+            original price).
+        include_pending_suggestions: Apply pending ('new') price suggestions.
+
+    Returns:
+        Dict with inventory value before/after, price percentiles, per-channel
+        deltas and price histograms, and how many products each rule matched.
+
+    Raises:
+        ValueError: If neither rules nor pending suggestions are requested.
+    """
+    rules = rules or []
+    if not rules and not include_pending_suggestions:
+        raise ValueError("Provide at least one rule or include_pending_suggestions")
+
+    started = time.perf_counter()
+    catalog = _load_catalog()
+    price = catalog['price']
+    new_price = price.copy()
+
+    suggestions_applied = 0
+    if include_pending_suggestions:
+        suggestions_applied = _apply_pending_suggestions(catalog, new_price)
+
+    rules_applied = []
+    for index, rule in enumerate(rules):
+        mask = _rule_mask(catalog, rule)
+        new_price[mask] *= 1 + rule['adjust_pct'] / 100.0
+        rules_applied.append({'rule': index, 'products_matched': int(mask.sum())})
+
+    np.maximum(np.round(new_price, 2), MIN_PRICE, out=new_price)
+
+    result = _summarize(catalog, price, new_price)
+    result['suggestions_applied'] = suggestions_applied
+    result['rules_applied'] = rules_applied
+    result['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 1)
+
+    logger.info(
+        f"Pricing simulation over {len(price)} products: {result['products_changed']} changed, "
+        f"inventory value delta {result['inventory_value']['delta']} in {result['elapsed_ms']} ms"
+    )
+    return result
+
+
+def _load_catalog() -> Dict:
+    """
+    Load id, price, stock, channel and product type of all products as arrays.
+
+    Returns:
+        Dict with sorted 'ids', 'price', 'stock', 'channel_codes'/'channels'
+        and 'type_codes'/'product_types' (codes index into the name arrays).
+    """
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT version FROM catalog_version WHERE id = 1')
+        version = cursor.fetchone()[0]
+
+        if _catalog_cache['version'] == version:
+            return _catalog_cache['catalog']
+
+        # Plain tuples - much cheaper than sqlite3.Row for large result sets
+        conn.row_factory = None
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT id, price, stock, channel, COALESCE(product_type, '')
+            FROM products
+            ORDER BY id
+        ''')
+        rows = cursor.fetchall()
+
+    if rows:
+        ids, prices, stocks, channels, product_types = zip(*rows)
+    else:
+        ids, prices, stocks, channels, product_types = (), (), (), (), ()
+
+    channel_names, channel_codes = np.unique(np.array(channels, dtype=object).astype(str), return_inverse=True)
+    type_names, type_codes = np.unique(np.array(product_types, dtype=object).astype(str), return_inverse=True)
+
+    catalog = {
+        'ids': np.array(ids, dtype=np.int64),
+        'price': np.array(prices, dtype=np.float64),
+        'stock': np.array(stocks, dtype=np.float64),
+        'channels': channel_names,
+        'channel_codes': channel_codes,
+        'product_types': type_names,
+        'type_codes': type_codes
+    }
+
+    _catalog_cache['version'] = version
+    _catalog_cache['catalog'] = catalog
+    return catalog
+
+
+def _apply_pending_suggestions(catalog: Dict, new_price: np.ndarray) -> int:
+    """
+    Set new_price for products with a pending price suggestion (latest wins).
+
+    Returns:
+        Number of products changed by a suggestion.
+    """
+    with get_db() as conn:
+        conn.row_factory = None
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT product_id, new_price, discount_pct
+            FROM suggestions
+            WHERE status = 'new' AND type = 'price'
+              AND (new_price IS NOT NULL OR discount_pct IS NOT NULL)
+              AND (expires_at IS NULL OR expires_at > ?)
+            ORDER BY product_id, updated_at DESC, id DESC
+        ''', (datetime.now().isoformat(sep=' ', timespec='seconds'),))
+        rows = cursor.fetchall()
+
+    if not rows:
+        return 0
+
+    product_ids, target_prices, discounts = zip(*rows)
+    product_ids = np.array(product_ids, dtype=np.int64)
+    target_prices = np.array(target_prices, dtype=np.float64)  # None -> nan
+    discounts = np.array(discounts, dtype=np.float64)
+
+    # Rows are sorted latest first per product - keep the first row of each product
+    product_ids, first = np.unique(product_ids, return_index=True)
+    target_prices, discounts = target_prices[first], discounts[first]
+
+    # Map product IDs to catalog positions (ids are sorted)
+    positions = np.searchsorted(catalog['ids'], product_ids)
+    positions = np.minimum(positions, len(catalog['ids']) - 1)
+    found = catalog['ids'][positions] == product_ids
+    positions, target_prices, discounts = positions[found], target_prices[found], discounts[found]
+
+    new_price[positions] = np.where(
+        np.isnan(target_prices),
+        catalog['price'][positions] * (1 - discounts / 100.0),
+        target_prices
+    )
+    return len(positions)
+
+
+def _rule_mask(catalog: Dict, rule: Dict) -> np.ndarray:
+    """Boolean mask of the products a rule applies to."""
+    price = catalog['price']
+    stock = catalog['stock']
+    mask = np.ones(len(price), dtype=bool)
+
+    if rule.get('channel'):
+        mask &= catalog['channel_codes'] == _code_of(catalog['channels'], rule['channel'])
+    if rule.get('product_type'):
+        mask &= catalog['type_codes'] == _code_of(catalog['product_types'], rule['product_type'])
+    if rule.get('min_stock') is not None:
+        mask &= stock >= rule['min_stock']
+    if rule.get('max_stock') is not None:
+        mask &= stock <= rule['max_stock']
+    if rule.get('min_price') is not None:
+        mask &= price >= rule['min_price']
+    if rule.get('max_price') is not None:
+        mask &= price <= rule['max_price']
+
+    return mask
+
+
+def _code_of(names: np.ndarray, value: str) -> int:
+    """Code of a value in a sorted name array, or -1 if absent (matches nothing)."""
+    position = int(np.searchsorted(names, value))
+    return position if position < len(names) and names[position] == value else -1
+
+
+def _summarize(catalog: Dict, price: np.ndarray, new_price: np.ndarray) -> Dict:
+    """Aggregate the simulated prices: totals, percentiles and per-channel deltas."""
+    stock = np.maximum(catalog['stock'], 0)
+    codes = catalog['channel_codes']
+    n_channels = len(catalog['channels'])
+
+    value_before = price * stock
+    value_after = new_price * stock
+    # Prices are stored to the cent - rounding alone is not a change
+    changed = new_price != np.round(price, 2)
+
+    channel_products = np.bincount(codes, minlength=n_channels)
+    channel_changed = np.bincount(codes, weights=changed, minlength=n_channels)
+    channel_value_before = np.bincount(codes, weights=value_before, minlength=n_channels)
+    channel_value_after = np.bincount(codes, weights=value_after, minlength=n_channels)
+    channel_price_before = np.bincount(codes, weights=price, minlength=n_channels)
+    channel_price_after = np.bincount(codes, weights=new_price, minlength=n_channels)
+
+    if len(price):
+        edges = np.histogram_bin_edges(np.concatenate([price, new_price]), bins=HISTOGRAM_BINS)
+    else:
+        edges = np.linspace(0, 1, HISTOGRAM_BINS + 1)
+
+    by_channel = {}
+    for code, channel in enumerate(catalog['channels']):
+        in_channel = codes == code
+        products = int(channel_products[code])
+        by_channel[str(channel)] = {
+            'products': products,
+            'products_changed': int(channel_changed[code]),
+            'inventory_value': _value_delta(channel_value_before[code], channel_value_after[code]),
+            'average_price': {
+                'before': round(float(channel_price_before[code] / products), 2),
+                'after': round(float(channel_price_after[code] / products), 2)
+            },
+            'price_histogram': {
+                'before': np.histogram(price[in_channel], bins=edges)[0].tolist(),
+                'after': np.histogram(new_price[in_channel], bins=edges)[0].tolist()
+            }
+        }
+
+    return {
+        'products': len(price),
+        'products_changed': int(changed.sum()),
+        'inventory_value': _value_delta(value_before.sum(), value_after.sum()),
+        'price_percentiles': {
+            'before': _percentiles(price),
+            'after': _percentiles(new_price)
+        },
+        'histogram_edges': np.round(edges, 2).tolist(),
+        'by_channel': by_channel
+    }
+
+
+def _value_delta(before: float, after: float) -> Dict:
+    """Before/after/delta of an inventory value."""
+    return {
+        'before': round(float(before), 2),
+        'after': round(float(after), 2),
+        'delta': round(float(after - before), 2),
+        'delta_pct': round(float((after - before) * 100 / before), 2) if before else None
+    }
+
+
+def _percentiles(values: np.ndarray) -> Dict:
+    """p10/p50/p90 of prices (None for an empty catalog)."""
+    if not len(values):
+        return {'p10': None, 'p50': None, 'p90': None}
+
+    p10, p50, p90 = np.percentile(values, [10, 50, 90])
+    return {'p10': round(float(p10), 2), 'p50': round(float(p50), 2), 'p90': round(float(p90), 2)}
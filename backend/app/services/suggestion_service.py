@@ -1,14 +1,35 @@
 """Suggestion-related business logic."""
 from typing import List, Dict, Optional
+import os
 import re
 import json
-from datetime import datetime
+import base64
+import hashlib
+from datetime import datetime, timedelta
 from database import get_db
 from utils.logger import get_logger
-from services.connection_service import get_integration_for_product
+from services.outbox_service import enqueue_action, get_actions_for_suggestion, flush_outbox
+from services.analysis_cache_service import prune_analysis_cache
 
 logger = get_logger(__name__)
 
+# Pending ('new') suggestions expire after this many days unless regenerated
+SUGGESTION_TTL_DAYS = int(os.getenv('SUGGESTION_TTL_DAYS', '14'))
+SUGGESTION_SWEEP_SECONDS = int(os.getenv('SUGGESTION_SWEEP_SECONDS', '3600'))
+# Rows deleted per sweeper transaction (keeps write locks short)
+SWEEP_BATCH_SIZE = 500
+# Types whose action is fully described by the structured fields (see _suggestion_fingerprint)
+STRUCTURED_SUGGESTION_TYPES = ('price', 'promo', 'bundle', 'restock')
+
+_sweeper = None
+
+# Products related to a suggestion, as a JSON array in join-table order
+RELATED_PRODUCT_IDS_SQL = '''
+    (SELECT json_group_array(sp.product_id)
+     FROM (SELECT product_id FROM suggestion_products
+           WHERE suggestion_id = s.id ORDER BY position) sp)
+'''
+
 
 def get_suggestions_for_product(product_id: int) -> Optional[List[Dict]]:
     """
@@ -34,39 +55,288 @@ def get_suggestions_for_product(product_id: int) -> Optional[List[Dict]]:
             return None
 
         # Get suggestions
-        cursor.execute('''
-            SELECT id, product_id, type, description, status, created_at, applied_at
-            FROM suggestions
-            WHERE product_id = ?
+        cursor.execute(f'''
+            SELECT s.id, s.product_id, s.type, s.description, s.status, s.created_at, s.applied_at,
+                   s.new_price, s.discount_pct, s.reasoning, s.confidence,
+                   {RELATED_PRODUCT_IDS_SQL} AS related_product_ids
+            FROM suggestions s
+            WHERE s.product_id = ?
+              AND NOT (s.status = 'new' AND s.expires_at IS NOT NULL AND s.expires_at <= ?)
             ORDER BY
-                CASE status
+                CASE s.status
                     WHEN 'new' THEN 1
                     WHEN 'applied' THEN 2
                     ELSE 3
                 END,
-                created_at DESC
-        ''', (product_id,))
+                s.created_at DESC
+        ''', (product_id, _now()))
         rows = cursor.fetchall()
 
         suggestions = [dict(row) for row in rows]
 
+    for suggestion in suggestions:
+        suggestion['related_product_ids'] = json.loads(suggestion['related_product_ids'])
+
     logger.info(f"Retrieved {len(suggestions)} suggestions for product {product_id}")
     return suggestions
 
 
+def list_suggestions(status: Optional[str] = None, suggestion_type: Optional[str] = None,
+                     connection_id: Optional[int] = None, created_after: Optional[str] = None,
+                     created_before: Optional[str] = None, limit: int = 50,
+                     cursor: Optional[str] = None) -> Dict:
+    """
+    Retrieve a page of suggestions across the whole catalog (review queue).
+
+    Pages are ordered newest first and use keyset pagination on
+    (created_at, id), so every page is one indexed range scan
+    (idx_suggestions_status_created / idx_suggestions_status_type_created)
+    regardless of how deep the client has paged. Expired pending suggestions
+    are left out.
+
+    Args:
+        status: Only suggestions with this status ('new', 'applied').
+        suggestion_type: Only suggestions of this type.
+        connection_id: Only suggestions for products of this store connection.
+        created_after: Only suggestions created at or after this time.
+        created_before: Only suggestions created before this time.
+        limit: Page size.
+        cursor: next_cursor returned with the previous page.
+
+    Returns:
+        Dict with 'items' (suggestions with product name, sku, price and
+        channel) and 'next_cursor' (None on the last page).
+
+    Raises:
+        ValueError: If cursor is malformed.
+    """
+    conditions = ["NOT (s.status = 'new' AND s.expires_at IS NOT NULL AND s.expires_at <= ?)"]
+    params = [_now()]
+
+    if status:
+        conditions.append('s.status = ?')
+        params.append(status)
+    if suggestion_type:
+        conditions.append('s.type = ?')
+        params.append(suggestion_type)
+    if connection_id:
+        conditions.append('p.connection_id = ?')
+        params.append(connection_id)
+    if created_after:
+        conditions.append('s.created_at >= ?')
+        params.append(created_after)
+    if created_before:
+        conditions.append('s.created_at < ?')
+        params.append(created_before)
+    if cursor:
+        conditions.append('(s.created_at, s.id) < (?, ?)')
+        params.extend(_decode_cursor(cursor))
+
+    with get_db() as conn:
+        db_cursor = conn.cursor()
+        db_cursor.execute(f'''
+            SELECT s.id, s.product_id, s.type, s.description, s.status, s.created_at, s.applied_at,
+                   s.new_price, s.discount_pct, s.reasoning, s.confidence, s.expires_at,
+                   {RELATED_PRODUCT_IDS_SQL} AS related_product_ids,
+                   p.name AS product_name, p.sku AS product_sku, p.price AS product_price,
+                   p.stock AS product_stock, p.channel, p.connection_id
+            FROM suggestions s
+            JOIN products p ON s.product_id = p.id
+            WHERE {' AND '.join(conditions)}
+            ORDER BY s.created_at DESC, s.id DESC
+            LIMIT ?
+        ''', params + [limit + 1])
+        rows = db_cursor.fetchall()
+
+    items = [dict(row) for row in rows[:limit]]
+    for item in items:
+        item['related_product_ids'] = json.loads(item['related_product_ids'])
+
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = _encode_cursor(items[-1]['created_at'], items[-1]['id'])
+
+    logger.info(f"Listed {len(items)} suggestions (status={status}, type={suggestion_type}, connection={connection_id})")
+    return {'items': items, 'next_cursor': next_cursor}
+
+
+def save_suggestions(cursor, product_id: int, suggestions: List[Dict]) -> List[int]:
+    """
+    Insert suggestions with their structured fields, inside the caller's transaction.
+
+    Shared by the AI agent and the demo generator so every suggestion is
+    stored the same way: typed columns for the values apply needs and the
+    related products in the suggestion_products join table.
+
+    Each suggestion gets a fingerprint of (product, type, action). If a 'new'
+    suggestion with the same fingerprint exists, it is refreshed (text,
+    confidence, expiry) instead of inserting a duplicate.
+
+    Args:
+        cursor: Database cursor.
+        product_id: Product the suggestions are for.
+        suggestions: Dicts with 'type' and 'description', and optionally
+            'status', 'new_price', 'discount_pct', 'reasoning', 'confidence'
+            and 'product_ids' (related products for promo/bundle).
+
+    Returns:
+        IDs of the inserted or refreshed suggestions (same order as the input).
+    """
+    now = _now()
+    expires_at = _now(SUGGESTION_TTL_DAYS)
+    suggestion_ids = []
+    related_rows = []
+
+    for suggestion in suggestions:
+        new_price = _to_float(suggestion.get('new_price'))
+        discount_pct = _to_float(suggestion.get('discount_pct'))
+        related_ids = list(dict.fromkeys(
+            int(pid) for pid in suggestion.get('product_ids') or [] if str(pid).isdigit()
+        ))
+
+        cursor.execute('''
+            INSERT INTO suggestions (product_id, type, description, status,
+                                     new_price, discount_pct, reasoning, confidence,
+                                     fingerprint, expires_at, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (fingerprint) WHERE status = 'new' DO UPDATE SET
+                description = excluded.description,
+                reasoning = excluded.reasoning,
+                confidence = excluded.confidence,
+                expires_at = excluded.expires_at,
+                updated_at = excluded.updated_at
+            RETURNING id
+        ''', (
+            product_id,
+            suggestion['type'],
+            suggestion['description'],
+            suggestion.get('status', 'new'),
+            new_price,
+            discount_pct,
+            suggestion.get('reasoning'),
+            _to_float(suggestion.get('confidence')),
+            _suggestion_fingerprint(product_id, suggestion['type'], new_price, discount_pct,
+                                    related_ids, suggestion['description']),
+            expires_at,
+            now,
+            now
+        ))
+        suggestion_id = cursor.fetchone()[0]
+        suggestion_ids.append(suggestion_id)
+
+        related_rows.extend(
+            (suggestion_id, related_id, position)
+            for position, related_id in enumerate(related_ids)
+        )
+
+    if related_rows:
+        # Refreshed suggestions already have their (identical) related products
+        cursor.executemany('''
+            INSERT OR IGNORE INTO suggestion_products (suggestion_id, product_id, position)
+            VALUES (?, ?, ?)
+        ''', related_rows)
+
+    return suggestion_ids
+
+
+def sweep_suggestions(batch_size: int = SWEEP_BATCH_SIZE) -> Dict:
+    """
+    Delete expired and superseded pending suggestions in batches.
+
+    A 'new' suggestion is expired once its expires_at has passed (or, for
+    rows created before expiry existed, SUGGESTION_TTL_DAYS after creation),
+    and superseded once a later generation produced a 'new' suggestion of the
+    same type for the same product and the same related products (e.g. a
+    newer price, or a new discount for the same promo partner). Alternatives
+    with other partners, such as a second bundle, are kept. Applied
+    suggestions are never touched.
+    Every batch is its own short transaction.
+
+    Args:
+        batch_size: Maximum rows deleted per transaction.
+
+    Returns:
+        Dict with the number of expired and superseded suggestions removed.
+    """
+    now = _now()
+    legacy_cutoff = _now(-SUGGESTION_TTL_DAYS)
+
+    expired = _delete_in_batches('''
+        SELECT id FROM suggestions
+        WHERE status = 'new'
+          AND (expires_at <= ? OR (expires_at IS NULL AND created_at <= ?))
+        LIMIT ?
+    ''', (now, legacy_cutoff), batch_size)
+
+    superseded = _delete_in_batches('''
+        SELECT s.id FROM suggestions s
+        WHERE s.status = 'new'
+          AND EXISTS (
+              SELECT 1 FROM suggestions newer
+              WHERE newer.product_id = s.product_id
+                AND newer.status = 'new'
+                AND newer.type = s.type
+                AND newer.updated_at > s.updated_at
+                -- Same set of related products
+                AND (SELECT COUNT(*) FROM suggestion_products WHERE suggestion_id = newer.id)
+                    = (SELECT COUNT(*) FROM suggestion_products WHERE suggestion_id = s.id)
+                AND NOT EXISTS (
+                    SELECT product_id FROM suggestion_products WHERE suggestion_id = s.id
+                    EXCEPT
+                    SELECT product_id FROM suggestion_products WHERE suggestion_id = newer.id
+                )
+          )
+        LIMIT ?
+    ''', (), batch_size)
+
+    if expired or superseded:
+        logger.info(f"Suggestion sweep removed {expired} expired and {superseded} superseded suggestions")
+
+    return {'expired': expired, 'superseded': superseded}
+
+
+def start_suggestion_sweeper() -> None:
+    """
+    Start the background scheduler that prunes stale suggestions (and expired AI analyses).
+
+    Disabled when SUGGESTION_SWEEP_ENABLED=0 (e.g. for one-off scripts).
+    """
+    global _sweeper
+
+    if _sweeper is not None or os.getenv('SUGGESTION_SWEEP_ENABLED', '1') == '0':
+        return
+
+    from apscheduler.schedulers.background import BackgroundScheduler
+
+    _sweeper = BackgroundScheduler(daemon=True)
+    _sweeper.add_job(sweep_suggestions, 'interval', seconds=SUGGESTION_SWEEP_SECONDS,
+                     id='sweep_suggestions', max_instances=1, coalesce=True,
+                     next_run_time=datetime.now())
+    # Expired AI analyses are pruned on the same schedule
+    _sweeper.add_job(prune_analysis_cache, 'interval', seconds=SUGGESTION_SWEEP_SECONDS,
+                     id='prune_analysis_cache', max_instances=1, coalesce=True)
+    _sweeper.start()
+    logger.info(f"Suggestion sweeper started (every {SUGGESTION_SWEEP_SECONDS}s)")
+
+
 def apply_suggestion(suggestion_id: int) -> Dict:
     """
-    Apply a suggestion and update product in both database and Shopify/WooCommerce.
+    Apply a suggestion: update the product locally and queue the store writes.
 
     For price suggestions, extracts the new price and updates the product.
-    For promo suggestions, creates discount codes in the store.
+    For promo/bundle suggestions, creates the combined product and zeroes
+    the stock of its components.
     Creates an event in the history.
 
+    The local change and the outbox entries for Shopify/WooCommerce commit
+    in one short transaction; the outbox worker pushes them to the store
+    with retries (see get_actions_for_suggestion for per-action status).
+
     Args:
         suggestion_id: ID of the suggestion to apply.
 
     Returns:
-        Dict with success status and details.
+        Dict with success status, details and queued outbox entry IDs.
 
     Raises:
         ValueError: If suggestion not found or already applied.
@@ -75,245 +345,270 @@ def apply_suggestion(suggestion_id: int) -> Dict:
     with get_db() as conn:
         cursor = conn.cursor()
 
-        # Get suggestion details with product external_id
-        cursor.execute('''
-            SELECT s.id, s.product_id, s.type, s.description, s.status, s.related_product_ids,
-                   p.name as product_name, p.external_id, p.channel
-            FROM suggestions s
-            JOIN products p ON s.product_id = p.id
-            WHERE s.id = ?
-        ''', (suggestion_id,))
-        row = cursor.fetchone()
-
-        if not row:
+        suggestions = _load_suggestions_for_apply(cursor, [suggestion_id])
+        if suggestion_id not in suggestions:
             raise ValueError(f"Suggestion {suggestion_id} not found")
 
+        result = _apply_loaded_suggestion(cursor, suggestions[suggestion_id])
+
+    return result
+
+
+def apply_suggestions_batch(suggestion_ids: List[int]) -> Dict:
+    """
+    Apply many suggestions at once and push their store writes immediately.
+
+    All suggestions are loaded and validated with one query and applied in a
+    single transaction (a savepoint per suggestion, so one failure does not
+    undo the others). Their outbox entries are then flushed right away,
+    grouped by store connection: stores run in parallel, each with bounded
+    concurrency and a single integration instance.
+
+    Args:
+        suggestion_ids: IDs of the suggestions to apply.
+
+    Returns:
+        Dict with per-suggestion results (including store action status)
+        and applied/failed counts.
+
+    Raises:
+        Exception: If database operation fails.
+    """
+    unique_ids = list(dict.fromkeys(suggestion_ids))
+    results = {}
+
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+
+        suggestions = _load_suggestions_for_apply(cursor, unique_ids)
+
+        for suggestion_id in unique_ids:
+            if suggestion_id not in suggestions:
+                results[suggestion_id] = {
+                    'suggestion_id': suggestion_id,
+                    'success': False,
+                    'error': f"Suggestion {suggestion_id} not found"
+                }
+                continue
+
+            cursor.execute('SAVEPOINT apply_suggestion')
+            try:
+                results[suggestion_id] = _apply_loaded_suggestion(cursor, suggestions[suggestion_id])
+                cursor.execute('RELEASE apply_suggestion')
+            except Exception as e:
+                cursor.execute('ROLLBACK TO apply_suggestion')
+                cursor.execute('RELEASE apply_suggestion')
+                logger.warning(f"Batch apply of suggestion {suggestion_id} failed: {e}")
+                results[suggestion_id] = {
+                    'suggestion_id': suggestion_id,
+                    'success': False,
+                    'error': str(e)
+                }
+
+    # Push store writes now instead of waiting for the background worker
+    outbox_ids = [oid for result in results.values() for oid in result.get('outbox_ids', [])]
+    store_actions = flush_outbox(outbox_ids)
+
+    for result in results.values():
+        result['store_actions'] = [store_actions[oid] for oid in result.get('outbox_ids', []) if oid in store_actions]
+
+    applied = sum(1 for result in results.values() if result['success'])
+    logger.info(f"Batch applied {applied}/{len(unique_ids)} suggestions, pushed {len(outbox_ids)} store writes")
+
+    return {
+        'success': applied == len(unique_ids),
+        'applied': applied,
+        'failed': len(unique_ids) - applied,
+        'results': [results[suggestion_id] for suggestion_id in unique_ids]
+    }
+
+
+def _load_suggestions_for_apply(cursor, suggestion_ids: List[int]) -> Dict[int, Dict]:
+    """
+    Load suggestions with their product and store connection details.
+
+    Args:
+        cursor: Database cursor.
+        suggestion_ids: Suggestion IDs.
+
+    Returns:
+        Dict mapping suggestion ID to suggestion details.
+    """
+    cursor.execute(f'''
+        SELECT s.id, s.product_id, s.type, s.description, s.status, s.expires_at,
+               s.new_price, s.discount_pct,
+               {RELATED_PRODUCT_IDS_SQL} AS related_product_ids,
+               p.name as product_name, p.price as product_price, p.external_id, p.channel, p.connection_id,
+               sc.is_active as connection_active
+        FROM suggestions s
+        JOIN products p ON s.product_id = p.id
+        LEFT JOIN store_connections sc ON p.connection_id = sc.id
+        WHERE s.id IN ({','.join(['?'] * len(suggestion_ids))})
+    ''', suggestion_ids)
+
+    suggestions = {}
+    for row in cursor.fetchall():
         suggestion = dict(row)
+        suggestion['related_product_ids'] = json.loads(suggestion['related_product_ids'])
+        suggestions[suggestion['id']] = suggestion
 
-        if suggestion['status'] == 'applied':
-            raise ValueError(f"Suggestion {suggestion_id} already applied")
+    return suggestions
 
-        # Update suggestion status
-        now = datetime.now().isoformat(sep=' ', timespec='seconds')
-        cursor.execute('''
-            UPDATE suggestions
-            SET status = 'applied', applied_at = ?
-            WHERE id = ?
-        ''', (now, suggestion_id))
-
-        # Get store integration for this product
-        try:
-            integration = get_integration_for_product(suggestion['product_id'])
-        except Exception as e:
-            logger.warning(f"Could not get integration for product {suggestion['product_id']}: {e}")
-            integration = None
-
-        applied_actions = []
-
-        # Handle different suggestion types
-        if suggestion['type'] == 'price':
-            new_price = _extract_price_from_suggestion(suggestion, cursor)
-            if new_price is not None:
-                # Update in database
-                cursor.execute('''
-                    UPDATE products
-                    SET price = ?, updated_at = ?
-                    WHERE id = ?
-                ''', (new_price, now, suggestion['product_id']))
-                logger.info(f"Updated product {suggestion['product_id']} price to {new_price} in database")
-                applied_actions.append(f"Changed price to {new_price} PLN in database")
-
-                # Update in Shopify/WooCommerce
-                if integration and suggestion['external_id']:
-                    try:
-                        if integration.update_product_price(suggestion['external_id'], new_price):
-                            logger.info(f"Updated product {suggestion['external_id']} price to {new_price} in {suggestion['channel']}")
-                            applied_actions.append(f"Changed price to {new_price} PLN in {suggestion['channel']} store")
-                        else:
-                            logger.error(f"Failed to update price in {suggestion['channel']}")
-                            applied_actions.append(f"ERROR: Failed to change price in {suggestion['channel']} store")
-                    except Exception as e:
-                        logger.error(f"Error updating price in store: {e}")
-                        applied_actions.append(f"ERROR: {str(e)}")
-
-        elif suggestion['type'] == 'promo':
-            # Promo: Create new product (1+1), reduce stock of originals
-            related_ids = _parse_related_product_ids(suggestion.get('related_product_ids'))
-            if related_ids and len(related_ids) >= 1 and integration:
-                try:
-                    # Get products to combine
-                    product_ids_to_combine = [suggestion['product_id']] + related_ids[:1]  # Main + 1 other
-                    cursor.execute(f'''
-                        SELECT id, name, price, stock, external_id, product_type
-                        FROM products
-                        WHERE id IN ({','.join(['?'] * len(product_ids_to_combine))})
-                    ''', product_ids_to_combine)
-                    products_to_combine = [dict(row) for row in cursor.fetchall()]
-
-                    # Validate: cannot create promo from bundles or other promos
-                    invalid_products = [p for p in products_to_combine if p.get('product_type') in ['bundle', 'promotion', 'Zestaw', 'Promocja']]
-                    if invalid_products:
-                        invalid_names = ', '.join([p['name'] for p in invalid_products])
-                        applied_actions.append(f"ERROR: Cannot create promo from bundles or other promos: {invalid_names}")
-                        logger.warning(f"Cannot create promo from bundles/promos: {invalid_names}")
-                    elif len(products_to_combine) < 2:
-                        applied_actions.append("ERROR: Not all products found for promo")
-                    else:
-                        # Create promo product name and price
-                        promo_name = f"PROMO 1+1: {products_to_combine[0]['name']} + {products_to_combine[1]['name']}"
-                        promo_price = products_to_combine[0]['price'] + products_to_combine[1]['price'] * 0.5  # Second one 50% off
-                        promo_sku = f"PROMO-{suggestion['product_id']}-{'-'.join(str(p['id']) for p in products_to_combine[:2])}"
-
-                        # Create new promo product in Shopify
-                        new_product = integration.create_product({
-                            'name': promo_name,
-                            'sku': promo_sku,
-                            'price': promo_price,
-                            'stock': min(p['stock'] for p in products_to_combine),
-                            'vendor': 'AI Promo',
-                            'product_type': 'promotion'
-                        })
-
-                        if new_product:
-                            # Save promo to database
-                            cursor.execute('''
-                                SELECT connection_id FROM products WHERE id = ? LIMIT 1
-                            ''', (suggestion['product_id'],))
-                            connection_row = cursor.fetchone()
-                            connection_id = connection_row[0] if connection_row else None
-
-                            cursor.execute('''
-                                INSERT INTO products (sku, name, price, stock, status, channel, connection_id, external_id, vendor, product_type, created_at, updated_at)
-                                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                            ''', (
-                                new_product['sku'],
-                                new_product['name'],
-                                new_product['price'],
-                                new_product['stock'],
-                                new_product['status'],
-                                new_product['channel'],
-                                connection_id,
-                                new_product['external_id'],
-                                new_product.get('vendor', 'AI Promo'),
-                                'promotion',
-                                now,
-                                now
-                            ))
-                            promo_product_id = cursor.lastrowid
-
-                            # Reduce stock of original products to 0
-                            for prod in products_to_combine:
-                                integration.update_product_stock(prod['external_id'], 0)
-                                cursor.execute('UPDATE products SET stock = 0, status = ? WHERE id = ?',
-                                             ('promo_used', prod['id']))
-
-                            applied_actions.append(f"Created PROMO product: {promo_name} ({promo_price} PLN)")
-                            applied_actions.append(f"Promo saved in database (ID: {promo_product_id})")
-                            applied_actions.append(f"Reduced stock of products: {', '.join([p['name'] for p in products_to_combine])}")
-                        else:
-                            applied_actions.append("ERROR: Failed to create promo product")
-                except Exception as e:
-                    logger.error(f"Error creating promo product: {e}")
-                    applied_actions.append(f"ERROR: {str(e)}")
-            else:
-                applied_actions.append("Promo suggestion saved - no related products")
-
-        elif suggestion['type'] == 'bundle':
-            # Bundle: Create new product (2-3 items), reduce stock of originals
-            related_ids = _parse_related_product_ids(suggestion.get('related_product_ids'))
-            if related_ids and len(related_ids) >= 1 and integration:
-                try:
-                    # Get products to bundle
-                    product_ids_to_bundle = [suggestion['product_id']] + related_ids[:2]  # Main + up to 2 others
-                    cursor.execute(f'''
-                        SELECT id, name, price, stock, external_id, product_type
-                        FROM products
-                        WHERE id IN ({','.join(['?'] * len(product_ids_to_bundle))})
-                    ''', product_ids_to_bundle)
-                    products_to_bundle = [dict(row) for row in cursor.fetchall()]
-
-                    # Validate: cannot create bundle from bundles or promos
-                    invalid_products = [p for p in products_to_bundle if p.get('product_type') in ['bundle', 'promotion', 'Zestaw', 'Promocja']]
-                    if invalid_products:
-                        invalid_names = ', '.join([p['name'] for p in invalid_products])
-                        applied_actions.append(f"ERROR: Cannot create bundle from bundles or promos: {invalid_names}")
-                        logger.warning(f"Cannot create bundle from bundles/promos: {invalid_names}")
-                    elif len(products_to_bundle) < 2:
-                        applied_actions.append("ERROR: Not all products found for bundle")
-                    else:
-                        # Create bundle product name and price (10% discount)
-                        bundle_name = f"BUNDLE: " + " + ".join([p['name'] for p in products_to_bundle])
-                        bundle_price = sum(p['price'] for p in products_to_bundle) * 0.9  # 10% discount
-                        bundle_sku = f"BUNDLE-{suggestion['product_id']}-{'-'.join(str(p['id']) for p in products_to_bundle[:3])}"
-
-                        # Create new bundle product in Shopify
-                        new_product = integration.create_product({
-                            'name': bundle_name[:100],  # Limit name length
-                            'sku': bundle_sku,
-                            'price': bundle_price,
-                            'stock': min(p['stock'] for p in products_to_bundle),
-                            'vendor': 'AI Bundle',
-                            'product_type': 'bundle'
-                        })
-
-                        if new_product:
-                            # Save bundle to database
-                            cursor.execute('''
-                                SELECT connection_id FROM products WHERE id = ? LIMIT 1
-                            ''', (suggestion['product_id'],))
-                            connection_row = cursor.fetchone()
-                            connection_id = connection_row[0] if connection_row else None
-
-                            cursor.execute('''
-                                INSERT INTO products (sku, name, price, stock, status, channel, connection_id, external_id, vendor, product_type, created_at, updated_at)
-                                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                            ''', (
-                                new_product['sku'],
-                                new_product['name'],
-                                new_product['price'],
-                                new_product['stock'],
-                                new_product['status'],
-                                new_product['channel'],
-                                connection_id,
-                                new_product['external_id'],
-                                new_product.get('vendor', 'AI Bundle'),
-                                'bundle',
-                                now,
-                                now
-                            ))
-                            bundle_product_id = cursor.lastrowid
-
-                            # Reduce stock of original products to 0
-                            for prod in products_to_bundle:
-                                integration.update_product_stock(prod['external_id'], 0)
-                                cursor.execute('UPDATE products SET stock = 0, status = ? WHERE id = ?',
-                                             ('bundled', prod['id']))
-
-                            applied_actions.append(f"Created BUNDLE: {bundle_name[:50]}... ({bundle_price:.2f} PLN)")
-                            applied_actions.append(f"Bundle saved in database (ID: {bundle_product_id})")
-                            applied_actions.append(f"Reduced stock of {len(products_to_bundle)} products")
-                        else:
-                            applied_actions.append("ERROR: Failed to create bundle")
-                except Exception as e:
-                    logger.error(f"Error creating bundle: {e}")
-                    applied_actions.append(f"ERROR: {str(e)}")
-            else:
-                applied_actions.append("Bundle suggestion saved - no related products")
 
-        # Create event in history
-        actions_text = "; ".join(applied_actions) if applied_actions else "Suggestion applied"
-        event_description = (
-            f"Applied suggestion [{suggestion['type']}] for product "
-            f"'{suggestion['product_name']}': {actions_text}"
-        )
-        cursor.execute('''
-            INSERT INTO events (product_id, suggestion_id, event_type, description, created_at)
-            VALUES (?, ?, 'suggestion_applied', ?, ?)
-        ''', (suggestion['product_id'], suggestion_id, event_description, now))
+def _apply_loaded_suggestion(cursor, suggestion: Dict) -> Dict:
+    """
+    Apply a loaded suggestion within the caller's transaction.
 
-        event_id = cursor.lastrowid
+    Args:
+        cursor: Database cursor.
+        suggestion: Suggestion details from _load_suggestions_for_apply.
+
+    Returns:
+        Dict with success status, details and queued outbox entry IDs.
 
-    logger.info(f"Applied suggestion {suggestion_id} for product {suggestion['product_id']}")
+    Raises:
+        ValueError: If suggestion already applied.
+    """
+    suggestion_id = suggestion['id']
+
+    if suggestion['status'] == 'applied':
+        raise ValueError(f"Suggestion {suggestion_id} already applied")
+
+    now = _now()
+    if suggestion['expires_at'] and suggestion['expires_at'] <= now:
+        raise ValueError(f"Suggestion {suggestion_id} has expired")
+
+    # Update suggestion status
+    cursor.execute('''
+        UPDATE suggestions
+        SET status = 'applied', applied_at = ?, updated_at = ?
+        WHERE id = ?
+    ''', (now, now, suggestion_id))
+
+    # Store connection that will receive the writes (through the outbox)
+    connection_id = suggestion['connection_id'] if suggestion['connection_active'] else None
+    if not connection_id:
+        logger.warning(f"No active store connection for product {suggestion['product_id']}")
+
+    applied_actions = []
+    outbox_ids = []
+
+    # Handle different suggestion types
+    if suggestion['type'] == 'price':
+        new_price = _get_new_price(suggestion)
+        if new_price is not None:
+            # Update in database
+            cursor.execute('''
+                UPDATE products
+                SET price = ?, updated_at = ?
+                WHERE id = ?
+            ''', (new_price, now, suggestion['product_id']))
+            logger.info(f"Updated product {suggestion['product_id']} price to {new_price} in database")
+            applied_actions.append(f"Changed price to {new_price} PLN in database")
+
+            # Queue update in Shopify/WooCommerce
+            if connection_id and suggestion['external_id']:
+                outbox_ids.append(enqueue_action(
+                    cursor, 'update_price', connection_id,
+                    {'external_id': suggestion['external_id'], 'price': new_price},
+                    product_id=suggestion['product_id'], suggestion_id=suggestion_id
+                ))
+                applied_actions.append(f"Queued price change to {new_price} PLN in {suggestion['channel']} store")
+
+    elif suggestion['type'] == 'promo':
+        # Promo: Create new product (1+1), reduce stock of originals
+        related_ids = suggestion['related_product_ids']
+        if related_ids and connection_id:
+            # Get products to combine
+            product_ids_to_combine = [suggestion['product_id']] + related_ids[:1]  # Main + 1 other
+            products_to_combine = _get_products_to_combine(cursor, product_ids_to_combine)
+
+            # Validate: cannot create promo from bundles or other promos
+            invalid_products = [p for p in products_to_combine if p.get('product_type') in ['bundle', 'promotion', 'Zestaw', 'Promocja']]
+            if invalid_products:
+                invalid_names = ', '.join([p['name'] for p in invalid_products])
+                applied_actions.append(f"ERROR: Cannot create promo from bundles or other promos: {invalid_names}")
+                logger.warning(f"Cannot create promo from bundles/promos: {invalid_names}")
+            elif len(products_to_combine) < 2:
+                applied_actions.append("ERROR: Not all products found for promo")
+            else:
+                # Create promo product name and price
+                promo_name = f"PROMO 1+1: {products_to_combine[0]['name']} + {products_to_combine[1]['name']}"
+                # Second one discounted (50% off unless the suggestion says otherwise)
+                discount_pct = suggestion['discount_pct'] if suggestion['discount_pct'] is not None else 50
+                promo_price = round(products_to_combine[0]['price'] + products_to_combine[1]['price'] * (1 - discount_pct / 100.0), 2)
+                promo_sku = f"PROMO-{suggestion['product_id']}-{'-'.join(str(p['id']) for p in products_to_combine[:2])}"
+
+                promo_product_id = _queue_combined_product(cursor, suggestion, connection_id, products_to_combine, {
+                    'name': promo_name,
+                    'sku': promo_sku,
+                    'price': promo_price,
+                    'stock': min(p['stock'] for p in products_to_combine),
+                    'vendor': 'AI Promo',
+                    'product_type': 'promotion'
+                }, 'promo_used', now, outbox_ids)
+
+                applied_actions.append(f"Created PROMO product: {promo_name} ({promo_price} PLN)")
+                applied_actions.append(f"Promo saved in database (ID: {promo_product_id})")
+                applied_actions.append(f"Reduced stock of products: {', '.join([p['name'] for p in products_to_combine])}")
+                applied_actions.append(f"Queued promo creation in {suggestion['channel']} store")
+        else:
+            applied_actions.append("Promo suggestion saved - no related products")
+
+    elif suggestion['type'] == 'bundle':
+        # Bundle: Create new product (2-3 items), reduce stock of originals
+        related_ids = suggestion['related_product_ids']
+        if related_ids and connection_id:
+            # Get products to bundle
+            product_ids_to_bundle = [suggestion['product_id']] + related_ids[:2]  # Main + up to 2 others
+            products_to_bundle = _get_products_to_combine(cursor, product_ids_to_bundle)
+
+            # Validate: cannot create bundle from bundles or promos
+            invalid_products = [p for p in products_to_bundle if p.get('product_type') in ['bundle', 'promotion', 'Zestaw', 'Promocja']]
+            if invalid_products:
+                invalid_names = ', '.join([p['name'] for p in invalid_products])
+                applied_actions.append(f"ERROR: Cannot create bundle from bundles or promos: {invalid_names}")
+                logger.warning(f"Cannot create bundle from bundles/promos: {invalid_names}")
+            elif len(products_to_bundle) < 2:
+                applied_actions.append("ERROR: Not all products found for bundle")
+            else:
+                # Create bundle product name and price (10% discount unless the suggestion says otherwise)
+                bundle_name = f"BUNDLE: " + " + ".join([p['name'] for p in products_to_bundle])
+                discount_pct = suggestion['discount_pct'] if suggestion['discount_pct'] is not None else 10
+                bundle_price = round(sum(p['price'] for p in products_to_bundle) * (1 - discount_pct / 100.0), 2)
+                bundle_sku = f"BUNDLE-{suggestion['product_id']}-{'-'.join(str(p['id']) for p in products_to_bundle[:3])}"
+
+                bundle_product_id = _queue_combined_product(cursor, suggestion, connection_id, products_to_bundle, {
+                    'name': bundle_name[:100],  # Limit name length
+                    'sku': bundle_sku,
+                    'price': bundle_price,
+                    'stock': min(p['stock'] for p in products_to_bundle),
+                    'vendor': 'AI Bundle',
+                    'product_type': 'bundle'
+                }, 'bundled', now, outbox_ids)
+
+                applied_actions.append(f"Created BUNDLE: {bundle_name[:50]}... ({bundle_price:.2f} PLN)")
+                applied_actions.append(f"Bundle saved in database (ID: {bundle_product_id})")
+                applied_actions.append(f"Reduced stock of {len(products_to_bundle)} products")
+                applied_actions.append(f"Queued bundle creation in {suggestion['channel']} store")
+        else:
+            applied_actions.append("Bundle suggestion saved - no related products")
+
+    # Create event in history
+    actions_text = "; ".join(applied_actions) if applied_actions else "Suggestion applied"
+    event_description = (
+        f"Applied suggestion [{suggestion['type']}] for product "
+        f"'{suggestion['product_name']}': {actions_text}"
+    )
+    cursor.execute('''
+        INSERT INTO events (product_id, suggestion_id, event_type, description, created_at)
+        VALUES (?, ?, 'suggestion_applied', ?, ?)
+    ''', (suggestion['product_id'], suggestion_id, event_description, now))
+
+    event_id = cursor.lastrowid
+
+    logger.info(f"Applied suggestion {suggestion_id} for product {suggestion['product_id']}, queued {len(outbox_ids)} store writes")
 
     return {
         'success': True,
@@ -321,121 +616,243 @@ def apply_suggestion(suggestion_id: int) -> Dict:
         'suggestion_id': suggestion_id,
         'event_id': event_id,
         'applied_at': now,
-        'actions': applied_actions
+        'actions': applied_actions,
+        'outbox_ids': outbox_ids
     }
 
 
-def _extract_price_from_suggestion(suggestion: Dict, cursor) -> Optional[float]:
+def get_suggestion_actions(suggestion_id: int) -> Optional[List[Dict]]:
     """
-    Extract new price from a price suggestion description.
+    Retrieve the store write status of an applied suggestion.
 
-    Supports patterns:
-    - "Podwyższ cenę do 299.99" -> 299.99
-    - "Obniż cenę o 15%" -> calculates from current price
-    - "Zwiększenie ceny do 2.49 PLN" -> 2.49
-    - "Obniżenie ceny LEWANDORATOR 2000 do 64999 PLN" -> 64999
+    Args:
+        suggestion_id: ID of the suggestion.
+
+    Returns:
+        List of queued store actions with status, attempts and last error,
+        or None if suggestion doesn't exist.
+    """
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT id FROM suggestions WHERE id = ?', (suggestion_id,))
+        if not cursor.fetchone():
+            return None
+
+    return get_actions_for_suggestion(suggestion_id)
+
+
+def _get_products_to_combine(cursor, product_ids: List[int]) -> List[Dict]:
+    """
+    Fetch the component products of a promo or bundle.
 
     Args:
-        suggestion: Suggestion dict with 'type', 'description', 'product_id'.
-        cursor: Database cursor for fetching current price if needed.
+        cursor: Database cursor.
+        product_ids: Product IDs (main product first).
 
     Returns:
-        New price as float, or None if not a price suggestion or can't extract.
+        List of product dicts.
     """
-    if suggestion['type'] != 'price':
-        return None
+    cursor.execute(f'''
+        SELECT id, name, price, stock, external_id, product_type
+        FROM products
+        WHERE id IN ({','.join(['?'] * len(product_ids))})
+    ''', product_ids)
+    return [dict(row) for row in cursor.fetchall()]
 
-    description = suggestion['description']
 
-    # Pattern 1: "do X PLN" or "do X"
-    match = re.search(r'do\s+(\d+\.?\d*)\s*PLN', description)
-    if match:
-        return float(match.group(1))
+def _queue_combined_product(cursor, suggestion: Dict, connection_id: int, components: List[Dict],
+                            product_data: Dict, component_status: str, now: str,
+                            outbox_ids: List[int]) -> int:
+    """
+    Save a promo/bundle product locally and queue its creation in the store.
 
-    match = re.search(r'do\s+(\d+\.?\d*)', description)
-    if match:
-        return float(match.group(1))
+    The product row is inserted without external_id; the outbox worker fills it
+    in once the store has created the product. Component stock is zeroed
+    locally right away and in the store through the outbox.
 
-    # Pattern 2: "o X%" - percentage change
-    match = re.search(r'o\s+(\d+)%', description)
-    if match:
-        percent = int(match.group(1))
-        # Get current price
-        cursor.execute('SELECT price FROM products WHERE id = ?', (suggestion['product_id'],))
-        current_price = cursor.fetchone()[0]
-        return round(current_price * (1 - percent / 100.0), 2)
+    Args:
+        cursor: Database cursor.
+        suggestion: Suggestion being applied.
+        connection_id: Store connection of the main product.
+        components: Products that make up the promo/bundle.
+        product_data: name, sku, price, stock, vendor, product_type.
+        component_status: Status to set on the components ('promo_used', 'bundled').
+        now: Timestamp of the apply.
+        outbox_ids: List collecting the queued outbox entry IDs.
 
-    logger.warning(f"Could not extract price from suggestion: {description}")
-    return None
+    Returns:
+        Local ID of the new product.
+    """
+    cursor.execute('''
+        INSERT INTO products (sku, name, price, stock, status, channel, connection_id, external_id, vendor, product_type, created_at, updated_at)
+        VALUES (?, ?, ?, ?, 'active', ?, ?, NULL, ?, ?, ?, ?)
+    ''', (
+        product_data['sku'],
+        product_data['name'],
+        product_data['price'],
+        product_data['stock'],
+        suggestion['channel'],
+        connection_id,
+        product_data['vendor'],
+        product_data['product_type'],
+        now,
+        now
+    ))
+    new_product_id = cursor.lastrowid
+
+    outbox_ids.append(enqueue_action(
+        cursor, 'create_product', connection_id, product_data,
+        product_id=new_product_id, suggestion_id=suggestion['id']
+    ))
+
+    # Reduce stock of original products to 0
+    for prod in components:
+        cursor.execute('UPDATE products SET stock = 0, status = ? WHERE id = ?',
+                       (component_status, prod['id']))
+        if prod['external_id']:
+            outbox_ids.append(enqueue_action(
+                cursor, 'update_stock', connection_id,
+                {'external_id': prod['external_id'], 'stock': 0},
+                product_id=prod['id'], suggestion_id=suggestion['id']
+            ))
+
+    return new_product_id
+
+
+def _delete_in_batches(select_ids_sql: str, params: tuple, batch_size: int) -> int:
+    """
+    Delete suggestions (and their related products) selected by a query, batch by batch.
+
+    Args:
+        select_ids_sql: Query returning suggestion IDs, ending with a LIMIT placeholder.
+        params: Query parameters (without the limit).
+        batch_size: Maximum rows deleted per transaction.
+
+    Returns:
+        Number of suggestions deleted.
+    """
+    deleted = 0
+
+    while True:
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute(select_ids_sql, params + (batch_size,))
+            ids = [row[0] for row in cursor.fetchall()]
+            if not ids:
+                return deleted
+
+            placeholders = ','.join(['?'] * len(ids))
+            cursor.execute(f'DELETE FROM suggestion_products WHERE suggestion_id IN ({placeholders})', ids)
+            cursor.execute(f'DELETE FROM suggestions WHERE id IN ({placeholders})', ids)
+            deleted += len(ids)
+
+        if len(ids) < batch_size:
+            return deleted
+
+
+def _suggestion_fingerprint(product_id: int, suggestion_type: str, new_price: Optional[float],
+                            discount_pct: Optional[float], related_ids: List[int],
+                            description: str) -> str:
+    """
+    Fingerprint of what a suggestion does: product, type and normalized action.
+
+    The action is the structured fields (rounded price and discount, sorted
+    related products), so a reworded description of the same action still
+    matches. Only suggestions of an unknown type without any structured
+    field fall back to the normalized description.
+    """
+    action = [
+        round(new_price, 2) if new_price is not None else None,
+        round(discount_pct, 2) if discount_pct is not None else None,
+        sorted(related_ids)
+    ]
+    if action == [None, None, []] and suggestion_type not in STRUCTURED_SUGGESTION_TYPES:
+        action = ' '.join(description.lower().split())
+
+    key = json.dumps([product_id, suggestion_type, action])
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def _encode_cursor(created_at: str, suggestion_id: int) -> str:
+    """Opaque pagination cursor for the position after (created_at, id)."""
+    return base64.urlsafe_b64encode(json.dumps([created_at, suggestion_id]).encode('utf-8')).decode('ascii')
+
+
+def _decode_cursor(cursor: str) -> List:
+    """
+    Decode a pagination cursor into [created_at, id].
+
+    Raises:
+        ValueError: If cursor is malformed.
+    """
+    try:
+        created_at, suggestion_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return [str(created_at), int(suggestion_id)]
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def _now(offset_days: int = 0) -> str:
+    """Current time (plus offset) in the format used by suggestion timestamps."""
+    return (datetime.now() + timedelta(days=offset_days)).isoformat(sep=' ', timespec='seconds')
 
 
-def _extract_promo_from_suggestion(suggestion: Dict) -> Optional[Dict]:
+def _get_new_price(suggestion: Dict) -> Optional[float]:
     """
-    Extract promo/discount information from a promo suggestion.
+    Read the target price of a price suggestion from its structured fields.
 
-    Patterns:
-    - "10% rabatu" -> 10% discount
-    - "50% zniżki" -> 50% discount
-    - "2 za 1" -> Buy one get one
+    Uses new_price when set, otherwise applies discount_pct to the current
+    product price. Suggestions stored before the structured columns existed
+    fall back to parsing the description.
 
     Args:
-        suggestion: Suggestion dict with 'type' and 'description'.
+        suggestion: Suggestion details from _load_suggestions_for_apply.
 
     Returns:
-        Dict with coupon data or None if can't extract.
+        New price as float, or None if the suggestion has no price.
     """
-    if suggestion['type'] != 'promo':
-        return None
+    if suggestion['new_price'] is not None:
+        return round(suggestion['new_price'], 2)
 
-    description = suggestion['description']
+    if suggestion['discount_pct'] is not None:
+        return round(suggestion['product_price'] * (1 - suggestion['discount_pct'] / 100.0), 2)
 
-    # Extract percentage discount
-    match = re.search(r'(\d+)%\s*(rabatu|zniżki|zni)', description, re.IGNORECASE)
-    if match:
-        percent = int(match.group(1))
-        code = f"PROMO{percent}_{suggestion['product_id']}"
-        return {
-            'code': code,
-            'discount_type': 'percentage',
-            'amount': percent,
-            'description': description[:100]
-        }
-
-    # "2 za 1" or "kup jeden drugi za 50%"
-    if '2 za 1' in description.lower() or 'buy one get one' in description.lower():
-        return {
-            'code': f"BOGO_{suggestion['product_id']}",
-            'discount_type': 'percentage',
-            'amount': 50,
-            'description': 'Buy one get one 50% off'
-        }
-
-    # Default: create 10% discount if we can't extract specific amount
-    logger.warning(f"Could not extract specific discount from: {description}, using 10% default")
-    return {
-        'code': f"PROMO10_{suggestion['product_id']}",
-        'discount_type': 'percentage',
-        'amount': 10,
-        'description': description[:100]
-    }
+    return _extract_price_from_description(suggestion['description'], suggestion['product_price'])
 
 
-def _parse_related_product_ids(related_product_ids_json: Optional[str]) -> List[int]:
+def _extract_price_from_description(description: str, current_price: float) -> Optional[float]:
     """
-    Parse related product IDs from JSON string.
+    Extract new price from a legacy (unstructured) price suggestion description.
+
+    Supports patterns:
+    - "Podwyższ cenę do 299.99" -> 299.99
+    - "Obniż cenę o 15%" -> calculates from current price
+    - "Zwiększenie ceny do 2.49 PLN" -> 2.49
 
     Args:
-        related_product_ids_json: JSON string with list of product IDs.
+        description: Suggestion description.
+        current_price: Current product price (for percentage changes).
 
     Returns:
-        List of product IDs.
+        New price as float, or None if it can't be extracted.
     """
-    if not related_product_ids_json:
-        return []
+    # Pattern 1: "do X PLN" or "do X"
+    match = re.search(r'do\s+(\d+\.?\d*)', description)
+    if match:
+        return float(match.group(1))
+
+    # Pattern 2: "o X%" - percentage change
+    match = re.search(r'o\s+(\d+)%', description)
+    if match:
+        return round(current_price * (1 - int(match.group(1)) / 100.0), 2)
 
+    logger.warning(f"Could not extract price from suggestion: {description}")
+    return None
+
+
+def _to_float(value) -> Optional[float]:
+    """Convert a generator-provided number to float, or None if missing/invalid."""
     try:
-        ids = json.loads(related_product_ids_json)
-        return [int(id) for id in ids if isinstance(id, (int, str))]
-    except Exception as e:
-        logger.error(f"Failed to parse related_product_ids: {e}")
-        return []
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
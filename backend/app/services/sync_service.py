@@ -1,51 +1,64 @@
 """Product synchronization business logic."""
-from typing import Dict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
 from datetime import datetime
 from database import get_db
-from crypto import decrypt
-from integrations.woocommerce import WooCommerceIntegration
-from integrations.shopify import ShopifyIntegration
+from services.connection_service import get_integration_for_connection
 from suggestions_generator import generate_suggestions_for_product
+from services.suggestion_service import save_suggestions
 from utils.logger import get_logger
 
 logger = get_logger(__name__)
 
 
-def sync_connection(connection_id: int) -> Dict:
+SYNC_MODES = ('rest', 'bulk')
+
+# Bulk exports run in the background, one at a time per worker
+# (Shopify allows one bulk query per shop at a time)
+BULK_SYNC_TIMEOUT_SECONDS = 3600
+# Products upserted per transaction while a bulk export is streamed in
+BULK_SYNC_CHUNK_SIZE = 500
+_bulk_sync_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='bulk-sync')
+
+
+def sync_connection(connection_id: int, mode: str = 'rest') -> Dict:
     """
     Synchronize products from a store connection.
 
     Fetches products from external platform and upserts them to the database.
     For demo connections, also generates suggestions for new products.
 
+    In 'bulk' mode (Shopify only) the whole catalog is exported through a
+    GraphQL bulk operation, without the 100 product limit of the REST mode.
+    The export can take up to an hour, so it runs as a background job and
+    only the job ID is returned (see get_sync_job).
+
     Args:
         connection_id: ID of the connection to sync.
+        mode: 'rest' (default) or 'bulk'.
 
     Returns:
-        Dict with success status and number of products synced.
+        Dict with success status and number of products synced, or with
+        job_id and status 'running' in bulk mode.
 
     Raises:
-        ValueError: If connection not found, inactive, or unsupported platform.
+        ValueError: If connection not found, inactive, or unsupported platform/mode.
         Exception: If sync operation fails.
     """
+    if mode not in SYNC_MODES:
+        raise ValueError(f"Unsupported sync mode: {mode}")
+
+    if mode == 'bulk':
+        return start_bulk_sync(connection_id)
+
     with get_db() as conn:
         cursor = conn.cursor()
 
         # Get connection details
         connection = _get_connection_details(cursor, connection_id)
 
-        # Decrypt credentials
-        api_key = decrypt(connection['api_key_encrypted'])
-        api_secret = decrypt(connection['api_secret_encrypted']) if connection['api_secret_encrypted'] else None
-
         # Create integration instance
-        integration = _create_integration_instance(
-            connection['platform'],
-            connection['store_url'],
-            api_key,
-            api_secret,
-            is_demo=False
-        )
+        integration = get_integration_for_connection(connection_id)
 
         # Fetch products
         products = integration.get_products(limit=100)
@@ -80,6 +93,154 @@ def sync_connection(connection_id: int) -> Dict:
     }
 
 
+def start_bulk_sync(connection_id: int) -> Dict:
+    """
+    Start a Shopify bulk export of a connection as a background job.
+
+    The job is a sync_logs row in status 'running', updated to 'success' or
+    'failed' when the export ends. If a bulk sync of the connection is
+    already running, its job is returned instead of starting another one.
+
+    Args:
+        connection_id: ID of the connection to sync.
+
+    Returns:
+        Dict with success status, job_id and status 'running'.
+
+    Raises:
+        ValueError: If connection not found, inactive, or not a Shopify connection.
+    """
+    with get_db() as conn:
+        cursor = conn.cursor()
+        connection = _get_connection_details(cursor, connection_id)
+        if connection['platform'] != 'shopify':
+            raise ValueError('Bulk sync is only supported for Shopify connections')
+
+        # Jobs older than the export timeout died with their worker
+        cursor.execute('''
+            SELECT id FROM sync_logs
+            WHERE connection_id = ? AND status = 'running' AND created_at > datetime('now', ?)
+            ORDER BY id DESC LIMIT 1
+        ''', (connection_id, f'-{BULK_SYNC_TIMEOUT_SECONDS} seconds'))
+        running = cursor.fetchone()
+
+        if running:
+            job_id = running['id']
+        else:
+            cursor.execute('''
+                INSERT INTO sync_logs (connection_id, sync_type, status)
+                VALUES (?, 'products', 'running')
+            ''', (connection_id,))
+            job_id = cursor.lastrowid
+
+    if not running:
+        _bulk_sync_executor.submit(_run_bulk_sync, job_id, connection_id)
+        logger.info(f"Started bulk sync job {job_id} for connection {connection_id}")
+
+    return {
+        'success': True,
+        'job_id': job_id,
+        'status': 'running',
+        'message': f'Bulk sync started (job {job_id})'
+    }
+
+
+def get_sync_job(connection_id: int, job_id: int) -> Dict:
+    """
+    Get the status of a sync job.
+
+    Args:
+        connection_id: ID of the connection.
+        job_id: Job ID returned by sync_connection in bulk mode.
+
+    Returns:
+        Dict with job_id, status ('running', 'success' or 'failed'),
+        products_synced, error_message and created_at.
+
+    Raises:
+        ValueError: If the job does not exist for the connection.
+    """
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT id, status, products_synced, error_message, created_at
+            FROM sync_logs WHERE id = ? AND connection_id = ?
+        ''', (job_id, connection_id))
+        row = cursor.fetchone()
+
+    if not row:
+        raise ValueError(f"Sync job {job_id} not found")
+
+    return {
+        'job_id': row['id'],
+        'status': row['status'],
+        'products_synced': row['products_synced'],
+        'error_message': row['error_message'],
+        'created_at': row['created_at']
+    }
+
+
+def _run_bulk_sync(job_id: int, connection_id: int) -> None:
+    """
+    Run a bulk sync job: export, then upsert the products in chunks.
+
+    No database connection is held while the bulk operation is polled, and
+    each chunk is its own transaction, so other writers are not blocked for
+    the length of the export. Failures are logged on the job row.
+    """
+    try:
+        with get_db() as conn:
+            connection = _get_connection_details(conn.cursor(), connection_id)
+        integration = get_integration_for_connection(connection_id)
+
+        result_url = integration.export_products_bulk(timeout=BULK_SYNC_TIMEOUT_SECONDS)
+
+        products_synced = 0
+        chunk = []
+        for product in integration.stream_bulk_products(result_url) if result_url else ():
+            chunk.append(product)
+            if len(chunk) >= BULK_SYNC_CHUNK_SIZE:
+                products_synced += _upsert_products(chunk, connection_id)
+                chunk = []
+        products_synced += _upsert_products(chunk, connection_id)
+
+        if not products_synced:
+            raise Exception('No products fetched or sync failed')
+
+        with get_db() as conn:
+            cursor = conn.cursor()
+            now = datetime.utcnow().isoformat()
+            cursor.execute('UPDATE store_connections SET last_sync = ? WHERE id = ?', (now, connection_id))
+            _log_successful_sync(cursor, connection_id, products_synced, connection['name'], log_id=job_id)
+
+        logger.info(f"Bulk sync job {job_id}: synced {products_synced} products from connection {connection_id}")
+    except Exception as e:
+        logger.error(f"Bulk sync job {job_id} for connection {connection_id} failed: {e}")
+        _log_failed_sync(connection_id, str(e), log_id=job_id)
+
+
+def _upsert_products(products: List[Dict], connection_id: int) -> int:
+    """
+    Upsert a chunk of products in one transaction.
+
+    Returns:
+        Number of products upserted (failed products are logged and skipped).
+    """
+    if not products:
+        return 0
+
+    products_synced = 0
+    with get_db() as conn:
+        cursor = conn.cursor()
+        for product in products:
+            try:
+                _upsert_product(cursor, product, connection_id)
+                products_synced += 1
+            except Exception as e:
+                logger.error(f"Error syncing product {product.get('sku')}: {e}")
+    return products_synced
+
+
 def _get_connection_details(cursor, connection_id: int) -> Dict:
     """
     Retrieve connection details from database.
@@ -95,7 +256,7 @@ def _get_connection_details(cursor, connection_id: int) -> Dict:
         ValueError: If connection not found or not active.
     """
     cursor.execute('''
-        SELECT name, platform, store_url, api_key_encrypted, api_secret_encrypted, is_active
+        SELECT name, platform, store_url, is_active
         FROM store_connections WHERE id = ?
     ''', (connection_id,))
     row = cursor.fetchone()
@@ -110,36 +271,6 @@ def _get_connection_details(cursor, connection_id: int) -> Dict:
     return connection
 
 
-def _create_integration_instance(platform: str, store_url: str, api_key: str,
-                                  api_secret: str = None, is_demo: bool = False):
-    """
-    Create appropriate integration instance based on platform.
-
-    Args:
-        platform: Platform type (woocommerce, shopify).
-        store_url: Store URL.
-        api_key: API key.
-        api_secret: API secret (optional).
-        is_demo: Whether this is a demo connection (deprecated, raises error).
-
-    Returns:
-        Integration instance.
-
-    Raises:
-        ValueError: If platform is unsupported or demo mode attempted.
-    """
-    if is_demo:
-        raise ValueError('Demo mode is no longer supported. Please provide real API credentials.')
-
-    if platform == 'woocommerce':
-        return WooCommerceIntegration(store_url, api_key, api_secret)
-
-    if platform == 'shopify':
-        return ShopifyIntegration(store_url, api_key)
-
-    raise ValueError(f'Unsupported platform: {platform}')
-
-
 def _upsert_product(cursor, product: Dict, connection_id: int) -> int:
     """
     Insert or update a product in the database.
@@ -161,21 +292,25 @@ def _upsert_product(cursor, product: Dict, connection_id: int) -> int:
         cursor.execute('''
             UPDATE products
             SET name = ?, price = ?, stock = ?, status = ?, connection_id = ?,
-                external_id = ?, vendor = ?, product_type = ?, updated_at = CURRENT_TIMESTAMP
+                external_id = ?, vendor = ?, product_type = ?,
+                inventory_item_id = ?, location_id = ?, updated_at = CURRENT_TIMESTAMP
             WHERE sku = ?
         ''', (product['name'], product['price'], product.get('stock', 0), product['status'],
               connection_id, product['external_id'], product.get('vendor', ''),
-              product.get('product_type', ''), product['sku']))
+              product.get('product_type', ''), product.get('inventory_item_id'),
+              product.get('location_id'), product['sku']))
         return existing[0]
     else:
         # Insert new product
         cursor.execute('''
             INSERT INTO products
-            (sku, name, price, stock, status, channel, connection_id, external_id, vendor, product_type)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            (sku, name, price, stock, status, channel, connection_id, external_id, vendor, product_type,
+             inventory_item_id, location_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         ''', (product['sku'], product['name'], product['price'], product.get('stock', 0),
               product['status'], product['channel'], connection_id, product['external_id'],
-              product.get('vendor', ''), product.get('product_type', '')))
+              product.get('vendor', ''), product.get('product_type', ''),
+              product.get('inventory_item_id'), product.get('location_id')))
         return cursor.lastrowid
 
 
@@ -211,22 +346,16 @@ def _generate_suggestions_for_new_products(cursor, new_products: list) -> None:
     suggestions_created = 0
     for prod in new_products:
         suggestions = generate_suggestions_for_product(prod['id'], prod['name'], prod['price'])
-        for suggestion in suggestions:
-            try:
-                cursor.execute('''
-                    INSERT INTO suggestions (product_id, type, description, status)
-                    VALUES (?, ?, ?, ?)
-                ''', (suggestion['product_id'], suggestion['type'],
-                      suggestion['description'], suggestion['status']))
-                suggestions_created += 1
-            except Exception as e:
-                logger.error(f"Error creating suggestion: {e}")
-                continue
+        try:
+            suggestions_created += len(save_suggestions(cursor, prod['id'], suggestions))
+        except Exception as e:
+            logger.error(f"Error creating suggestions for product {prod['id']}: {e}")
 
     logger.info(f"Generated {suggestions_created} suggestions for {len(new_products)} new products")
 
 
-def _log_successful_sync(cursor, connection_id: int, products_synced: int, connection_name: str) -> None:
+def _log_successful_sync(cursor, connection_id: int, products_synced: int, connection_name: str,
+                         log_id: int = None) -> None:
     """
     Log successful sync to database.
 
@@ -235,11 +364,17 @@ def _log_successful_sync(cursor, connection_id: int, products_synced: int, conne
         connection_id: Connection ID.
         products_synced: Number of products synced.
         connection_name: Name of the connection.
+        log_id: sync_logs row of a background job to complete (default: new row).
     """
-    cursor.execute('''
-        INSERT INTO sync_logs (connection_id, sync_type, status, products_synced)
-        VALUES (?, 'products', 'success', ?)
-    ''', (connection_id, products_synced))
+    if log_id:
+        cursor.execute('''
+            UPDATE sync_logs SET status = 'success', products_synced = ? WHERE id = ?
+        ''', (products_synced, log_id))
+    else:
+        cursor.execute('''
+            INSERT INTO sync_logs (connection_id, sync_type, status, products_synced)
+            VALUES (?, 'products', 'success', ?)
+        ''', (connection_id, products_synced))
 
     cursor.execute('''
         INSERT INTO events (event_type, description)
@@ -247,20 +382,26 @@ def _log_successful_sync(cursor, connection_id: int, products_synced: int, conne
     ''', (f"Synchronized {products_synced} products from {connection_name}",))
 
 
-def _log_failed_sync(connection_id: int, error_message: str) -> None:
+def _log_failed_sync(connection_id: int, error_message: str, log_id: int = None) -> None:
     """
     Log failed sync to database.
 
     Args:
         connection_id: Connection ID.
         error_message: Error message.
+        log_id: sync_logs row of a background job to fail (default: new row).
     """
     try:
         with get_db() as conn:
             cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO sync_logs (connection_id, sync_type, status, error_message)
-                VALUES (?, 'products', 'failed', ?)
-            ''', (connection_id, error_message))
+            if log_id:
+                cursor.execute('''
+                    UPDATE sync_logs SET status = 'failed', error_message = ? WHERE id = ?
+                ''', (error_message, log_id))
+            else:
+                cursor.execute('''
+                    INSERT INTO sync_logs (connection_id, sync_type, status, error_message)
+                    VALUES (?, 'products', 'failed', ?)
+                ''', (connection_id, error_message))
     except Exception as e:
         logger.error(f"Failed to log sync error: {e}")
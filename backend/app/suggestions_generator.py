@@ -40,11 +40,13 @@ def generate_suggestions_for_product(product_id, product_name, product_price):
 
     for sug_type in suggestion_types:
         template = random.choice(SUGGESTION_TEMPLATES[sug_type])
+        percent = random.choice([10, 15, 20, 25, 30])
+        new_price = round(product_price * random.uniform(0.85, 1.15), 2)
 
         # Fill in template variables
         description = template.format(
-            percent=random.choice([10, 15, 20, 25, 30]),
-            new_price=round(product_price * random.uniform(0.85, 1.15), 2),
+            percent=percent,
+            new_price=new_price,
             quantity=random.choice([20, 30, 50, 100]),
             buy_qty=random.choice([2, 3]),
             pay_qty=random.choice([1, 2]),
@@ -58,12 +60,22 @@ def generate_suggestions_for_product(product_id, product_name, product_price):
         # Random status - some already applied for demo
         status = random.choice(['new', 'new', 'new', 'applied'])
 
-        suggestions.append({
+        # Structured values for apply - price templates with a percentage are a discount
+        suggestion = {
             'product_id': product_id,
             'type': sug_type,
             'description': description,
             'status': status
-        })
+        }
+        if sug_type == 'price':
+            if '{new_price}' in template:
+                suggestion['new_price'] = new_price
+            else:
+                suggestion['discount_pct'] = percent
+        elif '{percent}' in template:
+            suggestion['discount_pct'] = percent
+
+        suggestions.append(suggestion)
 
     logger.info(f"Generated {len(suggestions)} suggestions for product {product_id}")
     return suggestions
@@ -1,5 +1,6 @@
 """Request validation schemas using Pydantic."""
-from typing import Optional
+from datetime import datetime
+from typing import Optional, List, Dict
 from pydantic import BaseModel, Field, validator
 
 
@@ -52,6 +53,43 @@ class GetSuggestionsRequest(BaseModel):
         }
 
 
+class ListSuggestionsRequest(BaseModel):
+    """Schema for the catalog-wide suggestion queue query parameters."""
+
+    status: Optional[str] = Field(None, description="Suggestion status (new, applied)")
+    type: Optional[str] = Field(None, description="Suggestion type (price, promo, bundle, restock)")
+    connection_id: Optional[int] = Field(None, gt=0, description="Store connection ID")
+    created_after: Optional[datetime] = Field(None, description="Only suggestions created at or after this time")
+    created_before: Optional[datetime] = Field(None, description="Only suggestions created before this time")
+    limit: int = Field(50, ge=1, le=200, description="Page size")
+    cursor: Optional[str] = Field(None, description="next_cursor from the previous page")
+
+    @validator('status')
+    def validate_status(cls, v: Optional[str]) -> Optional[str]:
+        """Validate status is one of suggestion statuses."""
+        allowed = ['new', 'applied']
+        if v is not None and v not in allowed:
+            raise ValueError(f"Status must be one of: {', '.join(allowed)}")
+        return v
+
+    @validator('type')
+    def validate_type(cls, v: Optional[str]) -> Optional[str]:
+        """Validate type is one of suggestion types."""
+        allowed = ['price', 'promo', 'bundle', 'restock']
+        if v is not None and v not in allowed:
+            raise ValueError(f"Type must be one of: {', '.join(allowed)}")
+        return v
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "status": "new",
+                "type": "price",
+                "limit": 50
+            }
+        }
+
+
 class GetEventsRequest(BaseModel):
     """Schema for getting events query parameters."""
 
@@ -63,3 +101,140 @@ class GetEventsRequest(BaseModel):
                 "limit": 20
             }
         }
+
+
+class GetAIUsageRequest(BaseModel):
+    """Schema for AI usage summary query parameters."""
+
+    days: int = Field(7, ge=1, le=90, description="Number of days to summarize")
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "days": 7
+            }
+        }
+
+
+class AnalyzeAllRequest(BaseModel):
+    """Schema for bulk AI analysis query parameters."""
+
+    mode: str = Field('sync', description="sync (analyze now), batch (OpenAI Batch API) or rules (local rules engine)")
+    batch_size: Optional[int] = Field(None, ge=1, le=20, description="Products per OpenAI request (sync mode)")
+    max_products: Optional[int] = Field(None, ge=1, description="Maximum products analyzed (default: half of the catalog)")
+    token_budget: Optional[int] = Field(None, ge=1, description="Maximum estimated tokens per run")
+    time_budget_seconds: Optional[int] = Field(None, ge=1, description="Maximum run time in seconds (sync mode)")
+
+    @validator('mode')
+    def validate_mode(cls, v: str) -> str:
+        """Validate mode is one of analysis modes."""
+        allowed = ['sync', 'batch', 'rules']
+        if v not in allowed:
+            raise ValueError(f"Mode must be one of: {', '.join(allowed)}")
+        return v
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "mode": "sync",
+                "batch_size": 5,
+                "token_budget": 200000
+            }
+        }
+
+
+class RulesEngineRequest(BaseModel):
+    """Schema for rules engine overrides (omitted fields keep their defaults)."""
+
+    enabled: Optional[List[str]] = Field(None, description="Rules to run (price, restock, promo, bundle)")
+    price_band_low_pct: Optional[float] = Field(None, ge=0, le=100, description="Lower price band percentile")
+    price_band_high_pct: Optional[float] = Field(None, ge=0, le=100, description="Upper price band percentile")
+    price_tolerance_pct: Optional[float] = Field(None, ge=0, le=100, description="Allowed distance outside the band")
+    min_peers: Optional[int] = Field(None, ge=2, description="Minimum products of a type for its own band")
+    low_stock_threshold: Optional[int] = Field(None, ge=1, description="Restock below this stock")
+    overstock_threshold: Optional[int] = Field(None, ge=1, description="Promote at or above this stock")
+    promo_discount_pct: Optional[float] = Field(None, gt=0, lt=100, description="Promo discount on the partner")
+    bundle_size: Optional[int] = Field(None, ge=2, le=5, description="Products per bundle")
+    bundle_discount_pct: Optional[float] = Field(None, gt=0, lt=100, description="Bundle discount")
+    bundle_min_stock: Optional[int] = Field(None, ge=1, description="Minimum stock to bundle a product")
+    type_affinity: Optional[Dict[str, List[str]]] = Field(None, description="Product type -> types that pair well with it")
+
+    @validator('enabled')
+    def validate_enabled(cls, v: Optional[List[str]]) -> Optional[List[str]]:
+        """Validate enabled rules are rule types."""
+        allowed = ['price', 'restock', 'promo', 'bundle']
+        if v is not None and any(rule not in allowed for rule in v):
+            raise ValueError(f"Enabled rules must be one of: {', '.join(allowed)}")
+        return v
+
+    @validator('price_band_high_pct')
+    def validate_price_band(cls, v: Optional[float], values: dict) -> Optional[float]:
+        """Validate the upper band percentile is above the lower one."""
+        low = values.get('price_band_low_pct')
+        if v is not None and low is not None and v <= low:
+            raise ValueError("price_band_high_pct must be greater than price_band_low_pct")
+        return v
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "enabled": ["price", "restock", "bundle"],
+                "overstock_threshold": 40,
+                "type_affinity": {"Phone": ["Audio"]}
+            }
+        }
+
+
+class GetProductDetailsBatchRequest(BaseModel):
+    """Schema for fetching details of many products at once."""
+
+    product_ids: List[int] = Field(..., min_items=1, max_items=500, description="Product IDs")
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "product_ids": [1, 2, 3]
+            }
+        }
+
+
+class ApplySuggestionsBatchRequest(BaseModel):
+    """Schema for applying many suggestions at once."""
+
+    suggestion_ids: List[int] = Field(..., min_items=1, max_items=200, description="Suggestion IDs")
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "suggestion_ids": [1, 2, 3]
+            }
+        }
+
+
+class PricingRule(BaseModel):
+    """A what-if price rule: percent change for the products matching the filters."""
+
+    adjust_pct: float = Field(..., ge=-95, le=500, description="Price change in percent (e.g. -10)")
+    channel: Optional[str] = Field(None, description="Only products of this channel")
+    product_type: Optional[str] = Field(None, description="Only products of this type")
+    min_stock: Optional[int] = Field(None, description="Only products with stock >= min_stock")
+    max_stock: Optional[int] = Field(None, description="Only products with stock <= max_stock")
+    min_price: Optional[float] = Field(None, ge=0, description="Only products priced >= min_price")
+    max_price: Optional[float] = Field(None, ge=0, description="Only products priced <= max_price")
+
+
+class PricingSimulationRequest(BaseModel):
+    """Schema for a catalog-wide pricing simulation."""
+
+    rules: List[PricingRule] = Field(default_factory=list, max_items=50, description="Price rules, applied in order")
+    include_pending_suggestions: bool = Field(False, description="Apply pending price suggestions first")
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "rules": [
+                    {"adjust_pct": -10, "channel": "shopify", "min_stock": 50}
+                ],
+                "include_pending_suggestions": True
+            }
+        }
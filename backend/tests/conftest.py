@@ -0,0 +1,39 @@
+"""Run the tests against backend/app the way the server runs it (flat imports)."""
+import os
+import sys
+
+import pytest
+
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app')
+
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
+
+# Background jobs create_app() would start; tests drive them directly instead
+WORKER_FLAGS = ('OUTBOX_WORKER_ENABLED', 'SUGGESTION_SWEEP_ENABLED', 'AI_BATCH_POLL_ENABLED')
+
+
+@pytest.fixture
+def database_path(tmp_path, monkeypatch):
+    """Scratch database with the current schema (in-process caches start empty)."""
+    import database
+    from services import ai_usage_service, catalog_snapshot_service, product_service
+
+    monkeypatch.setattr(database, 'DATABASE_PATH', str(tmp_path / 'db.sqlite'))
+    monkeypatch.setattr(catalog_snapshot_service, '_snapshot_cache', {'version': None, 'snapshot': None})
+    monkeypatch.setattr(product_service, '_stats_cache', {'version': None, 'stats': None})
+    database.init_db()
+    yield database.DATABASE_PATH
+
+    # Usage rows still queued belong to this database, not the next one
+    ai_usage_service.flush_usage(timeout=5)
+
+
+@pytest.fixture
+def client(database_path, monkeypatch):
+    """Flask test client of the app on the scratch database, without background jobs."""
+    for flag in WORKER_FLAGS:
+        monkeypatch.setenv(flag, '0')
+
+    import main
+    return main.create_app().test_client()
@@ -0,0 +1,191 @@
+"""Batch API analyses end to end: submit, poll, ingest - once - against a local fake of the OpenAI API."""
+import json
+import re
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from database import get_db
+from services import ai_agent_service, ai_batch_service, dummyjson_service
+
+PRODUCTS = 4
+
+
+class FakeOpenAI(BaseHTTPRequestHandler):
+    """The files and batches endpoints the batch service uses; a batch completes on its second retrieve."""
+
+    files = {}
+    batches = {}
+    downloads = []
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, body: bytes, content_type: str = 'application/json'):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+
+        if self.path == '/v1/files':
+            boundary = re.search(r'boundary=(.*)', self.headers['Content-Type']).group(1).encode()
+            part = next(p for p in body.split(b'--' + boundary) if b'filename=' in p)
+            file_id = f'file-{len(self.files) + 1}'
+            self.files[file_id] = part.split(b'\r\n\r\n', 1)[1].rsplit(b'\r\n', 1)[0].decode()
+            return self._send(json.dumps({
+                'id': file_id, 'object': 'file', 'bytes': len(self.files[file_id]), 'created_at': 1,
+                'filename': 'product_analysis.jsonl', 'purpose': 'batch', 'status': 'processed'
+            }).encode())
+
+        request = json.loads(body)
+        batch_id = f'batch_{len(self.batches) + 1}'
+        self.batches[batch_id] = {
+            'id': batch_id, 'object': 'batch', 'endpoint': request['endpoint'], 'status': 'validating',
+            'input_file_id': request['input_file_id'], 'completion_window': request['completion_window'],
+            'created_at': 1000, 'retrieved': 0
+        }
+        self._send(json.dumps(self.batches[batch_id]).encode())
+
+    def do_GET(self):
+        match = re.match(r'/v1/files/([\w-]+)/content$', self.path)
+        if match:
+            self.downloads.append(match.group(1))
+            return self._send(self.files[match.group(1)].encode(), 'application/octet-stream')
+
+        batch = self.batches[self.path.rsplit('/', 1)[-1]]
+        batch['retrieved'] += 1
+        if batch['retrieved'] == 1:
+            batch['status'] = 'in_progress'
+        elif batch['status'] != 'completed':
+            output_id = f'file-{len(self.files) + 1}'
+            requests = [json.loads(line) for line in self.files[batch['input_file_id']].splitlines()]
+            self.files[output_id] = '\n'.join(json.dumps(_canned_result(r)) for r in requests)
+            batch.update(status='completed', output_file_id=output_id, completed_at=1060)
+        self._send(json.dumps(batch).encode())
+
+
+def _canned_result(request: dict) -> dict:
+    """Batch output line: one price suggestion per product."""
+    product_id = int(request['custom_id'].split('-')[1])
+    content = {
+        'suggestions': [{'type': 'price', 'description': f'Lower price of product {product_id}',
+                         'new_price': 9.5, 'confidence': 0.8}],
+        'market_position': 'Above market'
+    }
+    return {'id': f'req-{product_id}', 'custom_id': request['custom_id'], 'error': None, 'response': {
+        'status_code': 200,
+        'body': {
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': json.dumps(content)}}],
+            'usage': {'prompt_tokens': 300, 'completion_tokens': 60, 'total_tokens': 360}
+        }
+    }}
+
+
+@pytest.fixture
+def openai_server(monkeypatch):
+    FakeOpenAI.files, FakeOpenAI.batches, FakeOpenAI.downloads = {}, {}, []
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeOpenAI)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    monkeypatch.setenv('OPENAI_BASE_URL', f'http://127.0.0.1:{server.server_address[1]}/v1')
+    monkeypatch.setenv('OPENAI_API_KEY', 'test')
+    monkeypatch.setattr(ai_agent_service, 'client', None)
+    # DummyJSON market lookups stay offline
+    monkeypatch.setattr(dummyjson_service, 'find_similar_products',
+                        lambda name, price: [{'title': name, 'price': price, 'category': 'test'}])
+    yield FakeOpenAI
+    server.shutdown()
+
+
+@pytest.fixture
+def batch_id(client, openai_server):
+    """A submitted batch of PRODUCTS in-stock products."""
+    with get_db() as conn:
+        for i in range(1, PRODUCTS + 1):
+            conn.execute('''
+                INSERT INTO products (sku, name, price, stock, status, channel)
+                VALUES (?, ?, ?, 20, 'active', 'shopify')
+            ''', (f'SKU-{i}', f'Product {i}', 10.0 + i))
+
+    response = client.post(f'/api/ai/analyze-all?mode=batch&max_products={PRODUCTS}')
+    assert response.status_code == 202
+    assert response.get_json()['requests'] == PRODUCTS
+    return response.get_json()['batch_id']
+
+
+def _counts() -> tuple:
+    with get_db() as conn:
+        suggestions = conn.execute('SELECT COUNT(*) FROM suggestions').fetchone()[0]
+        events = conn.execute("SELECT COUNT(*) FROM events WHERE event_type = 'ai_analysis'").fetchone()[0]
+    return suggestions, events
+
+
+def test_batch_is_ingested_once(client, openai_server, batch_id):
+    assert client.get(f'/api/ai/batches/{batch_id}').get_json()['status'] == 'in_progress'
+    assert _counts() == (0, 0)
+
+    summary = client.get(f'/api/ai/batches/{batch_id}').get_json()
+    assert summary['status'] == 'ingested'
+    assert summary['products_ingested'] == PRODUCTS
+    assert summary['suggestions_created'] == PRODUCTS
+    assert summary['error_message'] is None
+    assert _counts() == (PRODUCTS, PRODUCTS)
+
+    with get_db() as conn:
+        new_prices = [row[0] for row in conn.execute("SELECT new_price FROM suggestions WHERE type = 'price'")]
+    assert new_prices == [9.5] * PRODUCTS
+
+    # Polling again, by the API or the poller, neither downloads nor saves anything
+    assert client.get(f'/api/ai/batches/{batch_id}').get_json()['status'] == 'ingested'
+    assert ai_batch_service.poll_open_batches() == []
+    assert len(openai_server.downloads) == 1
+    assert _counts() == (PRODUCTS, PRODUCTS)
+
+
+def test_stuck_ingestion_is_released_and_ingested_once(client, openai_server, batch_id):
+    client.get(f'/api/ai/batches/{batch_id}')
+
+    # Another worker claimed the batch and is (still) ingesting it
+    with get_db() as conn:
+        conn.execute("UPDATE ai_batches SET status = 'ingesting', updated_at = ? WHERE batch_id = ?",
+                     (ai_batch_service._now(), batch_id))
+
+    assert client.get(f'/api/ai/batches/{batch_id}').get_json()['status'] == 'ingesting'
+    assert ai_batch_service.poll_open_batches() == []
+    assert _counts() == (0, 0)
+
+    # That worker died: past the timeout the poller takes the batch over
+    stale = datetime.now() - timedelta(minutes=ai_batch_service.BATCH_INGEST_TIMEOUT_MINUTES + 1)
+    with get_db() as conn:
+        conn.execute('UPDATE ai_batches SET updated_at = ? WHERE batch_id = ?',
+                     (stale.isoformat(sep=' ', timespec='seconds'), batch_id))
+
+    [summary] = ai_batch_service.poll_open_batches()
+    assert summary['status'] == 'ingested'
+    assert summary['products_ingested'] == PRODUCTS
+    assert _counts() == (PRODUCTS, PRODUCTS)
+
+    assert ai_batch_service.poll_open_batches() == []
+    assert _counts() == (PRODUCTS, PRODUCTS)
+    assert len(openai_server.downloads) == 1
+
+
+def test_failure_after_saving_does_not_reopen_the_batch(client, openai_server, batch_id, monkeypatch):
+    def fail(*args, **kwargs):
+        raise RuntimeError('cache unavailable')
+
+    # Results and the batch status are saved together, before the analysis cache is written
+    monkeypatch.setattr(ai_batch_service, 'store_analyses', fail)
+    client.get(f'/api/ai/batches/{batch_id}')
+    assert client.get(f'/api/ai/batches/{batch_id}').status_code == 500
+
+    assert client.get(f'/api/ai/batches/{batch_id}').get_json()['status'] == 'ingested'
+    assert ai_batch_service.poll_open_batches() == []
+    assert _counts() == (PRODUCTS, PRODUCTS)
+    assert len(openai_server.downloads) == 1
@@ -0,0 +1,47 @@
+"""The analysis prompt stays the same size however large the catalog is."""
+from services.ai_agent_service import CANDIDATE_LIMIT, analysis_request, select_candidate_products
+from services.catalog_snapshot_service import CatalogProduct, CatalogSnapshot
+
+MARKET_DATA = [{'title': 'Leather Phone Case', 'price': 59.0, 'category': 'mobile-accessories'}]
+
+
+def _catalog(size: int) -> CatalogSnapshot:
+    products = [
+        CatalogProduct({
+            'id': product_id,
+            'sku': f'SKU-{product_id}',
+            'name': f'Leather Phone Case {product_id}',
+            'price': 20.0 + product_id % 200,
+            'stock': product_id % 40,
+            'status': 'active',
+            'channel': 'shopify',
+            'vendor': f'Vendor {product_id % 7}',
+            'product_type': 'Case' if product_id % 3 else 'Cable',
+        })
+        for product_id in range(1, size + 1)
+    ]
+    return CatalogSnapshot(1, products)
+
+
+def _prompt(catalog: CatalogSnapshot) -> str:
+    product = catalog.get(1)
+    candidates = select_candidate_products(product, catalog)
+    request = analysis_request(product, MARKET_DATA, candidates)
+    return request['messages'][-1]['content']
+
+
+def test_prompt_size_is_bounded_by_candidate_limit():
+    small, large = _catalog(10), _catalog(10_000)
+
+    # Everything but the candidate lines, plus at most CANDIDATE_LIMIT of the longest line
+    empty_prompt = _prompt(CatalogSnapshot(1, [small.get(1)]))
+    longest_line = max(len(product.prompt_line) for product in large.products)
+    bound = len(empty_prompt) + CANDIDATE_LIMIT * (longest_line + 1)
+
+    small_prompt, large_prompt = _prompt(small), _prompt(large)
+    assert len(small_prompt) <= bound
+    assert len(large_prompt) <= bound
+
+    # Only the top candidates are listed, not the whole in-stock catalog
+    catalog_lines = {product.prompt_line for product in large.products}
+    assert sum(line in catalog_lines for line in large_prompt.splitlines()) == CANDIDATE_LIMIT
@@ -0,0 +1,153 @@
+"""Shopify bulk sync end to end against a local fake of the Admin GraphQL API and its JSONL result file."""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from crypto import encrypt
+from database import get_db
+from services import sync_service
+
+# Two products with their variants as child lines, the way Shopify writes bulk results
+RESULT_LINES = [
+    {'id': 'gid://shopify/Product/1', 'title': 'Desk Lamp', 'vendor': 'HomeLab', 'productType': 'Home'},
+    {'id': 'gid://shopify/ProductVariant/11', 'title': 'Default Title', 'sku': 'LAMP-1', 'price': '49.00',
+     'inventoryQuantity': 30, 'inventoryItem': {'id': 'gid://shopify/InventoryItem/111'},
+     '__parentId': 'gid://shopify/Product/1'},
+    {'id': 'gid://shopify/ProductVariant/12', 'title': 'Black', 'sku': 'LAMP-2', 'price': '52.00',
+     'inventoryQuantity': 8, 'inventoryItem': {'id': 'gid://shopify/InventoryItem/112'},
+     '__parentId': 'gid://shopify/Product/1'},
+    {'id': 'gid://shopify/Product/2', 'title': 'Cable', 'vendor': 'Voltix', 'productType': 'Cable'},
+    {'id': 'gid://shopify/ProductVariant/21', 'title': '1m', 'sku': 'CABLE-1M', 'price': '9.90',
+     'inventoryQuantity': 100, 'inventoryItem': {'id': 'gid://shopify/InventoryItem/121'},
+     '__parentId': 'gid://shopify/Product/2'},
+    {'id': 'gid://shopify/ProductVariant/22', 'title': '2m', 'sku': 'CABLE-2M', 'price': '12.90',
+     'inventoryQuantity': 4, 'inventoryItem': {'id': 'gid://shopify/InventoryItem/122'},
+     '__parentId': 'gid://shopify/Product/2'},
+    {'id': 'gid://shopify/ProductVariant/23', 'title': '3m', 'sku': '', 'price': '15.90',
+     'inventoryQuantity': 0, 'inventoryItem': {'id': 'gid://shopify/InventoryItem/123'},
+     '__parentId': 'gid://shopify/Product/2'},
+]
+VARIANTS = sum(1 for line in RESULT_LINES if '__parentId' in line)
+
+
+class FakeShopify(BaseHTTPRequestHandler):
+    """bulkOperationRunQuery, currentBulkOperation (answering `status`), shop.json and the result file."""
+
+    status = 'COMPLETED'
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, body: bytes):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/result.jsonl':
+            return self._send(''.join(json.dumps(line) + '\n' for line in RESULT_LINES).encode())
+        self._send(json.dumps({'shop': {'primary_location_id': 999}}).encode())
+
+    def do_POST(self):
+        query = json.loads(self.rfile.read(int(self.headers['Content-Length'])))['query']
+        if 'bulkOperationRunQuery' in query:
+            data = {'bulkOperationRunQuery': {'bulkOperation': {'id': 'gid://shopify/BulkOperation/1',
+                                                                'status': 'CREATED'}, 'userErrors': []}}
+        else:
+            data = {'currentBulkOperation': {
+                'id': 'gid://shopify/BulkOperation/1', 'status': self.status,
+                'errorCode': 'INTERNAL_SERVER_ERROR' if self.status == 'FAILED' else None,
+                'objectCount': str(len(RESULT_LINES)),
+                'url': f'http://127.0.0.1:{self.server.server_address[1]}/result.jsonl'
+            }}
+        self._send(json.dumps({'data': data}).encode())
+
+
+@pytest.fixture
+def shop(database_path):
+    FakeShopify.status = 'COMPLETED'
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeShopify)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield FakeShopify, f'http://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+
+
+@pytest.fixture
+def connection_id(shop):
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO store_connections (name, platform, store_url, api_key_encrypted, is_active)
+            VALUES ('Fake shop', 'shopify', ?, ?, 1)
+        ''', (shop[1], encrypt('token')))
+        return cursor.lastrowid
+
+
+def _wait_for_job(client, connection_id: int, job_id: int) -> dict:
+    deadline = time.monotonic() + 10
+    while True:
+        job = client.get(f'/api/connections/{connection_id}/sync/{job_id}').get_json()
+        if job['status'] != 'running' or time.monotonic() > deadline:
+            return job
+        time.sleep(0.02)
+
+
+def _start(client, connection_id: int) -> int:
+    response = client.post(f'/api/connections/{connection_id}/sync?mode=bulk')
+    assert response.status_code == 202
+    return response.get_json()['job_id']
+
+
+def test_bulk_sync_upserts_streamed_products_in_chunks(client, connection_id, monkeypatch):
+    chunks = []
+    upsert_products = sync_service._upsert_products
+    monkeypatch.setattr(sync_service, 'BULK_SYNC_CHUNK_SIZE', 2)
+    monkeypatch.setattr(sync_service, '_upsert_products',
+                        lambda products, cid: chunks.append(len(products)) or upsert_products(products, cid))
+
+    job = _wait_for_job(client, connection_id, _start(client, connection_id))
+
+    assert job['status'] == 'success'
+    assert job['products_synced'] == VARIANTS
+    assert job['error_message'] is None
+    # Full chunks while streaming, then the remainder
+    assert chunks == [2, 2, 1]
+
+    with get_db() as conn:
+        products = {row['external_id']: dict(row) for row in conn.execute('''
+            SELECT external_id, sku, name, price, stock, vendor, product_type, inventory_item_id, location_id
+            FROM products WHERE connection_id = ?
+        ''', (connection_id,))}
+        last_sync = conn.execute('SELECT last_sync FROM store_connections WHERE id = ?',
+                                 (connection_id,)).fetchone()[0]
+
+    assert set(products) == {'11', '12', '21', '22', '23'}
+    assert products['11']['name'] == 'Desk Lamp'
+    assert products['12']['name'] == 'Desk Lamp - Black'
+    assert products['22']['name'] == 'Cable - 2m'
+    assert (products['22']['price'], products['22']['stock'], products['22']['vendor']) == (12.9, 4, 'Voltix')
+    assert products['23']['sku'] == 'SHOPIFY-23'
+    assert (products['21']['inventory_item_id'], products['21']['location_id']) == ('121', '999')
+    assert last_sync is not None
+
+
+@pytest.mark.parametrize('status, timeout, error', [
+    ('FAILED', sync_service.BULK_SYNC_TIMEOUT_SECONDS, 'failed: INTERNAL_SERVER_ERROR'),
+    ('RUNNING', 0, 'timed out'),
+])
+def test_bulk_sync_failure_is_logged_on_the_job(client, shop, connection_id, monkeypatch, status, timeout, error):
+    shop[0].status = status
+    monkeypatch.setattr(sync_service, 'BULK_SYNC_TIMEOUT_SECONDS', timeout)
+
+    job = _wait_for_job(client, connection_id, _start(client, connection_id))
+
+    assert job['status'] == 'failed'
+    assert job['products_synced'] == 0
+    assert error in job['error_message']
+    with get_db() as conn:
+        assert conn.execute('SELECT COUNT(*) FROM products').fetchone()[0] == 0
@@ -0,0 +1,49 @@
+"""Bundle/promo candidates are complements of the product, not near-duplicates of it."""
+from services import ai_agent_service
+from services.ai_agent_service import CANDIDATE_LIMIT, SUBSTITUTE_CANDIDATE_SHARE, select_candidate_products
+from services.catalog_snapshot_service import CatalogProduct, CatalogSnapshot
+
+
+def _product(product_id: int, name: str, product_type: str, price: float = 50.0) -> CatalogProduct:
+    return CatalogProduct({
+        'id': product_id,
+        'sku': f'SKU-{product_id}',
+        'name': name,
+        'price': price,
+        'stock': 10,
+        'status': 'active',
+        'channel': 'shopify',
+        'vendor': 'Acme',
+        'product_type': product_type,
+    })
+
+
+def _catalog() -> CatalogSnapshot:
+    # Plenty of same-type cases that look just like product 1, plus cheaper chargers and headphones
+    products = [_product(1, 'Leather Phone Case', 'Case')]
+    products += [_product(i, f'Leather Phone Case {i}', 'Case') for i in range(2, 60)]
+    products += [_product(i, f'USB Charger {i}', 'Charger', price=15.0) for i in range(100, 120)]
+    products += [_product(i, f'Wireless Headphones {i}', 'Audio', price=120.0) for i in range(200, 220)]
+    return CatalogSnapshot(1, products)
+
+
+def test_substitutes_fill_at_most_their_share():
+    catalog = _catalog()
+    candidates = select_candidate_products(catalog.get(1), catalog)
+
+    assert len(candidates) == CANDIDATE_LIMIT
+    substitutes = [c for c in candidates if c.product_type == 'Case']
+    assert len(substitutes) <= int(CANDIDATE_LIMIT * SUBSTITUTE_CANDIDATE_SHARE)
+
+
+def test_type_affinity_ranks_complements_first(monkeypatch):
+    monkeypatch.setitem(ai_agent_service.TYPE_AFFINITY, 'Case', ['Audio'])
+    catalog = _catalog()
+    candidates = select_candidate_products(catalog.get(1), catalog)
+
+    assert {c.product_type for c in candidates[:10]} == {'Audio'}
+
+
+def test_substitutes_fill_slots_other_types_cannot():
+    catalog = CatalogSnapshot(1, [_product(i, f'Leather Phone Case {i}', 'Case') for i in range(1, 30)])
+    assert len(select_candidate_products(catalog.get(1), catalog)) == CANDIDATE_LIMIT
@@ -0,0 +1,72 @@
+"""gzip/brotli settings pay off on a real /api/products payload and stay out of the way for small ones."""
+import gzip
+import random
+
+import pytest
+
+from database import get_db
+from utils.compression import BROTLI_QUALITY, COMPRESSION_MIN_SIZE, GZIP_LEVEL
+
+PRODUCT_TYPES = ('Audio', 'Phone', 'Case', 'Charger', 'Cable', 'Home')
+VENDORS = ('Acme', 'Voltix', 'Nordic Sound', 'HomeLab')
+
+
+def _seed(count: int) -> None:
+    rng = random.Random(7)
+    with get_db() as conn:
+        for i in range(1, count + 1):
+            product_type = rng.choice(PRODUCT_TYPES)
+            conn.execute('''
+                INSERT INTO products (sku, name, price, stock, status, channel, vendor, product_type)
+                VALUES (?, ?, ?, ?, 'active', 'shopify', ?, ?)
+            ''', (f'SKU-{i:05d}', f'{rng.choice(VENDORS)} {product_type} Model {rng.randint(100, 999)}',
+                  round(rng.uniform(9, 400), 2), rng.randint(0, 150), rng.choice(VENDORS), product_type))
+            if i % 4 == 0:
+                conn.execute('''
+                    INSERT INTO suggestions (product_id, type, description, status, applied_at)
+                    VALUES (?, 'promo', ?, 'applied', '2025-01-01 10:00:00')
+                ''', (i, f'Promo -{rng.randint(5, 30)}% for overstocked product'))
+
+
+def _get(client, encoding: str):
+    return client.get('/api/products', headers={'Accept-Encoding': encoding})
+
+
+def test_products_payload_compression(client):
+    _seed(500)
+    raw = _get(client, 'identity').data
+    response = _get(client, 'gzip')
+
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert gzip.decompress(response.data) == raw
+
+    # Repetitive JSON keys shrink to under a tenth of the payload
+    assert len(response.data) < 0.1 * len(raw)
+    # GZIP_LEVEL gets most of what the slowest level would: far below level 1, close to level 9
+    assert len(response.data) < 0.85 * len(gzip.compress(raw, compresslevel=1))
+    assert len(response.data) < 1.15 * len(gzip.compress(raw, compresslevel=9))
+
+
+def test_brotli_matches_gzip_size(client):
+    brotli = pytest.importorskip('brotli')
+    _seed(500)
+    raw = _get(client, 'identity').data
+    gzipped = _get(client, 'gzip').data
+    response = _get(client, 'br, gzip')
+
+    assert response.headers['Content-Encoding'] == 'br'
+    assert brotli.decompress(response.data) == raw
+    # BROTLI_QUALITY matches gzip at GZIP_LEVEL in size (and is cheaper, see utils/compression.py)
+    assert len(response.data) < 1.05 * len(gzipped)
+    assert len(response.data) < 0.85 * len(brotli.compress(raw, quality=1))
+
+
+def test_small_payload_is_sent_as_is(client):
+    _seed(2)
+    response = _get(client, 'gzip')
+
+    assert len(response.data) < COMPRESSION_MIN_SIZE
+    assert 'Content-Encoding' not in response.headers
+    # Below the threshold gzip saves a few hundred bytes at most - less than one packet
+    assert len(response.data) - len(gzip.compress(response.data, compresslevel=GZIP_LEVEL)) < 500
@@ -0,0 +1,58 @@
+"""Worker boot must not load the AI / market-data stack or NumPy."""
+import json
+import os
+import subprocess
+import sys
+
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app')
+
+# Cumulative import time of main; generous so slow CI machines pass
+MAX_MAIN_IMPORT_SECONDS = 1.0
+
+# Only loaded on first use by the handlers that need them
+LAZY_MODULES = (
+    'openai',
+    'numpy',
+    'services.ai_agent_service',
+    'services.dummyjson_service',
+    'services.simulation_service',
+    'services.rules_engine_service',
+)
+
+# Boots a worker like gunicorn does (create_app() with its background jobs) on a scratch database
+BOOT_SCRIPT = '''
+import json, os, sys, tempfile
+import database
+database.DATABASE_PATH = os.path.join(tempfile.mkdtemp(), 'db.sqlite')
+import main
+main.create_app()
+print(json.dumps(sorted(name for name in {modules} if name in sys.modules)))
+'''
+
+
+def _run(*args: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, *args], cwd=APP_DIR, capture_output=True, text=True, timeout=120,
+        env={**os.environ, 'PYTHONDONTWRITEBYTECODE': '1'}
+    )
+
+
+def test_main_import_time():
+    result = _run('-X', 'importtime', '-c', 'import main')
+    assert result.returncode == 0, result.stderr
+
+    # "import time: self [us] | cumulative | imported package"
+    cumulative_us = next(
+        int(line.split('|')[1])
+        for line in result.stderr.splitlines()
+        if line.startswith('import time:') and line.rsplit('|', 1)[-1].strip() == 'main'
+    )
+    assert cumulative_us / 1e6 < MAX_MAIN_IMPORT_SECONDS
+
+
+def test_worker_boot_keeps_ai_stack_unloaded():
+    result = _run('-c', BOOT_SCRIPT.format(modules=repr(LAZY_MODULES)))
+    assert result.returncode == 0, result.stderr
+
+    loaded = json.loads(result.stdout.strip().splitlines()[-1])
+    assert loaded == []
@@ -112,6 +112,12 @@ export default function SuggestionsPanel({ product, onApplied }) {
                 {suggestion.description}
               </div>
 
+              {suggestion.reasoning && (
+                <div className="suggestion-reasoning">
+                  {suggestion.reasoning}
+                </div>
+              )}
+
               {suggestion.status === 'new' && (
                 <button
                   className="apply-button"